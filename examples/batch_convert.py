@@ -0,0 +1,66 @@
+"""
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+Example of how to convert the .npz files dumped by a simulation to VTK files
+with the batch converter, i.e. the command line:
+
+    python -m VTKwrite batch_convert_spec.json batch_convert_data -o batch_convert_vtk -j 2 --group batch_convert
+
+The mesh is stored once (batch_convert_data/mesh.npz, a "static" file of the spec)
+and each time step in its own .npz file.
+
+Copyright (c) 02-23-2025,  Shawn W. Walker
+"""
+
+import os
+import json
+import shutil
+from VTKwrite.batch import main
+from VTKwrite.vtkbin import VtkTriangle, VtkQuad
+import numpy as np
+
+DATA_DIR = "./batch_convert_data"
+OUT_DIR = "./batch_convert_vtk"
+SPEC_PATH = "./batch_convert_spec.json"
+GROUP_PATH = "./batch_convert"
+def clean():
+    for folder in [DATA_DIR, OUT_DIR]:
+        shutil.rmtree(folder, ignore_errors = True)
+    for filename in [SPEC_PATH, GROUP_PATH + ".pvd"]:
+        try:
+            os.remove(filename)
+        except:
+            pass
+
+def run():
+    print("Running batch_convert...")
+
+    # mesh: two triangles and a quad (see unstructured.py)
+    os.makedirs(os.path.join(DATA_DIR, "steps"), exist_ok = True)
+    x = np.array([0.0, 1.0, 2.0, 0.0, 1.0, 2.0])
+    y = np.array([0.0, 0.0, 0.0, 1.0, 1.0, 1.0])
+    z = np.zeros(6)
+    conn = np.array([0, 1, 3, 1, 4, 3, 1, 2, 5, 4])
+    offsets = np.array([3, 6, 10])
+    types = np.array([VtkTriangle.tid, VtkTriangle.tid, VtkQuad.tid])
+    np.savez(os.path.join(DATA_DIR, "mesh.npz"), x = x, y = y, z = z, conn = conn, offsets = offsets, types = types)
+
+    # time steps, as dumped by a simulation
+    for ii in range(4):
+        t = 0.1 * ii
+        np.savez(os.path.join(DATA_DIR, "steps", "state_%04d.npz" % ii), t = t,
+                 T = np.sin(x + t), u = np.random.rand(6, 3), p = np.random.rand(3))
+
+    spec = { "writer" : "unstructuredGridToVTK",
+             "static" : os.path.join("batch_convert_data", "mesh.npz"),
+             "args" : { "x" : "x", "y" : "y", "z" : "z",
+                        "connectivity" : "conn", "offsets" : "offsets", "cell_types" : "types" },
+             "point_data" : [ ["temperature", "scalars", "T"], ["velocity", "vectors", "u"] ],
+             "cell_data" : [ ["pressure", "scalars", "p"] ],
+             "time" : "t" }
+    with open(SPEC_PATH, "w") as f:
+        json.dump(spec, f, indent = 1)
+
+    main([SPEC_PATH, os.path.join(DATA_DIR, "steps"), "-o", OUT_DIR, "-j", "2", "--group", GROUP_PATH])
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,70 @@
+"""
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+Example of how to store a static grid and a "time-sequence" of data in one
+file for structured grids, rectilinear grids and image data.
+The grid is written once; every time step only adds its data arrays.
+"""
+
+import os
+from VTKwrite.interface import timeseries_structuredGrid
+from VTKwrite.interface import timeseries_rectilinearGrid
+from VTKwrite.interface import timeseries_imageData
+import numpy as np
+
+FILE_PATH_STRUCTURED  = "./structured_timedep"
+FILE_PATH_RECTILINEAR = "./rectilinear_timedep"
+FILE_PATH_IMAGE       = "./image_timedep"
+def clean():
+    try:
+        os.remove(FILE_PATH_STRUCTURED + ".vts")
+    except:
+        pass
+    try:
+        os.remove(FILE_PATH_RECTILINEAR + ".vtr")
+    except:
+        pass
+    try:
+        os.remove(FILE_PATH_IMAGE + ".vti")
+    except:
+        pass
+
+def run():
+    print("running grid_timedep...")
+
+    nx, ny, nz = 6, 6, 2
+    X = np.linspace(0.0, 1.0, nx + 1)
+    Y = np.linspace(0.0, 1.0, ny + 1)
+    Z = np.linspace(0.0, 0.2, nz + 1)
+    x, y, z = np.meshgrid(X, Y, Z, indexing = "ij")
+
+    # vector of time values
+    tv_vec = np.array([0.0, 0.1, 0.2, 0.3, 0.4])
+
+    # time-dependent data
+    temp_tv = [np.sin(np.pi * (x + t)) for t in tv_vec]
+    pressure_tv = [t * np.ones((nx, ny, nz)) for t in tv_vec]
+
+    # structured grid
+    ts_sgrid = timeseries_structuredGrid(FILE_PATH_STRUCTURED, tv_vec)
+    ts_sgrid.init_structuredGridToVTK(x, y, z, all_cell_data = [["pressure", "scalars", pressure_tv[0]]],
+                                      all_point_data = [["temp", "scalars", temp_tv[0]]])
+    # cell data first, then point data
+    ts_sgrid.append_data(pressure_tv)
+    ts_sgrid.append_data(temp_tv)
+    ts_sgrid.close_structuredGridToVTK()
+
+    # rectilinear grid
+    ts_rgrid = timeseries_rectilinearGrid(FILE_PATH_RECTILINEAR, tv_vec)
+    ts_rgrid.init_rectilinearGridToVTK(X, Y, Z, all_point_data = [["temp", "scalars", temp_tv[0]]])
+    ts_rgrid.append_data(temp_tv)
+    ts_rgrid.close_rectilinearGridToVTK()
+
+    # image data
+    ts_image = timeseries_imageData(FILE_PATH_IMAGE, tv_vec)
+    ts_image.init_imageToVTK(origin = (0.0, 0.0, 0.0), spacing = (X[1], Y[1], Z[1]),
+                             all_point_data = [["temp", "scalars", temp_tv[0]]])
+    ts_image.append_data(temp_tv)
+    ts_image.close_imageToVTK()
+
+if __name__ == "__main__":
+    run()
@@ -6,15 +6,19 @@ Copyright (c) 05-11-2021,  Shawn W. Walker
 """
 
 import os
-from VTKwrite.interface import imageToVTK
+from VTKwrite.interface import imageToVTK, LazyData
 import numpy as np
 
 FILE_PATH = "./image"
+FILE_PATH2 = "./image_lazy"
+FILE_PATH3 = "./image_pyramid"
 def clean():
-    try:
-        os.remove(FILE_PATH + ".vti")
-    except:
-        pass
+    for filename in [FILE_PATH + ".vti", FILE_PATH2 + ".vti", FILE_PATH3 + ".vti", FILE_PATH3 + "_2x.vti",
+                     FILE_PATH3 + "_4x.vti", FILE_PATH3 + "_pyramid.json"]:
+        try:
+            os.remove(filename)
+        except:
+            pass
         
 def run():
     print("Running image...")
@@ -39,6 +43,20 @@ def run():
     comments = [ "comment 1", "comment 2" ]
     imageToVTK(FILE_PATH, all_cell_data = all_cell_data, all_point_data = all_point_data, comments = comments )
 
+    # the same image with previews coarsened 2x and 4x (the pressure is averaged over blocks of cells),
+    # listed in image_pyramid_pyramid.json
+    imageToVTK(FILE_PATH3, all_cell_data = all_cell_data, all_point_data = all_point_data, comments = comments,
+               levels = (2, 4), level_method = "mean")
+
+    # Derived field that is computed while it is written (one chunk at a time):
+    # distance of each point to the origin, with the points numbered in FORTRAN order
+    def radius(start, stop):
+        i, j, k = np.unravel_index(np.arange(start, stop), (nx + 1, ny + 1, nz + 1), order = 'F')
+        return np.sqrt(i**2 + j**2 + k**2)
+
+    all_point_data.append(["radius", "scalars", LazyData(radius, (nx + 1, ny + 1, nz + 1))])
+    imageToVTK(FILE_PATH2, all_point_data = all_point_data, comments = comments )
+
 if __name__ == "__main__":
     run()
 
@@ -0,0 +1,82 @@
+"""
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+Benchmark of the I/O policies (VtkIOPolicy): a sequence of image files with
+several point data arrays is written with each option, and added to a group.
+
+Use:  python io_policy.py [n [nsteps]] [--memory]
+where n is the number of cells in each direction (default 32) and
+nsteps the number of files in each sequence (default 4).
+With --memory, the peak memory of each stage of the writers is reported
+for each file (see VTKwrite.memprofile) and saved to io_policy_memory.json.
+The timings depend a lot on the file system: run it where the data is written.
+"""
+
+import os
+import time
+from VTKwrite.interface import imageToVTK
+from VTKwrite.vtkbin import VtkGroup, VtkIOPolicy
+from VTKwrite.pyvtk import getScratchPool
+import numpy as np
+
+FILE_PATH = "./io_policy"
+POLICIES = [ ["default",           VtkIOPolicy()],
+             ["buffer 4MB",        VtkIOPolicy(buffer_size = 1 << 22)],
+             ["preallocate",       VtkIOPolicy(preallocate = True)],
+             ["sync",              VtkIOPolicy(sync = True)],
+             ["direct",            VtkIOPolicy(direct = True)],
+             ["direct buffer 16MB", VtkIOPolicy(direct = True, buffer_size = 1 << 24)],
+             ["threads 4",         VtkIOPolicy(nthreads = 4)],
+             ["ranges",            VtkIOPolicy(ranges = True)] ]
+def clean():
+    try:
+        os.remove(FILE_PATH + "_memory.json")
+    except:
+        pass
+    for name, policy in POLICIES:
+        path = FILE_PATH + "_" + name.replace(" ", "_")
+        try:
+            os.remove(path + ".pvd")
+        except:
+            pass
+        ii = 0
+        while os.path.exists(path + "_%04d.vti" % ii):
+            os.remove(path + "_%04d.vti" % ii)
+            ii += 1
+
+def run(n = 32, nsteps = 4):
+    print("Running io_policy...")
+
+    # C-ordered (temp) and FORTRAN-ordered (pressure, velocity) data
+    temp = np.random.rand(n + 1, n + 1, n + 1)
+    pressure = np.asfortranarray(np.random.rand(n + 1, n + 1, n + 1))
+    velocity = np.asfortranarray(np.random.rand(3, n + 1, n + 1, n + 1))
+    nbytes = temp.nbytes + pressure.nbytes + velocity.nbytes
+
+    for name, policy in POLICIES:
+        path = FILE_PATH + "_" + name.replace(" ", "_")
+        start = time.perf_counter()
+        g = VtkGroup(path, policy = policy)
+        for ii in range(nsteps):
+            fname = imageToVTK(path + "_%04d" % ii, all_point_data = [["temp", "scalars", temp], ["pressure", "scalars", pressure],
+                               ["velocity", "vectors", velocity]], policy = policy)
+            g.addFile(filepath = fname, sim_time = float(ii))
+        g.save()
+        elapsed = time.perf_counter() - start
+        print("  %-20s %8.3f s  %8.1f MB/s" % (name, elapsed, nsteps * nbytes / elapsed / 1e6))
+
+    # the scratch buffers (e.g. for the transposes of temp) are reused across all the files
+    stats = getScratchPool().getStats()
+    print("  scratch buffers: %d requests, hit rate %.2f, %.1f MB of allocations saved, peak %.1f MB" %
+          (stats["requests"], stats["hit_rate"], stats["saved_bytes"] / 1e6, stats["peak_bytes"] / 1e6))
+
+if __name__ == "__main__":
+    import sys
+    args = [int(a) for a in sys.argv[1:] if a != "--memory"]
+    if "--memory" in sys.argv:
+        from VTKwrite.memprofile import MemoryProfiler
+        with MemoryProfiler() as prof:
+            run(*args)
+        print(prof.report())
+        prof.save(FILE_PATH + "_memory.json")
+    else:
+        run(*args)
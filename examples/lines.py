@@ -10,9 +10,11 @@ from VTKwrite.interface import linesToVTK
 import numpy as np
 
 FILE_PATH = "./lines"
+FILE_PATH2 = "./lines_welded"
 def clean():
     try:
         os.remove(FILE_PATH + ".vtu")
+        os.remove(FILE_PATH2 + ".vtu")
     except:
         pass
         
@@ -54,6 +56,21 @@ def run():
     comments = [ "comment 1", "comment 2" ]
     linesToVTK(FILE_PATH, x, y, z, all_cell_data = all_cell_data, all_point_data = all_point_data, comments = comments)
 
+    # Network of connected segments (the edges of a square grid): each point is shared by up to 4 segments,
+    # but it is written only once with weld = True
+    n = 10
+    i, j = np.meshgrid(np.arange(n), np.arange(n), indexing = 'ij')
+    h_edges = [(i[:-1, :], j[:-1, :]), (i[1:, :], j[1:, :])]
+    v_edges = [(i[:, :-1], j[:, :-1]), (i[:, 1:], j[:, 1:])]
+    # the two end points of each segment are consecutive
+    px = np.stack([np.concatenate([h_edges[0][0].ravel(), v_edges[0][0].ravel()]),
+                   np.concatenate([h_edges[1][0].ravel(), v_edges[1][0].ravel()])], axis = 1).ravel() * 1.0
+    py = np.stack([np.concatenate([h_edges[0][1].ravel(), v_edges[0][1].ravel()]),
+                   np.concatenate([h_edges[1][1].ravel(), v_edges[1][1].ravel()])], axis = 1).ravel() * 1.0
+    pz = np.zeros(px.size)
+    all_point_data = [["height", "scalars", np.sin(px) * np.cos(py)]]
+    linesToVTK(FILE_PATH2, px, py, pz, all_point_data = all_point_data, comments = comments, weld = True)
+
 if __name__ == "__main__":
     run()
 
@@ -0,0 +1,67 @@
+"""
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+Example of how to use the high level multiblockToVTK function.
+This example shows how to tie several regions (with different grid types)
+together in one .vtm file, and how to create a time series of them
+with a VTK group.
+
+Copyright (c) 05-11-2021,  Shawn W. Walker
+"""
+
+import os
+import shutil
+from VTKwrite.interface import multiblockToVTK, unstructuredGridToVTK, structuredToVTK, polyLinesToVTK
+from VTKwrite.vtkbin import VtkGroup, VtkTriangle, VtkQuad
+import numpy as np
+
+FILE_PATH = "./multiblock"
+NUM_STEPS = 3
+def clean():
+    for n in range(NUM_STEPS):
+        try:
+            os.remove(FILE_PATH + "_%04d.vtm" % n)
+        except:
+            pass
+        try:
+            shutil.rmtree(FILE_PATH + "_%04d" % n)
+        except:
+            pass
+    try:
+        os.remove(FILE_PATH + ".pvd")
+    except:
+        pass
+
+def run():
+    print("Running multiblock...")
+
+    # "fluid" region: unstructured grid with two triangles and a quad
+    x = np.array([0.0, 1.0, 2.0, 0.0, 1.0, 2.0])
+    y = np.array([0.0, 0.0, 0.0, 1.0, 1.0, 1.0])
+    z = np.zeros(6)
+    conn = np.array([0, 1, 3,  1, 4, 3,  1, 2, 5, 4])
+    offset = np.array([3, 6, 10])
+    ctype = np.array([VtkTriangle.tid, VtkTriangle.tid, VtkQuad.tid])
+
+    # "solid" region: structured grid above the fluid
+    X, Y, Z = np.meshgrid(np.linspace(0.0, 2.0, 5), np.linspace(1.0, 2.0, 3), np.linspace(0.0, 0.5, 2), indexing = 'ij')
+
+    # "interface" region: one polyline along the fluid/solid boundary
+    lx = np.linspace(0.0, 2.0, 5)
+    ly = np.ones(5)
+    lz = np.zeros(5)
+    pointsPerLine = np.array([5])
+
+    g = VtkGroup(FILE_PATH)
+    for n in range(NUM_STEPS):
+        t = 0.1 * n
+        blocks = []
+        blocks.append(["fluid", unstructuredGridToVTK, dict(x = x, y = y, z = z, connectivity = conn, offsets = offset, cell_types = ctype,
+                                                             all_point_data = [["pressure", "scalars", np.sin(x + t)]])])
+        blocks.append(["structure", [
+                        ["solid", structuredToVTK, dict(x = X, y = Y, z = Z, all_point_data = [["temp", "scalars", Y + t]])],
+                        ["interface", polyLinesToVTK, dict(x = lx, y = ly, z = lz, pointsPerLine = pointsPerLine)] ]])
+        multiblockToVTK(FILE_PATH + "_%04d" % n, blocks, group = g, sim_time = t)
+    g.save()
+
+if __name__ == "__main__":
+    run()
@@ -6,21 +6,28 @@ Copyright (c) 05-11-2021,  Shawn W. Walker
 """
 
 import os
-from VTKwrite.interface import pointsToVTK, pointsToVTKAsTIN
+from VTKwrite.interface import pointsToVTK, pointsToVTKAsTIN, compilePointsToVTK, pointsToVTP
 import numpy as np
 
 FILE_PATH1 = "./rnd_points"
 FILE_PATH2 = "./rnd_points_TIN"
 FILE_PATH3 = "./line_points"
 FILE_PATH4 = "./points_as_lists"
+FILE_PATH5 = "./rnd_points_frame"
 def clean():
     try:
         os.remove(FILE_PATH1 + ".vtu")
         os.remove(FILE_PATH2 + ".vtu")
         os.remove(FILE_PATH3 + ".vtu")
         os.remove(FILE_PATH4 + ".vtu")
+        os.remove(FILE_PATH1 + ".vtp")
     except:
         pass
+    for ii in range(3):
+        try:
+            os.remove(FILE_PATH5 + "%d.vtu" % ii)
+        except:
+            pass
     
 def run():
     print("Running points...")
@@ -43,6 +50,9 @@ def run():
     comments = [ "comment 1", "comment 2" ]
     pointsToVTK(FILE_PATH1, x, y, z, all_point_data = all_point_data, comments = comments) 
 
+    # the same points as PolyData (.vtp), with one vertex per point
+    pointsToVTP(FILE_PATH1, x, y, z, all_point_data = all_point_data, comments = comments)
+
     # Example 2: Export as TIN
     ndim = 2 #only consider x, y coordinates to create the triangulation
     pointsToVTKAsTIN(FILE_PATH2, x, y, z, ndim = ndim, data = all_point_data, comments = comments)
@@ -78,5 +88,20 @@ def run():
     comments = [ "comment 1", "comment 2" ]
     pointsToVTK(FILE_PATH4, x, y, z, all_point_data = all_point_data, comments = comments) 
 
+    # Example 5: Many files with the same structure (e.g. frames of a simulation)
+    npoints = 100
+    x = np.random.rand(npoints)
+    y = np.random.rand(npoints)
+    z = np.random.rand(npoints)
+    temp = np.random.rand(npoints)
+
+    # the plan is compiled once from template arrays...
+    plan = compilePointsToVTK(x, y, z, all_point_data = [["temp", "scalars", temp]])
+    # ... and then each frame only writes the raw data
+    for ii in range(3):
+        x = x + 0.1
+        temp = temp + 1.0
+        plan.write(FILE_PATH5 + "%d" % ii, (x, y, z), temp)
+
 if __name__ == "__main__":
     run()
@@ -6,13 +6,14 @@ Copyright (c) 05-11-2021,  Shawn W. Walker
 """
 
 import os
-from VTKwrite.interface import polyLinesToVTK
+from VTKwrite.interface import polyLinesToVTK, polyLinesToVTP
 import numpy as np
 
 FILE_PATH = "poly_lines"
 def clean():
     try:
         os.remove(FILE_PATH + ".vtu")
+        os.remove(FILE_PATH + ".vtp")
     except:
         pass
         
@@ -59,5 +60,8 @@ def run():
 
     polyLinesToVTK(FILE_PATH, x, y, z, pointsPerLine = pointsPerLine, all_cell_data = all_cell_data, all_point_data = all_point_data)
 
+    # the same lines as PolyData (.vtp): no cell types, and the connectivity is implicit
+    polyLinesToVTP(FILE_PATH, x, y, z, pointsPerLine = pointsPerLine, all_cell_data = all_cell_data, all_point_data = all_point_data)
+
 if __name__ == "__main__":
     run()
@@ -1,8 +1,12 @@
 import shutil
 
+import batch_convert
+import grid_timedep
 import group
 import image
+import io_policy
 import lines
+import multiblock
 import points
 import poly_lines
 import rectilinear 
@@ -10,6 +14,7 @@ import structured
 import structured_ex1 
 import unstructured 
 import unstructured_timedep 
+import volume_surface
 import low_level
 
 def testit(test):
@@ -19,9 +24,13 @@ def testit(test):
         print("  FAILED")
 
 def clean_all():
+    batch_convert.clean()
+    grid_timedep.clean()
     group.clean()
     image.clean()
+    io_policy.clean()
     lines.clean()
+    multiblock.clean()
     points.clean()
     poly_lines.clean()
     rectilinear.clean()
@@ -29,6 +38,7 @@ def clean_all():
     structured_ex1.clean()
     unstructured.clean()
     unstructured_timedep.clean()
+    volume_surface.clean()
     low_level.clean()
     try:
         shutil.rmtree("__pycache__")
@@ -36,9 +46,13 @@ def clean_all():
         pass
     
 def test_all():
+    testit(batch_convert.run)
+    testit(grid_timedep.run)
     testit(group.run)
     testit(image.run)
+    testit(io_policy.run)
     testit(lines.run)
+    testit(multiblock.run)
     testit(points.run)
     testit(poly_lines.run)
     testit(rectilinear.run)
@@ -46,6 +60,7 @@ def test_all():
     testit(structured_ex1.run)
     testit(unstructured.run)
     testit(unstructured_timedep.run)
+    testit(volume_surface.run)
     testit(low_level.run)
 
 if __name__ == "__main__":
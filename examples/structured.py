@@ -11,11 +11,13 @@ import numpy as np
 import random as rnd
 
 FILE_PATH = "./structured"
+FILE_PATH2 = "./structured_downgraded"
 def clean():
-    try:
-        os.remove(FILE_PATH + ".vts")
-    except:
-        pass
+    for filename in [FILE_PATH + ".vts", FILE_PATH2 + ".vti"]:
+        try:
+            os.remove(filename)
+        except:
+            pass
 
 def run():
     print("Running structured...")
@@ -61,5 +63,10 @@ def run():
     comments = [ "comment 1", "comment 2" ]
     structuredToVTK(FILE_PATH, x, y, z, all_cell_data = all_cell_data, all_point_data = all_point_data, comments = comments)
 
+    # without the fluctuation, the grid is uniform: with downgrade, it is written as an image (.vti)
+    x, y, z = np.meshgrid(X, Y, Z, indexing = 'ij')
+    structuredToVTK(FILE_PATH2, x, y, z, all_cell_data = all_cell_data, all_point_data = all_point_data, comments = comments,
+                    downgrade = True)
+
 if __name__ == "__main__":
     run()
@@ -14,11 +14,15 @@ from VTKwrite.vtkbin import VtkTriangle, VtkQuad
 import numpy as np
 
 FILE_PATH = "./unstructured"
+FILE_PATH2 = "./unstructured_reordered"
+FILE_PATH3 = "./unstructured_subset"
+FILE_PATH4 = "./unstructured_rcm"
 def clean():
-    try:
-        os.remove(FILE_PATH + ".vtu")
-    except:
-        pass
+    for filename in [FILE_PATH, FILE_PATH2, FILE_PATH3, FILE_PATH4]:
+        try:
+            os.remove(filename + ".vtu")
+        except:
+            pass
         
 def run():
     print("running unstructured...")
@@ -71,5 +75,18 @@ def run():
     comments = ["comment 1", "comment 2"]
     unstructuredGridToVTK(FILE_PATH, x, y, z, connectivity = conn, offsets = offset, cell_types = ctype, all_cell_data = all_cell_data, all_point_data = all_point_data, comments = comments)
 
+    # the same grid with the points and cells sorted along a Hilbert curve; the original index of
+    # each point and cell is stored as vtkOriginalPointIds and vtkOriginalCellIds
+    unstructuredGridToVTK(FILE_PATH2, x, y, z, connectivity = conn, offsets = offset, cell_types = ctype, all_cell_data = all_cell_data,
+                          all_point_data = all_point_data, comments = comments, reorder = "hilbert", store_permutation = True)
+
+    # or with the reverse Cuthill-McKee ordering of the cells (requires scipy)
+    unstructuredGridToVTK(FILE_PATH4, x, y, z, connectivity = conn, offsets = offset, cell_types = ctype, all_cell_data = all_cell_data,
+                          all_point_data = all_point_data, comments = comments, reorder = "rcm")
+
+    # only the cells with pressure0 > 0.5 (and the points they use)
+    unstructuredGridToVTK(FILE_PATH3, x, y, z, connectivity = conn, offsets = offset, cell_types = ctype, all_cell_data = all_cell_data,
+                          all_point_data = all_point_data, comments = comments, cell_mask = all_cell_data[0][2] > 0.5)
+
 if __name__ == "__main__":
     run()
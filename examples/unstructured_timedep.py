@@ -14,6 +14,7 @@ Copyright (c) 05-11-2021,  Shawn W. Walker
 import os
 from VTKwrite.interface import unstructuredGridToVTK
 from VTKwrite.interface import timeseries_unstructuredGrid
+from VTKwrite.interface import timeseries_shardedUnstructuredGrid
 from VTKwrite.vtkbin import VtkTriangle, VtkQuad
 from VTKwrite.vtkbin import VtkGroup
 import numpy as np
@@ -21,6 +22,9 @@ import numpy as np
 FILE_PATH_GRID = "./unstructured_timedep_grid_only"
 FILE_PATH_ALL  = "./unstructured_timedep_all"
 FILE_PATH_TIME = "./unstructured_timedep_time_values"
+FILE_PATH_SHARDS = "./unstructured_timedep_shards"
+FILE_PATH_DEDUP = "./unstructured_timedep_dedup"
+FILE_PATH_MOVING = "./unstructured_timedep_moving"
 def clean():
     try:
         os.remove(FILE_PATH_GRID + ".vtu")
@@ -34,6 +38,23 @@ def clean():
         os.remove(FILE_PATH_TIME + ".vtu")
     except:
         pass
+    for ii in range(3):
+        try:
+            os.remove(FILE_PATH_SHARDS + "_%04d.vtu" % ii)
+        except:
+            pass
+    try:
+        os.remove(FILE_PATH_SHARDS + ".pvd")
+    except:
+        pass
+    try:
+        os.remove(FILE_PATH_DEDUP + ".vtu")
+    except:
+        pass
+    try:
+        os.remove(FILE_PATH_MOVING + ".vtu")
+    except:
+        pass
 
 def run():
     print("running unstructured_timedep...")
@@ -93,16 +114,15 @@ def run():
     
     pot0_ref = x + y + z
     pot1_ref = np.sin(2*x + y)
-    f0_ref = np.zeros((3,6))
-    f0_ref[0,:] = x
-    f0_ref[1,:] = -z
-    f0_ref[2,:] = 2*y
-    f0_ref = f0_ref.flatten('F')
-    f1_ref = np.zeros((3,6))
-    f1_ref[0,:] = np.cos(x)
-    f1_ref[1,:] = -y
-    f1_ref[2,:] = 3*(x + z)
-    f1_ref = f1_ref.flatten('F')
+    # vector fields can be given directly as (N, 3) arrays
+    f0_ref = np.zeros((6,3))
+    f0_ref[:,0] = x
+    f0_ref[:,1] = -z
+    f0_ref[:,2] = 2*y
+    f1_ref = np.zeros((6,3))
+    f1_ref[:,0] = np.cos(x)
+    f1_ref[:,1] = -y
+    f1_ref[:,2] = 3*(x + z)
     
     p0 = p0_ref
     p1 = p1_ref
@@ -179,5 +199,34 @@ def run():
     # this is useful for non-uniform time steps
     # make sure to hide the fake grid
 
+    # the same data can be split over several files (shards) of at most 2 time steps each;
+    # the data is appended one time step at a time (all the variables, in the same order as above),
+    # and each shard is closed and listed in a .pvd file as soon as it is full.
+    ts_shards = timeseries_shardedUnstructuredGrid(FILE_PATH_SHARDS, tv_vec, max_steps = 2)
+    ts_shards.init_unstructuredGridToVTK(x, y, z, connectivity = conn, offsets = offset, cell_types = ctype, all_cell_data = all_cell_data, all_point_data = all_point_data, comments = comments)
+    for ii in range(5):
+        ts_shards.append_step([p0_tv[ii], p1_tv[ii], v0_tv[ii], v1_tv[ii], pot0_tv[ii], pot1_tv[ii], f0_tv[ii], f1_tv[ii]])
+    ts_shards.close_unstructuredGridToVTK()
+
+    # a material id that only changes once: with dedup, the unchanged time steps are written only once
+    # (their headers point to the same block of the binary section)
+    material_tv = [np.array([1, 1, 2], dtype = "int32")] * 3 + [np.array([1, 2, 2], dtype = "int32")] * 2
+    ts_dedup = timeseries_unstructuredGrid(FILE_PATH_DEDUP, tv_vec, dedup = True)
+    ts_dedup.init_unstructuredGridToVTK(x, y, z, connectivity = conn, offsets = offset, cell_types = ctype,
+                                        all_cell_data = [["material", "scalars", material_tv[0]], ["pressure0", "scalars", p0]],
+                                        comments = comments)
+    ts_dedup.append_data(material_tv)
+    ts_dedup.append_data(p0_tv)
+    ts_dedup.close_unstructuredGridToVTK()
+
+    # a moving mesh: the points are stored at each time step, the cells only once
+    points_tv = [(x + 0.2 * np.sin(np.pi * tv_vec[ii]) * y, y, z) for ii in range(5)]
+    ts_moving = timeseries_unstructuredGrid(FILE_PATH_MOVING, tv_vec)
+    ts_moving.init_unstructuredGridToVTK(x, y, z, connectivity = conn, offsets = offset, cell_types = ctype,
+                                         all_cell_data = [["pressure0", "scalars", p0]], comments = comments, moving_points = True)
+    ts_moving.append_points(points_tv) # first the points...
+    ts_moving.append_data(p0_tv)       # ... then the data
+    ts_moving.close_unstructuredGridToVTK()
+
 if __name__ == "__main__":
     run()
@@ -0,0 +1,58 @@
+"""
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+Example of how to export only the boundary surface of a volume mesh with the
+high level unstructuredGridSurfaceToVTK function.
+The volume is a box of n x n x n hexahedra; each hexahedron is split into 6
+tetrahedra.  Only the boundary faces (triangles) and their points are written,
+with the cell data of their tetrahedron and the point data of their points.
+
+Copyright (c) 02-23-2025,  Shawn W. Walker
+"""
+
+import os
+from VTKwrite.interface import unstructuredGridToVTK, unstructuredGridSurfaceToVTK
+from VTKwrite.vtkbin import VtkTetra
+import numpy as np
+
+FILE_PATH = "./volume_surface"
+VOLUME_PATH = "./volume_surface_volume"
+def clean():
+    for filename in [FILE_PATH + ".vtp", FILE_PATH + ".vtu", VOLUME_PATH + ".vtu"]:
+        try:
+            os.remove(filename)
+        except:
+            pass
+
+def run():
+    print("Running volume_surface...")
+
+    # points of the box
+    n = 10
+    g = np.linspace(0.0, 1.0, n + 1)
+    x, y, z = [a.ravel() for a in np.meshgrid(g, g, g, indexing = "ij")]
+    point_id = lambda i, j, k: (i * (n + 1) + j) * (n + 1) + k
+
+    # 6 tetrahedra in each hexahedron, around its diagonal (v0, v6)
+    i, j, k = [a.ravel() for a in np.meshgrid(np.arange(n), np.arange(n), np.arange(n), indexing = "ij")]
+    v = [point_id(i, j, k), point_id(i + 1, j, k), point_id(i + 1, j + 1, k), point_id(i, j + 1, k),
+         point_id(i, j, k + 1), point_id(i + 1, j, k + 1), point_id(i + 1, j + 1, k + 1), point_id(i, j + 1, k + 1)]
+    tets = [(v[0], v[1], v[2], v[6]), (v[0], v[5], v[1], v[6]), (v[0], v[2], v[3], v[6]),
+            (v[0], v[3], v[7], v[6]), (v[0], v[4], v[5], v[6]), (v[0], v[7], v[4], v[6])]
+    conn = np.concatenate([np.column_stack(t) for t in tets]).ravel()
+    ncells = conn.size // 4
+    offsets = np.arange(1, ncells + 1) * 4
+    ctype = np.full(ncells, VtkTetra.tid, dtype = "uint8")
+
+    all_cell_data = [["cell_id", "scalars", np.arange(ncells, dtype = "float64")]]
+    all_point_data = [["height", "scalars", z.copy()], ["position", "vectors", np.column_stack((x, y, z))]]
+
+    # the whole volume, and its surface (as PolyData, and as an unstructured grid)
+    unstructuredGridToVTK(VOLUME_PATH, x, y, z, conn, offsets, ctype,
+                          all_cell_data = all_cell_data, all_point_data = all_point_data)
+    unstructuredGridSurfaceToVTK(FILE_PATH, x, y, z, conn, offsets, ctype,
+                                 all_cell_data = all_cell_data, all_point_data = all_point_data, store_ids = True)
+    unstructuredGridSurfaceToVTK(FILE_PATH, x, y, z, conn, offsets, ctype,
+                                 all_cell_data = all_cell_data, all_point_data = all_point_data, polydata = False)
+
+if __name__ == "__main__":
+    run()
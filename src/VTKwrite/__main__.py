@@ -0,0 +1,13 @@
+"""
+VTKwrite.__main__.py
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+Entry point of "python -m VTKwrite": batch conversion of .npz/.npy files (see batch.py).
+
+Copyright (c) 02-23-2025,  Shawn W. Walker
+"""
+
+import sys
+from .batch import main
+
+if __name__ == "__main__":
+    sys.exit(main())
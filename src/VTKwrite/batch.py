@@ -0,0 +1,214 @@
+"""
+VTKwrite.batch.py
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+Batch conversion of NumPy files (.npy/.npz) to VTK files, e.g. the states dumped by a simulation.
+
+Use:  python -m VTKwrite SPEC INPUT [INPUT ...] [-o OUTDIR] [-j NWORKERS] [--group NAME]
+
+Each INPUT is a .npz (or .npy) file, or a directory whose .npz/.npy files are all converted
+(in alphabetical order).  Each input file is written to one VTK file with the same name (in OUTDIR),
+by a pool of NWORKERS worker processes, and all of them are added to the VtkGroup (.pvd) NAME.
+
+SPEC is a JSON file that maps the arrays of the input files to the arguments of one of the
+high level functions of VTKwrite.interface, e.g.:
+    {
+      "writer"     : "unstructuredGridToVTK",
+      "static"     : "mesh.npz",
+      "args"       : { "x" : "x", "y" : "y", "z" : "z",
+                       "connectivity" : "conn", "offsets" : "offsets", "cell_types" : "types" },
+      "point_data" : [ ["temperature", "scalars", "T"], ["velocity", "vectors", "u"] ],
+      "cell_data"  : [ ["pressure", "scalars", "p"] ],
+      "time"       : "t"
+    }
+where
+    writer: name of the function, one of WRITERS, e.g. imageToVTK, structuredToVTK, pointsToVTK, unstructuredGridToVTK.
+    static: (optional) file (or list of files) with arrays that are the same for all the inputs (e.g. the mesh);
+            relative paths are relative to the SPEC file.
+    args: arguments of the writer; strings are keys of the arrays (of the input file first, then of the static files),
+          other values (numbers, lists) are passed as they are.  A .npy file has one array, with key "data".
+    point_data, cell_data: (optional) [name, type, key] of each data array (all_point_data and all_cell_data).
+    time: (optional) key of the (scalar) simulation time of each input; by default, the index of the input.
+
+The arrays are memory-mapped (np.load with mmap_mode = 'r', and the uncompressed members of .npz files),
+so they are only read when they are written.  Only the modules needed by the writer are imported
+(e.g. scipy only for pointsToVTKAsTIN).
+
+Copyright (c) 02-23-2025,  Shawn W. Walker
+"""
+
+import argparse
+import json
+import os
+
+_EXTENSIONS = (".npz", ".npy")
+
+# high level functions of VTKwrite.interface that write one file from arrays (the writers of a spec)
+WRITERS = ("imageToVTK", "rectilinearToVTK", "structuredToVTK", "pointsToVTK", "pointsToVTKAsTIN",
+           "linesToVTK", "polyLinesToVTK", "unstructuredGridToVTK", "unstructuredGridSurfaceToVTK",
+           "pointsToVTP", "linesToVTP", "polyLinesToVTP")
+
+# ================================
+#       input functions
+# ================================
+def _mmapNpz(filepath):
+    """ Returns a dictionary with the arrays of an .npz file.  The uncompressed members are memory-mapped;
+        the others (compressed, or with object data type) are read when they are needed. """
+    import zipfile
+    import numpy as np
+    from numpy.lib import format as npformat
+
+    arrays = {}
+    with zipfile.ZipFile(filepath) as zf, open(filepath, "rb") as f:
+        for info in zf.infolist():
+            if not info.filename.endswith(".npy"): continue
+            key = info.filename[:-4]
+            arrays[key] = None
+            if info.compress_type != zipfile.ZIP_STORED: continue
+            # the data of a stored member begins after its local header (30 bytes, the name and the extra field)
+            f.seek(info.header_offset + 26)
+            nname, nextra = np.frombuffer(f.read(4), dtype = "<u2")
+            f.seek(info.header_offset + 30 + int(nname) + int(nextra))
+            version = npformat.read_magic(f)
+            if version == (1, 0):
+                shape, fortran, dtype = npformat.read_array_header_1_0(f)
+            elif version == (2, 0):
+                shape, fortran, dtype = npformat.read_array_header_2_0(f)
+            else:
+                continue
+            if dtype.hasobject: continue
+            arrays[key] = np.memmap(filepath, dtype = dtype, mode = "r", offset = f.tell(), shape = shape,
+                                    order = "F" if fortran else "C")
+    missing = [key for key in arrays if arrays[key] is None]
+    if missing:
+        npz = np.load(filepath)
+        for key in missing: arrays[key] = npz[key]
+    return arrays
+
+def loadArrays(filepath):
+    """ Returns a dictionary with the (memory-mapped) arrays of a .npy (key "data") or .npz file. """
+    import numpy as np
+    if filepath.endswith(".npy"):
+        return { "data" : np.load(filepath, mmap_mode = "r") }
+    return _mmapNpz(filepath)
+
+def listInputs(inputs):
+    """ Returns the list of input files: the files given, and the .npz/.npy files of the directories given. """
+    files = []
+    for path in inputs:
+        if os.path.isdir(path):
+            files += [os.path.join(path, f) for f in sorted(os.listdir(path)) if f.endswith(_EXTENSIONS)]
+        else:
+            assert path.endswith(_EXTENSIONS), "Unsupported input file: " + path
+            files.append(path)
+    return files
+
+def loadSpec(filepath):
+    """ Reads a SPEC file (see the documentation of this module); paths of static files become absolute. """
+    with open(filepath) as f:
+        spec = json.load(f)
+    assert ("writer" in spec), "The spec must give the writer"
+    static = spec.get("static", [])
+    if isinstance(static, str): static = [static]
+    root = os.path.dirname(os.path.abspath(filepath))
+    spec["static"] = [os.path.join(root, s) for s in static]
+    return spec
+
+# ================================
+#       conversion functions
+# ================================
+def _getArray(arrays, key):
+    for a in arrays:
+        if key in a: return a[key]
+    assert False, "Array '%s' not found" % key
+
+def convertFile(spec, filepath, outpath, index = 0, policy = None):
+    """ Converts one input file with spec (a dictionary, see loadSpec).
+
+        PARAMETERS:
+            spec: dictionary with the spec of the conversion.
+            filepath: .npz or .npy input file.
+            outpath: name of the output file without extension.
+            index: index of the input (the default simulation time).
+            policy: (optional) VtkIOPolicy with the I/O options of the file.
+
+        RETURNS:
+            Full path to saved file and its simulation time.
+    """
+    assert (spec["writer"] in WRITERS), "Unknown writer: " + spec["writer"]
+    from . import interface
+    writer = getattr(interface, spec["writer"])
+
+    arrays = [loadArrays(filepath)] + [loadArrays(s) for s in spec["static"]]
+    kwargs = {}
+    for name, value in spec.get("args", {}).items():
+        kwargs[name] = _getArray(arrays, value) if isinstance(value, str) else value
+    for slot, name in (("point_data", "all_point_data"), ("cell_data", "all_cell_data")):
+        if spec.get(slot):
+            if spec["writer"] == "pointsToVTKAsTIN": name = "data"
+            kwargs[name] = [[n, t, _getArray(arrays, key)] for n, t, key in spec[slot]]
+    if policy is not None: kwargs["policy"] = policy
+
+    if spec.get("time"):
+        sim_time = float(_getArray(arrays, spec["time"]))
+    else:
+        sim_time = float(index)
+    return writer(outpath, **kwargs), sim_time
+
+def convertFiles(spec, files, outdir = None, nworkers = None, group = None, policy = None):
+    """ Converts a list of input files with spec; the files are converted in parallel by a pool of worker processes.
+
+        PARAMETERS:
+            spec: dictionary with the spec of the conversion (see loadSpec).
+            files: list of .npz or .npy input files.
+            outdir: (optional) folder of the output files (default: the folder of each input file).
+            nworkers: maximum number of worker processes (default: chosen by concurrent.futures).
+                      Use nworkers = 1 to convert the files in this process, one after the other.
+            group: (optional) name of a VtkGroup file (without extension) where all the output files are added.
+            policy: (optional) VtkIOPolicy with the I/O options of the files.
+
+        RETURNS:
+            List with the full path of the output files.
+    """
+    jobs = []
+    for index, filepath in enumerate(files):
+        folder = outdir if outdir is not None else os.path.dirname(filepath)
+        stem = os.path.splitext(os.path.basename(filepath))[0]
+        jobs.append((filepath, os.path.join(folder, stem), index))
+    if outdir is not None: os.makedirs(outdir, exist_ok = True)
+
+    if nworkers == 1 or len(jobs) <= 1:
+        results = [convertFile(spec, f, out, index, policy) for f, out, index in jobs]
+    else:
+        import concurrent.futures
+        with concurrent.futures.ProcessPoolExecutor(max_workers = nworkers) as pool:
+            futures = [pool.submit(convertFile, spec, f, out, index, policy) for f, out, index in jobs]
+            results = [f.result() for f in futures]
+
+    if group is not None:
+        from .vtkbin import VtkGroup
+        g = VtkGroup(group, policy = policy)
+        for filename, sim_time in results:
+            g.addFile(filepath = filename, sim_time = sim_time)
+        g.save()
+    return [filename for filename, sim_time in results]
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(prog = "python -m VTKwrite",
+                                     description = "Converts .npz/.npy files to VTK files, as given by a JSON spec file.")
+    parser.add_argument("spec", help = "JSON file that maps the arrays of the input files to the arguments of the writer")
+    parser.add_argument("inputs", nargs = "+", help = ".npz/.npy files, or directories with .npz/.npy files")
+    parser.add_argument("-o", "--outdir", default = None, help = "folder of the output files (default: next to the inputs)")
+    parser.add_argument("-j", "--nworkers", type = int, default = None, help = "number of worker processes")
+    parser.add_argument("--group", default = None, help = "name (without extension) of a .pvd file with all the output files")
+    args = parser.parse_args(argv)
+
+    spec = loadSpec(args.spec)
+    files = listInputs(args.inputs)
+    if not files:
+        print("No input files.")
+        return 1
+    for filename in convertFiles(spec, files, args.outdir, args.nworkers, args.group):
+        print(filename)
+    return 0
+
+#
@@ -7,11 +7,22 @@ Copyright (c) 05-07-2021,  Shawn W. Walker
 """
 
 from .vtkbin import * # VtkFile, VtkUnstructuredGrid, etc.
+from .vtkbin import _is_lazy, _lazy_nelem
+from . import memprofile
+from .reorder import meshOrder, pointOrder, permuteCells, permuteData, extractCells
+from .surface import extractSurface
+import concurrent.futures
+import hashlib
+import json
+import logging
+import os
 try:
     import numpy as np
 except:
     print("Numpy is not installed. Please install it before running VTKwrite again.")
 
+_logger = logging.getLogger(__name__)
+
 # =================================
 #       Helper functions
 # =================================
@@ -70,7 +81,7 @@ def _addDataToFile(vtkFile, all_cell_data, all_point_data, time_steps = None):
                 vtkFile.internal_addData(all_point_data[ii][0], all_point_data[ii][2], ncomp_dict[all_point_data[ii][1]])
         vtkFile.closeData("Point")
 
-def _appendDataToFile(vtkFile, all_cell_data, all_point_data):
+def _appendDataToFile(vtkFile, all_cell_data, all_point_data, slab_size = None):
     #dt_strs = ["scalars", "vectors", "normals", "tensors", "tcoords"]
     #ncomp_dict = {"scalars" : 1, "vectors" : 3, "normals" : 3, "tensors" : 9, "tcoords" : 0}
     # SWW: tcoords not supported properly...
@@ -90,22 +101,253 @@ def _appendDataToFile(vtkFile, all_cell_data, all_point_data):
     # cell based data
     for ii in range(len_all_cell_data):
         data = all_cell_data[ii][2]
-        vtkFile.appendData(data)
+        vtkFile.appendData(data, slab_size = slab_size)
 
     # point based data
     for ii in range(len_all_point_data):
         data = all_point_data[ii][2]
-        vtkFile.appendData(data)
+        vtkFile.appendData(data, slab_size = slab_size)
+
+def _getROI(extent, stride, end):
+    ''' Convert an extent (i0, i1, j0, j1, k0, k1) of point indexes (inclusive, like VTK) and a stride
+        into the slices that select the region of interest from the point and the cell arrays of the grid.
+        Also returns the start and end indexes of the region (in the strided index space). '''
+    if extent is None:
+        extent = (0, end[0], 0, end[1], 0, end[2])
+    assert (len(extent) == 6 and len(stride) == 3)
+    point_slices, cell_slices, roi_start, roi_end = [], [], [], []
+    for d in range(3):
+        lo, hi, st = extent[2*d], extent[2*d + 1], stride[d]
+        assert (0 <= lo <= hi <= end[d]), "extent is outside of the grid"
+        assert (st >= 1), "stride must be a positive integer"
+        n = (hi - lo) // st # number of cells in this direction
+        point_slices.append(slice(lo, lo + n*st + 1, st))
+        cell_slices.append(slice(lo, lo + n*st, st))
+        roi_start.append(lo // st)
+        roi_end.append(lo // st + n)
+    return tuple(point_slices), tuple(cell_slices), tuple(roi_start), tuple(roi_end)
+
+class _SlicedArray:
+    ''' A strided region of a 3D array-like object (e.g. an h5py dataset) that is only read
+        when z-slabs of it are requested, i.e. data[:, :, k0:k1] '''
+
+    def __init__(self, data, slices):
+        self.data = data
+        self.ranges = [sl.indices(n) for sl, n in zip(slices, data.shape)] # (start, stop, step)
+        self.shape = tuple(len(range(*r)) for r in self.ranges)
+        self.ndim = 3
+        self.dtype = data.dtype
+
+    def __getitem__(self, key):
+        k0, k1, _ = key[2].indices(self.shape[2])
+        start, stop, step = self.ranges[2]
+        return self.data[slice(*self.ranges[0]), slice(*self.ranges[1]), slice(start + k0*step, start + k1*step, step)]
+
+def _getROIData(all_data, slices, shape):
+    ''' Returns a copy of the all_cell_data (or all_point_data) List of Lists, where each data array
+        is replaced by a strided view of the region of interest (nothing is copied).
+        1D arrays are interpreted as FORTRAN-ordered arrays with the given (3D) shape,
+        preceded by the component axis for vectors; (N, k) arrays as N points with k components. '''
+    ncomp_dict = {"scalars" : 1, "vectors" : 3}
+    if all_data is None:
+        return None
+    roi_data = []
+    for name, dt, data in all_data:
+        ncomp = ncomp_dict[dt]
+        if _is_lazy(data): # computed when it is written: only the whole grid can be written
+            assert all(sl.indices(n) == (0, n, 1) for sl, n in zip(slices, shape)), \
+                "extent and stride are not supported for lazy data"
+            roi_data.append([name, dt, data])
+            continue
+        if (not isinstance(data, (np.ndarray, list, tuple))) and hasattr(data, "shape"):
+            # array-like object that is not in memory (e.g. h5py dataset): slice it lazily
+            assert (ncomp == 1 and len(data.shape) == 3)
+            roi_data.append([name, dt, _SlicedArray(data, slices)])
+            continue
+        if np.ndim(data) == 2: # (N, k) array: its transpose is the FORTRAN-ordered (k, N) array
+            data = data.T
+        if ncomp == 1:
+            data = np.reshape(data, shape, order = 'F')[slices]
+        else:
+            data = np.reshape(data, (ncomp,) + tuple(shape), order = 'F')[(slice(None),) + slices]
+        roi_data.append([name, dt, data])
+    return roi_data
+
+def _blockMean(data, ncomp, shape, factors):
+    ''' Averages cell data (interpreted as in _getROIData, or a 3D array-like object) over the blocks of
+        factors[0] x factors[1] x factors[2] cells, one z-slab of blocks at a time.  Returns a FORTRAN-ordered array
+        of shape (nx // factors[0], ...), preceded by the component axis for vectors (incomplete blocks are dropped). '''
+    assert not _is_lazy(data), "Lazy data cannot be averaged"
+    if isinstance(data, (np.ndarray, list, tuple)):
+        if np.ndim(data) == 2: data = data.T
+        data = np.reshape(data, ((ncomp,) if ncomp > 1 else ()) + tuple(shape), order = 'F')
+    else:
+        assert (ncomp == 1 and len(data.shape) == 3)
+    fx, fy, fz = factors
+    n = [s // f for s, f in zip(shape, factors)]
+    dtype = data.dtype if data.dtype.kind == 'f' else np.dtype('float64')
+    out = np.empty(((ncomp,) if ncomp > 1 else ()) + tuple(n), dtype = dtype, order = 'F')
+    lead = (slice(None),) if ncomp > 1 else ()
+    for k in range(n[2]):
+        slab = np.asarray(data[lead + (slice(0, n[0]*fx), slice(0, n[1]*fy), slice(k*fz, (k + 1)*fz))])
+        blocks = slab.reshape(slab.shape[:-3] + (n[0], fx, n[1], fy, fz))
+        out[lead + (slice(None), slice(None), k)] = blocks.mean(axis = (-4, -2, -1))
+    return out
+
+def _getLevelData(all_cell_data, all_point_data, shape, f, method):
+    ''' Returns the cell and point data of the level of a grid of shape (number of cells) coarsened by f, the slices
+        of its points and the factor of each axis (f, or less for the axes with fewer than f cells).
+        The point data (and the cell data with method "stride") are strided views, the cell data with method "mean"
+        are averaged over the blocks of cells. '''
+    ncomp_dict = {"scalars" : 1, "vectors" : 3}
+    factors = tuple(max(1, min(f, s)) for s in shape)
+    n = [s // fd for s, fd in zip(shape, factors)]
+    point_slices = tuple(slice(0, c*fd + 1, fd) for c, fd in zip(n, factors))
+    cell_slices = tuple(slice(0, c*fd, fd) for c, fd in zip(n, factors))
+    level_points = _getROIData(all_point_data, point_slices, tuple(s + 1 for s in shape))
+    if method == "stride":
+        level_cells = _getROIData(all_cell_data, cell_slices, shape)
+    else:
+        level_cells = None if all_cell_data is None else \
+            [[name, dt, _blockMean(data, ncomp_dict[dt], shape, factors)] for name, dt, data in all_cell_data]
+    return level_cells, level_points, point_slices, factors
+
+def _writeLevels(path, levels, level_method, write_level):
+    ''' Writes the coarse levels of a grid (write_level(level_path, f) writes the level coarsened by f and returns
+        its file name and a dictionary with its description), and the index path_pyramid.json with all the levels. '''
+    assert (level_method in ("stride", "mean")), "Unknown level_method: %s" % level_method
+    entries = []
+    for f in [1] + sorted(set(levels)):
+        assert (f >= 1 and int(f) == f), "The levels must be positive integers"
+        filename, info = write_level(path if f == 1 else "%s_%dx" % (path, f), int(f))
+        entries.append(dict(factor = int(f), file = os.path.basename(filename), bytes = os.path.getsize(filename), **info))
+    index = path + "_pyramid.json"
+    with open(index, "w") as fp:
+        json.dump({ "method" : level_method, "levels" : entries }, fp, indent = 1)
+    return index
+
+def _getImageEnd(all_cell_data, all_point_data):
+    ''' Infer the end indexes of an image from the shape of its (3D) data arrays '''
+    assert (all_cell_data != None or all_point_data != None)
+    end = None
+    
+    if all_cell_data != None:
+        for ii in range(len(all_cell_data)):
+            cellData = all_cell_data[ii]
+            assert (cellData[1] == "scalars")
+            data = cellData[2]
+            end = data.shape
+            break
+
+    if all_point_data != None:
+        for ii in range(len(all_point_data)):
+            pointData = all_point_data[ii]
+            assert (pointData[1] == "scalars")
+            data = pointData[2]
+            end = data.shape
+            end = (end[0] - 1, end[1] - 1, end[2] - 1)
+            break
+    return end
+
+def _detectGridLayout(x, y, z, tol = 1e-9):
+    ''' Checks if the coordinates of a structured grid (3D arrays) are those of a rectilinear grid, i.e. x only varies
+        along the first axis, y along the second and z along the third (e.g. x, y, z = np.meshgrid(..., indexing = 'ij')),
+        and if the spacing along each axis is also uniform.  Coordinates are compared with a tolerance of tol times
+        the size of the grid, i.e. no point is moved by more than that when the grid is downgraded.
+        Returns ("image", (x, y, z) axes), ("rectilinear", (x, y, z) axes) or (None, None). '''
+    if min(x.size, y.size, z.size) == 0: return None, None
+    lo = min(x.min(), y.min(), z.min())
+    hi = max(x.max(), y.max(), z.max())
+    size = hi - lo
+    if size == 0: size = max(abs(hi), abs(lo)) # all the points are equal
+    atol = tol * size
+    axes = []
+    for d, c in enumerate((x, y, z)):
+        other = tuple(a for a in range(3) if a != d)
+        if np.any(c.max(axis = other) - c.min(axis = other) > atol): return None, None # ptp over the other axes
+        index = [0, 0, 0]
+        index[d] = slice(None)
+        axes.append(c[tuple(index)])
+    for a in axes:
+        if a.size < 3: continue
+        # distance of each coordinate to the uniform grid from its first to its last point (as written to the image)
+        uniform = a[0] + np.arange(a.size) * ((a[-1] - a[0]) / (a.size - 1))
+        if np.any(np.abs(a - uniform) > atol): return "rectilinear", axes
+    return "image", axes
 
 def __convertListToArray(list1d):
     ''' If data is a list and no a Numpy array, then it convert it
         to an array, otherwise return the same array '''
-    if (list1d is not None) and (not type(list1d).__name__ == "ndarray"):
+    if (list1d is not None) and (not isinstance(list1d, np.ndarray)) and (not _is_lazy(list1d)):
         assert isinstance(list1d, (list, tuple))
-        return np.array(list1d)
+        with memprofile.stage("convert"):
+            return np.array(list1d)
     else:
         return list1d
 
+def _convertPoints(x, y, z):
+    ''' Returns the points in the form used by VtkFile.addData/appendData and their number:
+        either a tuple (x, y, z) of 1D arrays, or x itself if it is an (N, 3) array (y and z are None) '''
+    if y is None and z is None:
+        x = __convertListToArray(x)
+        assert (x.ndim == 2 and x.shape[1] == 3), "Points must be given as x, y, z or as one (N, 3) array"
+        return x, x.shape[0]
+    assert ( len(x) == len(y) == len(z) )
+    x = __convertListToArray(x)
+    y = __convertListToArray(y)
+    z = __convertListToArray(z)
+    return (x, y, z), x.size
+
+def _dataBytes(data):
+    ''' Size in bytes of a data array (list, numpy or array-like object, tuple of 3 arrays or lazy data source),
+        computed from its shape and data type, i.e. without reading (or computing) the data. '''
+    if _is_lazy(data):
+        return _lazy_nelem(data) * data.ncomp * np.dtype(data.dtype).itemsize
+    if isinstance(data, tuple):
+        return sum(_dataBytes(a) for a in data)
+    if hasattr(data, "shape") and hasattr(data, "dtype"):
+        return int(np.prod(data.shape)) * np.dtype(data.dtype).itemsize
+    return np.asarray(data).nbytes
+
+def _weldPoints(points, npoints, all_point_data, tol = 0.0):
+    ''' Merges the duplicate points, i.e. with the same coordinates and the same values of all the point data,
+        so that no information is lost.  If tol > 0, the coordinates are compared after rounding them to a grid
+        of size tol (the first of the merged points is kept).
+        Returns the (N, 3) array of unique points (in the order of their first occurrence), the index of the unique
+        point of each input point, and a copy of all_point_data with the data of the unique points. '''
+    coords = points if not isinstance(points, tuple) else np.column_stack(points)
+    rows = [np.round(coords / tol).astype(np.int64) if tol > 0 else np.ascontiguousarray(coords)]
+    values = []
+    for name, dt, data in (all_point_data or []):
+        assert not _is_lazy(data), "Lazy data cannot be welded"
+        data = np.column_stack(data) if isinstance(data, tuple) else np.asarray(data)
+        assert (data.size % npoints == 0), "Point data '%s' does not match the number of points" % name
+        values.append(data.reshape(npoints, -1) if data.ndim != 1 or data.size != npoints else data)
+        rows.append(np.ascontiguousarray(values[-1].reshape(npoints, -1)))
+    # each point (and its data) as one opaque row of bytes
+    rows = np.concatenate([r.view(np.uint8).reshape(npoints, -1) for r in rows], axis = 1)
+    keys = np.ascontiguousarray(rows).view(np.dtype((np.void, rows.shape[1]))).ravel()
+    _, first, inverse = np.unique(keys, return_index = True, return_inverse = True)
+    # number the unique points in the order of their first occurrence
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(order.size)
+    first = first[order]
+    welded_data = [[name, dt, data[first]] for (name, dt, _), data in zip(all_point_data or [], values)]
+    return coords[first], rank[inverse.ravel()], (welded_data if all_point_data is not None else None)
+
+def _permuteAllData(all_data, perm, ids_name = None, nelem = None):
+    ''' Returns a copy of the List of Lists all_data with the data arrays in the order perm (new index -> old index)
+        and, if ids_name is given, an extra array with the original index of each element.
+        perm may also select a subset of the nelem elements '''
+    new_data = []
+    for name, dt, data in (all_data or []):
+        assert not _is_lazy(data), "Lazy data cannot be reordered"
+        new_data.append([name, dt, permuteData(data, perm, nelem)])
+    if ids_name is not None:
+        new_data.append([ids_name, "scalars", perm.astype('int32' if perm.size < 2**31 else 'int64')])
+    return new_data if (all_data is not None or ids_name is not None) else None
+
 def __convertDictListToArrays(data):
     ''' If data in dictironary are lists and no a Numpy array,
         then it creates a new dictionary and convert the list to arrays,
@@ -121,7 +363,8 @@ def __convertDictListToArrays(data):
 # =================================
 #       High level functions      
 # =================================
-def imageToVTK(path, origin = (0.0,0.0,0.0), spacing = (1.0,1.0,1.0), all_cell_data = None, all_point_data = None, comments = None ):
+def imageToVTK(path, origin = (0.0,0.0,0.0), spacing = (1.0,1.0,1.0), all_cell_data = None, all_point_data = None, comments = None,
+               extent = None, stride = (1,1,1), slab_size = None, policy = None, levels = None, level_method = "stride"):
     """ Exports data values as a rectangular image.
         
         PARAMETERS:
@@ -134,7 +377,7 @@ def imageToVTK(path, origin = (0.0,0.0,0.0), spacing = (1.0,1.0,1.0), all_cell_d
                     cellData is a List (of length 3) that defines a variable associated with the grid cells:
                         cellData[0] = the *name* of the variable stored;
                         cellData[1] = the *type* of the variable, only "scalars" is allowed here.
-                        cellData[2] = the data array itself, i.e. a 1D list-type object (list, tuple or numpy).
+                        cellData[2] = the data array itself, i.e. a 1D list-type object (list, tuple, numpy or LazyData).
                     Note: all data arrays inside "all_cell_data" must have the same number of elements (number of cells).
                     Note: the length of "all_cell_data" is the number of variables (defined on cells).
             all_point_data: A List of Lists.  It has this format:
@@ -142,53 +385,78 @@ def imageToVTK(path, origin = (0.0,0.0,0.0), spacing = (1.0,1.0,1.0), all_cell_d
                     pointData is a List (of length 3) that defines a variable associated with the grid vertices:
                         pointData[0] = the *name* of the variable stored;
                         pointData[1] = the *type* of the variable, only "scalars" is allowed here.
-                        pointData[2] = the data array itself, i.e. a 1D list-type object (list, tuple or numpy).
+                        pointData[2] = the data array itself, i.e. a 1D list-type object (list, tuple, numpy or LazyData).
                     Note: all data arrays inside "all_point_data" must have the same number of elements (number of vertices).
                     Note: the length of "all_point_data" is the number of variables (defined on vertices).
             comments: list of comment strings, which will be added to the header section of the file.
+            extent: (optional) region of interest (i0, i1, j0, j1, k0, k1), given as (inclusive) point indexes of the grid.
+                    Only this region is written; the data arrays are read through strided views, i.e. the region is not copied.
+                    Default is the whole grid.
+            stride: (optional) only write every stride[d] point in direction d (default = (1,1,1)).
+                    Cell data are sampled at the first cell of every stride[0] x stride[1] x stride[2] block.
+            slab_size: (optional) write the data arrays out-of-core, by z-slabs of slab_size planes.
+                       The data arrays can then be any 3D array-like object that supports slicing, e.g. np.memmap or h5py datasets;
+                       only two slabs are held in memory (the next slab is read while the current one is written).
+                       NOTE: slabs are read fastest when the z axis is the slowest axis in the file, e.g. pass vol.T
+                       for a C-ordered volume vol indexed as vol[z, y, x].
+            policy: (optional) VtkIOPolicy with the I/O options of the file (buffer size, preallocation, sync, O_DIRECT, threads).
+            levels: (optional) list of coarsening factors, e.g. (2, 4, 8): a preview of the image coarsened by each factor
+                    is also written, to path_2x.vti, path_4x.vti, etc., with its spacing scaled by the factor
+                    (the axes with fewer cells than the factor are coarsened to one cell),
+                    and the index path_pyramid.json lists all the levels (factor, file, size, dimensions, origin and spacing).
+                    It cannot be combined with extent and stride.
+            level_method: (optional) how the levels are computed:
+                          "stride" (default): the points and cells are sampled (every factor-th one, nothing is copied);
+                          "mean": the cell data are averaged over the blocks of factor^3 cells (one z-slab of blocks at a time,
+                                  so they can be np.memmap or h5py datasets), and the point data are sampled.
          
          RETURNS:
             Full path to saved file.
 
         NOTE: At least, all_cell_data or all_point_data must be present to infer the dimensions of the image.
     """
-    assert (all_cell_data != None or all_point_data != None)
-    
     # Extract dimensions
-    start = (0,0,0)
-    end = None
-    
-    if all_cell_data != None:
-        for ii in range(len(all_cell_data)):
-            cellData = all_cell_data[ii]
-            assert (cellData[1] == "scalars")
-            data = cellData[2]
-            end = data.shape
-            break
-
-    if all_point_data != None:
-        for ii in range(len(all_point_data)):
-            pointData = all_point_data[ii]
-            assert (pointData[1] == "scalars")
-            data = pointData[2]
-            end = data.shape
-            end = (end[0] - 1, end[1] - 1, end[2] - 1)
-            break
+    end = _getImageEnd(all_cell_data, all_point_data)
+
+    if levels:
+        assert (extent is None and tuple(stride) == (1,1,1)), "levels cannot be combined with extent and stride"
+        files = []
+        def write_level(level_path, f):
+            if f == 1:
+                cells, points, factors = all_cell_data, all_point_data, (1,1,1)
+            else:
+                cells, points, _, factors = _getLevelData(all_cell_data, all_point_data, end, f, level_method)
+            level_spacing = [s * fd for s, fd in zip(spacing, factors)]
+            filename = imageToVTK(level_path, origin, level_spacing, cells, points, comments, slab_size = slab_size, policy = policy)
+            files.append(filename)
+            return filename, dict(dimensions = [e // fd for e, fd in zip(end, factors)], origin = list(origin), spacing = level_spacing)
+        _writeLevels(path, levels, level_method, write_level)
+        return files[0]
+
+    # Extract region of interest
+    point_slices, cell_slices, start, roi_end = _getROI(extent, stride, end)
+    all_cell_data = _getROIData(all_cell_data, cell_slices, end)
+    all_point_data = _getROIData(all_point_data, point_slices, (end[0] + 1, end[1] + 1, end[2] + 1))
+    end = roi_end
+    if tuple(stride) != (1,1,1):
+        # shift the origin, so that the strided indexes start at the correct location
+        origin = [origin[d] + (point_slices[d].start % stride[d]) * spacing[d] for d in range(3)]
+        spacing = [spacing[d] * stride[d] for d in range(3)]
     
     # Write data to file
-    w = VtkFile(path, VtkImageData)
+    w = VtkFile(path, VtkImageData, policy = policy)
     if comments: w.addComments(comments)
     w.openGrid(start = start, end = end, origin = origin, spacing = spacing)
     w.openPiece(start = start, end = end)
     _addDataToFile(w, all_cell_data, all_point_data)
     w.closePiece()
     w.closeGrid()
-    _appendDataToFile(w, all_cell_data, all_point_data)
+    _appendDataToFile(w, all_cell_data, all_point_data, slab_size = slab_size)
     w.save()
     return w.getFileName()
 
 # ==============================================================================
-def rectilinearToVTK(path, x, y, z, all_cell_data = None, all_point_data = None, comments = None):
+def rectilinearToVTK(path, x, y, z, all_cell_data = None, all_point_data = None, comments = None, extent = None, stride = (1,1,1), policy = None):
     """
         Writes data values as a rectilinear or rectangular grid.
 
@@ -203,7 +471,7 @@ def rectilinearToVTK(path, x, y, z, all_cell_data = None, all_point_data = None,
                     cellData is a List (of length 3) that defines a variable associated with the grid cells:
                         cellData[0] = the *name* of the variable stored;
                         cellData[1] = the *type* of the variable, only "scalars" is allowed here.
-                        cellData[2] = the data array itself, i.e. a 1D list-type object (list, tuple or numpy).
+                        cellData[2] = the data array itself, i.e. a 1D list-type object (list, tuple, numpy or LazyData).
                     Note: all data arrays inside "all_cell_data" must have the same number of elements (number of cells).
                     Note: the length of "all_cell_data" is the number of variables (defined on cells).
             all_point_data: A List of Lists.  It has this format:
@@ -211,10 +479,16 @@ def rectilinearToVTK(path, x, y, z, all_cell_data = None, all_point_data = None,
                     pointData is a List (of length 3) that defines a variable associated with the grid vertices:
                         pointData[0] = the *name* of the variable stored;
                         pointData[1] = the *type* of the variable, only "scalars" is allowed here.
-                        pointData[2] = the data array itself, i.e. a 1D list-type object (list, tuple or numpy).
+                        pointData[2] = the data array itself, i.e. a 1D list-type object (list, tuple, numpy or LazyData).
                     Note: all data arrays inside "all_point_data" must have the same number of elements (number of vertices).
                     Note: the length of "all_point_data" is the number of variables (defined on vertices).
             comments: list of comment strings, which will be added to the header section of the file.
+            extent: (optional) region of interest (i0, i1, j0, j1, k0, k1), given as (inclusive) point indexes of the grid.
+                    Only this region is written; the data arrays are read through strided views, i.e. the region is not copied.
+                    Default is the whole grid.
+            stride: (optional) only write every stride[d] point in direction d (default = (1,1,1)).
+                    Cell data are sampled at the first cell of every stride[0] x stride[1] x stride[2] block.
+            policy: (optional) VtkIOPolicy with the I/O options of the file (buffer size, preallocation, sync, O_DIRECT, threads).
             
         RETURNS:
             Full path to saved file.
@@ -224,7 +498,6 @@ def rectilinearToVTK(path, x, y, z, all_cell_data = None, all_point_data = None,
     ftype = VtkRectilinearGrid
     nx, ny, nz = x.size - 1, y.size - 1, z.size - 1
     # Extract dimensions
-    start = (0,0,0)
     end   = (nx, ny, nz)
 
     if all_cell_data != None:
@@ -236,8 +509,14 @@ def rectilinearToVTK(path, x, y, z, all_cell_data = None, all_point_data = None,
         for ii in range(len(all_point_data)):
             pointData = all_point_data[ii]
             assert (pointData[1] == "scalars")
+
+    # Extract region of interest
+    point_slices, cell_slices, start, end = _getROI(extent, stride, end)
+    all_cell_data = _getROIData(all_cell_data, cell_slices, (nx, ny, nz))
+    all_point_data = _getROIData(all_point_data, point_slices, (nx + 1, ny + 1, nz + 1))
+    x, y, z = x[point_slices[0]], y[point_slices[1]], z[point_slices[2]]
     
-    w =  VtkFile(path, ftype)
+    w =  VtkFile(path, ftype, policy = policy)
     if comments: w.addComments(comments)
     w.openGrid(start = start, end = end)
     w.openPiece(start = start, end = end)
@@ -259,7 +538,8 @@ def rectilinearToVTK(path, x, y, z, all_cell_data = None, all_point_data = None,
     return w.getFileName()
     
 
-def structuredToVTK(path, x, y, z, all_cell_data = None, all_point_data = None, comments = None):
+def structuredToVTK(path, x, y, z, all_cell_data = None, all_point_data = None, comments = None, extent = None, stride = (1,1,1), policy = None,
+                    downgrade = False, downgrade_tol = 1e-9, levels = None, level_method = "stride"):
     """
         Writes data values as a rectilinear or rectangular grid.
 
@@ -273,7 +553,8 @@ def structuredToVTK(path, x, y, z, all_cell_data = None, all_point_data = None,
                     cellData is a List (of length 3) that defines a variable associated with the grid cells:
                         cellData[0] = the *name* of the variable stored;
                         cellData[1] = the *type* of the variable, only "scalars" and "vectors" allowed here.
-                        cellData[2] = the data array itself, i.e. a 1D list-type object (list, tuple or numpy).
+                        cellData[2] = the data array itself, i.e. a 1D list-type object (list, tuple, numpy or LazyData),
+                                      or an (N, 3) numpy array for vectors.
                     Note: all data arrays inside "all_cell_data" must have the same number of elements (number of cells).
                     Note: the length of "all_cell_data" is the number of variables (defined on cells).
             all_point_data: A List of Lists.  It has this format:
@@ -281,21 +562,55 @@ def structuredToVTK(path, x, y, z, all_cell_data = None, all_point_data = None,
                     pointData is a List (of length 3) that defines a variable associated with the grid vertices:
                         pointData[0] = the *name* of the variable stored;
                         pointData[1] = the *type* of the variable, only "scalars" and "vectors" allowed here.
-                        pointData[2] = the data array itself, i.e. a 1D list-type object (list, tuple or numpy).
+                        pointData[2] = the data array itself, i.e. a 1D list-type object (list, tuple, numpy or LazyData),
+                                       or an (N, 3) numpy array for vectors.
                     Note: all data arrays inside "all_point_data" must have the same number of elements (number of vertices).
                     Note: the length of "all_point_data" is the number of variables (defined on vertices).
             comments: list of comment strings, which will be added to the header section of the file.
+            extent: (optional) region of interest (i0, i1, j0, j1, k0, k1), given as (inclusive) point indexes of the grid.
+                    Only this region is written; the data arrays are read through strided views, i.e. the region is not copied.
+                    Default is the whole grid.
+            stride: (optional) only write every stride[d] point in direction d (default = (1,1,1)).
+                    Cell data are sampled at the first cell of every stride[0] x stride[1] x stride[2] block.
+            policy: (optional) VtkIOPolicy with the I/O options of the file (buffer size, preallocation, sync, O_DIRECT, threads).
+            downgrade: (optional) if True, the coordinates are checked (e.g. if they were made by np.meshgrid with indexing = 'ij'):
+                       if x only varies along the first axis, y along the second and z along the third, the grid is
+                       written as a rectilinear grid (.vtr) with the 3 axes, and if the spacing is also uniform, as an image (.vti)
+                       with its origin and spacing.  The point and cell data are written as they are, and the size saved is logged
+                       (logger "VTKwrite.interface", level INFO).
+            downgrade_tol: (optional) with downgrade, coordinates are equal if they differ by less than downgrade_tol times
+                           the size of the grid (default 1e-9).
+            levels: (optional) list of coarsening factors, e.g. (2, 4, 8): a preview of the grid coarsened by each factor
+                    (every factor-th point) is also written, to path_2x, path_4x, etc., and the index path_pyramid.json
+                    lists all the levels (factor, file, size and dimensions).  It cannot be combined with extent and stride.
+            level_method: (optional) "stride" (default) or "mean", as in imageToVTK.
             
         RETURNS:
-            Full path to saved file.
+            Full path to saved file (its extension gives the type of grid written).
 
     """
     assert (x.ndim == 3 and y.ndim == 3 and z.ndim == 3), "Wrong arrays dimensions"
+
+    if levels:
+        assert (extent is None and tuple(stride) == (1,1,1)), "levels cannot be combined with extent and stride"
+        shape = tuple(n - 1 for n in x.shape)
+        files = []
+        def write_level(level_path, f):
+            if f == 1:
+                cells, points, lx, ly, lz, factors = all_cell_data, all_point_data, x, y, z, (1,1,1)
+            else:
+                cells, points, slices, factors = _getLevelData(all_cell_data, all_point_data, shape, f, level_method)
+                lx, ly, lz = x[slices], y[slices], z[slices]
+            filename = structuredToVTK(level_path, lx, ly, lz, cells, points, comments, policy = policy,
+                                       downgrade = downgrade, downgrade_tol = downgrade_tol)
+            files.append(filename)
+            return filename, dict(dimensions = [n // fd for n, fd in zip(shape, factors)])
+        _writeLevels(path, levels, level_method, write_level)
+        return files[0]
     
     ftype = VtkStructuredGrid
     s = x.shape
     nx, ny, nz = s[0] - 1, s[1] - 1, s[2] - 1
-    start = (0,0,0)
     end = (nx, ny, nz)
 
     if all_cell_data != None:
@@ -308,20 +623,51 @@ def structuredToVTK(path, x, y, z, all_cell_data = None, all_point_data = None,
             pointData = all_point_data[ii]
             assert ( (pointData[1] == "scalars") or (pointData[1] == "vectors") )
 
-    w =  VtkFile(path, ftype)
+    # Extract region of interest
+    point_slices, cell_slices, start, end = _getROI(extent, stride, end)
+    all_cell_data = _getROIData(all_cell_data, cell_slices, (nx, ny, nz))
+    all_point_data = _getROIData(all_point_data, point_slices, (nx + 1, ny + 1, nz + 1))
+    x, y, z = x[point_slices], y[point_slices], z[point_slices]
+
+    layout, axes = _detectGridLayout(x, y, z, downgrade_tol) if downgrade else (None, None)
+    origin = spacing = None
+    if layout == "image":
+        ftype = VtkImageData
+        spacing = [float(a[-1] - a[0]) / (a.size - 1) if a.size > 1 else 1.0 for a in axes]
+        origin = [float(a[0]) - start[d] * spacing[d] for d, a in enumerate(axes)] # the points are numbered from start
+    elif layout == "rectilinear":
+        ftype = VtkRectilinearGrid
+
+    w =  VtkFile(path, ftype, policy = policy)
     if comments: w.addComments(comments)
-    w.openGrid(start = start, end = end)
+    w.openGrid(start = start, end = end, origin = origin, spacing = spacing)
     w.openPiece(start = start, end = end)
-    w.openElement("Points")
-    w.addData("points", (x,y,z))
-    w.closeElement("Points")
+    if layout == "rectilinear":
+        w.openElement("Coordinates")
+        w.addData("x_coordinates", axes[0])
+        w.addData("y_coordinates", axes[1])
+        w.addData("z_coordinates", axes[2])
+        w.closeElement("Coordinates")
+    elif layout is None:
+        w.openElement("Points")
+        w.addData("points", (x,y,z))
+        w.closeElement("Points")
 
     _addDataToFile(w, all_cell_data = all_cell_data, all_point_data = all_point_data)
     w.closePiece()
     w.closeGrid()
-    w.appendData( (x,y,z) )
+    if layout == "rectilinear":
+        w.appendData(axes[0]).appendData(axes[1]).appendData(axes[2])
+    elif layout is None:
+        w.appendData( (x,y,z) )
     _appendDataToFile(w, all_cell_data = all_cell_data, all_point_data = all_point_data)
     w.save()
+
+    if layout is not None:
+        points_size = x.size * (x.itemsize + y.itemsize + z.itemsize) + 8
+        coords_size = sum(a.nbytes + 8 for a in axes) if layout == "rectilinear" else 0
+        _logger.info("structuredToVTK: %s written as %s, %d bytes of coordinates saved", w.getFileName(), ftype.name,
+                     points_size - coords_size)
     return w.getFileName()
     
 # def gridToVTK(path, x, y, z, cellData = None, pointData = None, comments = None):
@@ -400,31 +746,39 @@ def structuredToVTK(path, x, y, z, all_cell_data = None, all_point_data = None,
 
 
 # ==============================================================================
-def pointsToVTK(path, x, y, z, all_point_data = None, comments = None ):
+def pointsToVTK(path, x, y = None, z = None, all_point_data = None, comments = None, policy = None, weld = False, weld_tol = 0.0,
+                reorder = None, store_permutation = False):
     """
         Export points and associated data as an unstructured grid.
 
         PARAMETERS:
             path: name of the file without extension where data should be saved.
             x, y, z: 1D list-type object (list, tuple or numpy) with coordinates of the points.
+                     Alternatively, x may be an (N, 3) array of points (then y and z must be None); it is written as-is.
             all_point_data: A List of Lists.  It has this format:
                     all_point_data[ii] = pointData, where
                     pointData is a List (of length 3) that defines a variable associated with the grid vertices:
                         pointData[0] = the *name* of the variable stored;
                         pointData[1] = the *type* of the variable, i.e. "scalars", "vectors", "normals", "tensors", or "tcoords".
-                        pointData[2] = the data array itself, i.e. a 1D list-type object (list, tuple or numpy).
+                        pointData[2] = the data array itself, i.e. a 1D list-type object (list, tuple, numpy or LazyData),
+                                       or an (N, k) numpy array (k = 3 for vectors and normals, k = 9 for tensors), which is written as-is.
                     Note: all data arrays inside "all_point_data" must have the same number of elements (number of vertices).
                     Note: the length of "all_point_data" is the number of variables (defined on vertices).
             comments: list of comment strings, which will be added to the header section of the file.
+            policy: (optional) VtkIOPolicy with the I/O options of the file (buffer size, preallocation, sync, O_DIRECT, threads).
+            weld: (optional) if True, the duplicate points (same coordinates and same point data) are written only once.
+            weld_tol: (optional) with weld, the coordinates are compared after rounding them to a grid of size weld_tol
+                      (default 0.0, i.e. only identical coordinates are merged).
+            reorder: (optional) "morton" or "hilbert": the points are written in the order of a space filling curve,
+                     i.e. points that are close in space are also close in the file (see reorder.py).
+            store_permutation: (optional) with reorder, the original index of each point is written as the point data
+                               "vtkOriginalPointIds" (after welding, the index of the welded point).
             
         RETURNS:
             Full path to saved file.
 
     """
-    assert ( len(x) == len(y) == len(z) )
-    x = __convertListToArray(x)
-    y = __convertListToArray(y)
-    z = __convertListToArray(z)
+    points, npoints = _convertPoints(x, y, z)
 
     if all_point_data is not None:
         len_all_point_data = len(all_point_data)
@@ -432,8 +786,16 @@ def pointsToVTK(path, x, y, z, all_point_data = None, comments = None ):
         len_all_point_data = 0
     for ii in range(len_all_point_data):
         all_point_data[ii][2] = __convertListToArray(all_point_data[ii][2])
-    
-    npoints = len(x)
+
+    if weld:
+        points, _, all_point_data = _weldPoints(points, npoints, all_point_data, weld_tol)
+        npoints = points.shape[0]
+
+    if reorder is not None:
+        coords = points if not isinstance(points, tuple) else np.column_stack(points)
+        perm = pointOrder(coords, reorder)
+        points = coords[perm]
+        all_point_data = _permuteAllData(all_point_data, perm, "vtkOriginalPointIds" if store_permutation else None)
     
     # create some temporary arrays to write grid topology
     offsets = np.arange(start = 1, stop = npoints + 1, dtype = 'int32') # index of last node in each cell
@@ -442,13 +804,13 @@ def pointsToVTK(path, x, y, z, all_point_data = None, comments = None ):
    
     cell_types[:] = VtkVertex.tid
 
-    w = VtkFile(path, VtkUnstructuredGrid)
+    w = VtkFile(path, VtkUnstructuredGrid, policy = policy)
     if comments: w.addComments(comments)
     w.openGrid()
     w.openPiece(ncells = npoints, npoints = npoints)
     
     w.openElement("Points")
-    w.addData("points", (x,y,z))
+    w.addData("points", points)
     w.closeElement("Points")
     w.openElement("Cells")
     w.addData("connectivity", connectivity)
@@ -460,7 +822,7 @@ def pointsToVTK(path, x, y, z, all_point_data = None, comments = None ):
 
     w.closePiece()
     w.closeGrid()
-    w.appendData( (x,y,z) )
+    w.appendData(points)
     w.appendData(connectivity).appendData(offsets).appendData(cell_types)
 
     _appendDataToFile(w, all_cell_data = None, all_point_data = all_point_data)
@@ -469,7 +831,67 @@ def pointsToVTK(path, x, y, z, all_point_data = None, comments = None ):
     return w.getFileName()
     
 # ==============================================================================
-def pointsToVTKAsTIN(path, x, y, z, data = None, comments = None, ndim = 2):
+def compilePointsToVTK(x, y = None, z = None, all_point_data = None, comments = None):
+    """
+        Compile a plan to export many times points and associated data with the same structure
+        (number of points, names, types and data types), as done by pointsToVTK.
+        The header and the topology arrays are encoded once; each write only copies them and the raw data.
+
+        PARAMETERS:
+            x, y, z, all_point_data, comments: templates with the same format as in pointsToVTK.
+                     Only the data types and shapes of the arrays are used.
+
+        RETURNS:
+            A compiled VtkPlan.  Use it with:
+                plan.write(path, points, data_0, data_1, ...)
+            where points is a tuple (x, y, z) (or an (N, 3) array, if the template was given that way)
+            and data_ii are the data arrays, in the same order as all_point_data.
+            The arrays must be numpy arrays with the same data type and shape as the templates.
+    """
+    points, npoints = _convertPoints(x, y, z)
+
+    if all_point_data is not None:
+        len_all_point_data = len(all_point_data)
+    else:
+        len_all_point_data = 0
+    for ii in range(len_all_point_data):
+        all_point_data[ii][2] = __convertListToArray(all_point_data[ii][2])
+
+    # create some temporary arrays to write grid topology
+    offsets = np.arange(start = 1, stop = npoints + 1, dtype = 'int32') # index of last node in each cell
+    connectivity = np.arange(npoints, dtype = 'int32')                 # each point is only connected to itself
+    cell_types = np.empty(npoints, dtype = 'uint8')
+
+    cell_types[:] = VtkVertex.tid
+
+    plan = VtkPlan(VtkUnstructuredGrid)
+    w = plan.file
+    if comments: w.addComments(comments)
+    w.openGrid()
+    w.openPiece(ncells = npoints, npoints = npoints)
+
+    w.openElement("Points")
+    w.addData("points", points)
+    w.closeElement("Points")
+    w.openElement("Cells")
+    w.addData("connectivity", connectivity)
+    w.addData("offsets", offsets)
+    w.addData("types", cell_types)
+    w.closeElement("Cells")
+
+    _addDataToFile(w, all_cell_data = None, all_point_data = all_point_data)
+
+    w.closePiece()
+    w.closeGrid()
+    plan.appendVariable("points", points)
+    plan.appendConstant(connectivity).appendConstant(offsets).appendConstant(cell_types)
+    for ii in range(len_all_point_data):
+        plan.appendVariable(all_point_data[ii][0], all_point_data[ii][2])
+
+    return plan.compile()
+
+# ==============================================================================
+def pointsToVTKAsTIN(path, x, y = None, z = None, data = None, comments = None, ndim = 2, policy = None):
     """
         Export points and associated data as a triangular irregular grid.
         It builds a triangular grid that has the input points as nodes
@@ -480,18 +902,21 @@ def pointsToVTKAsTIN(path, x, y, z, data = None, comments = None, ndim = 2):
         PARAMETERS:
             path: name of the file without extension where data should be saved.
             x, y, z: 1D list-type object (list, tuple or numpy) with coordinates of the points.
+                     Alternatively, x may be an (N, 3) array of points (then y and z must be None).
             data: (THIS IS NOT ACTUALLY USED!) A List of Lists.  It has this format:
                     data[ii] = pointData, where
                     pointData is a List (of length 3) that defines a variable associated with the grid vertices:
                         pointData[0] = the *name* of the variable stored;
                         pointData[1] = the *type* of the variable, i.e. "scalars", "vectors", "normals", "tensors", or "tcoords".
-                        pointData[2] = the data array itself, i.e. a 1D list-type object (list, tuple or numpy).
+                        pointData[2] = the data array itself, i.e. a 1D list-type object (list, tuple, numpy or LazyData),
+                                       or an (N, k) numpy array (k = 3 for vectors and normals, k = 9 for tensors), which is written as-is.
                     Note: all data arrays inside "data" must have the same number of elements (number of vertices).
                     Note: the length of "data" is the number of variables (defined on vertices).
             comments: list of comment strings, which will be added to the header section of the file.
             ndim: is the number of dimensions considered when calling Delaunay.
                   If ndim = 2, then only coordinates x and y are passed.
                   If ndim = 3, then x, y and z coordinates are passed.
+            policy: (optional) VtkIOPolicy with the I/O options of the file (buffer size, preallocation, sync, O_DIRECT, threads).
             
         RETURNS:
             Full path to saved file.
@@ -504,6 +929,9 @@ def pointsToVTKAsTIN(path, x, y, z, data = None, comments = None, ndim = 2):
     except:
         print("Failed to import scipy.spatial. Please install it if it is not installed.")
 
+    if y is None and z is None: # (N, 3) array of points
+        x = __convertListToArray(x)
+        x, y, z = x[:, 0], x[:, 1], x[:, 2]
     assert len(x) == len(y) and len(x) == len(z)
     assert (ndim == 2) or (ndim == 3)
     x = __convertListToArray(x)
@@ -537,10 +965,10 @@ def pointsToVTKAsTIN(path, x, y, z, data = None, comments = None, ndim = 2):
     all_point_data = [["Elevation", "scalars", z]]
 
     cell_type = np.ones(ncells) * VtkTriangle.tid
-    unstructuredGridToVTK(path, x, y, z, connectivity = conn, offsets = offset, cell_types = cell_type, all_cell_data = None, all_point_data = all_point_data, comments = None)
+    return unstructuredGridToVTK(path, x, y, z, connectivity = conn, offsets = offset, cell_types = cell_type, all_cell_data = None, all_point_data = all_point_data, comments = None, policy = policy)
         
 # ==============================================================================
-def linesToVTK(path, x, y, z, all_cell_data = None, all_point_data = None, comments = None ):
+def linesToVTK(path, x, y = None, z = None, all_cell_data = None, all_point_data = None, comments = None, policy = None, weld = False, weld_tol = 0.0):
     """
         Export line segments that join 2 points and associated data.
 
@@ -549,12 +977,14 @@ def linesToVTK(path, x, y, z, all_cell_data = None, all_point_data = None, comme
             x, y, z: 1D list-type object (list, tuple or numpy) with coordinates of the vertex of the lines. It is assumed that each line.
                      is defined by two points, then the length of the arrays should be equal to 2 * number of lines.
                      So each consecutive pair of points is a line.
+                     Alternatively, x may be an (N, 3) array of points (then y and z must be None); it is written as-is.
             all_cell_data: A List of Lists.  It has this format:
                     all_cell_data[ii] = cellData, where
                     cellData is a List (of length 3) that defines a variable associated with the grid cells:
                         cellData[0] = the *name* of the variable stored;
                         cellData[1] = the *type* of the variable, i.e. "scalars", "vectors", "normals", "tensors", or "tcoords".
-                        cellData[2] = the data array itself, i.e. a 1D list-type object (list, tuple or numpy).
+                        cellData[2] = the data array itself, i.e. a 1D list-type object (list, tuple, numpy or LazyData),
+                                      or an (N, k) numpy array (k = 3 for vectors and normals, k = 9 for tensors), which is written as-is.
                     Note: all data arrays inside "all_cell_data" must have the same number of elements (number of cells).
                     Note: the length of "all_cell_data" is the number of variables (defined on cells).
             all_point_data: A List of Lists.  It has this format:
@@ -562,21 +992,23 @@ def linesToVTK(path, x, y, z, all_cell_data = None, all_point_data = None, comme
                     pointData is a List (of length 3) that defines a variable associated with the grid vertices:
                         pointData[0] = the *name* of the variable stored;
                         pointData[1] = the *type* of the variable, i.e. "scalars", "vectors", "normals", "tensors", or "tcoords".
-                        pointData[2] = the data array itself, i.e. a 1D list-type object (list, tuple or numpy).
+                        pointData[2] = the data array itself, i.e. a 1D list-type object (list, tuple, numpy or LazyData),
+                                       or an (N, k) numpy array (k = 3 for vectors and normals, k = 9 for tensors), which is written as-is.
                     Note: all data arrays inside "all_point_data" must have the same number of elements (number of vertices).
                     Note: the length of "all_point_data" is the number of variables (defined on vertices).
             comments: list of comment strings, which will be added to the header section of the file.
+            policy: (optional) VtkIOPolicy with the I/O options of the file (buffer size, preallocation, sync, O_DIRECT, threads).
+            weld: (optional) if True, the duplicate points (same coordinates and same point data), e.g. the points shared
+                  by connected lines, are written only once, and the lines refer to them.
+            weld_tol: (optional) with weld, the coordinates are compared after rounding them to a grid of size weld_tol
+                      (default 0.0, i.e. only identical coordinates are merged).
                   
         RETURNS:
             Full path to saved file.
 
     """
-    assert (x.size == y.size == z.size)
-    assert (x.size % 2 == 0)
-    
-    x = __convertListToArray(x)
-    y = __convertListToArray(y)
-    z = __convertListToArray(z)
+    points, npoints = _convertPoints(x, y, z)
+    assert (npoints % 2 == 0)
 
     if all_cell_data is not None:
         len_all_cell_data = len(all_cell_data)
@@ -592,25 +1024,30 @@ def linesToVTK(path, x, y, z, all_cell_data = None, all_point_data = None, comme
     for ii in range(len_all_point_data):
         all_point_data[ii][2] = __convertListToArray(all_point_data[ii][2])
     
-    npoints = len(x)
-    ncells = int(len(x) / 2.0)
+    ncells = int(npoints / 2.0)
     
     # Check all_cell_data has the same size that the number of cells
     
     # create some temporary arrays to write grid topology
     offsets = np.arange(start = 2, step = 2, stop = npoints + 1, dtype = 'int32') # index of last node in each cell
-    connectivity = np.arange(npoints, dtype = 'int32')                          # each point is only connected to itself
-    cell_types = np.empty(npoints, dtype = 'uint8') 
+    if weld: # the lines refer to the unique points
+        points, connectivity, all_point_data = _weldPoints(points, npoints, all_point_data, weld_tol)
+        connectivity = connectivity.astype('int32' if points.shape[0] < 2**31 else 'int64')
+        npoints = points.shape[0]
+        cell_types = np.empty(ncells, dtype = 'uint8')
+    else:
+        connectivity = np.arange(npoints, dtype = 'int32')                      # each point is only connected to itself
+        cell_types = np.empty(npoints, dtype = 'uint8') 
    
     cell_types[:] = VtkLine.tid
 
-    w = VtkFile(path, VtkUnstructuredGrid)
+    w = VtkFile(path, VtkUnstructuredGrid, policy = policy)
     if comments: w.addComments(comments)
     w.openGrid()
     w.openPiece(ncells = ncells, npoints = npoints)
     
     w.openElement("Points")
-    w.addData("points", (x,y,z))
+    w.addData("points", points)
     w.closeElement("Points")
     w.openElement("Cells")
     w.addData("connectivity", connectivity)
@@ -622,7 +1059,7 @@ def linesToVTK(path, x, y, z, all_cell_data = None, all_point_data = None, comme
 
     w.closePiece()
     w.closeGrid()
-    w.appendData( (x,y,z) )
+    w.appendData(points)
     w.appendData(connectivity).appendData(offsets).appendData(cell_types)
 
     _appendDataToFile(w, all_cell_data = all_cell_data, all_point_data = all_point_data)
@@ -631,7 +1068,7 @@ def linesToVTK(path, x, y, z, all_cell_data = None, all_point_data = None, comme
     return w.getFileName()
 
 # ==============================================================================
-def polyLinesToVTK(path, x, y, z, pointsPerLine, all_cell_data = None, all_point_data = None, comments = None ):
+def polyLinesToVTK(path, x, y, z, pointsPerLine, all_cell_data = None, all_point_data = None, comments = None, policy = None):
     """
         Export line segments that joint 2 points and associated data.
 
@@ -639,6 +1076,7 @@ def polyLinesToVTK(path, x, y, z, pointsPerLine, all_cell_data = None, all_point
             path: name of the file without extension where data should be saved.
             x, y, z: 1D list-type object (list, tuple or numpy) arrays with coordinates of the vertices of the lines. It is assumed that each line.
                      has diffent number of points.
+                     Alternatively, x may be an (N, 3) array of points (then y and z must be None); it is written as-is.
             pointsPerLine: 1D list-type object (list, tuple or numpy) array that defines the number of points associated to each line. Thus, 
                            the length of this array defines the number of lines. It also implicitly 
                            defines the connectivity or topology of the set of lines. It is assumed 
@@ -648,7 +1086,8 @@ def polyLinesToVTK(path, x, y, z, pointsPerLine, all_cell_data = None, all_point
                     cellData is a List (of length 3) that defines a variable associated with the grid cells:
                         cellData[0] = the *name* of the variable stored;
                         cellData[1] = the *type* of the variable, i.e. "scalars", "vectors", "normals", "tensors", or "tcoords".
-                        cellData[2] = the data array itself, i.e. a 1D list-type object (list, tuple or numpy).
+                        cellData[2] = the data array itself, i.e. a 1D list-type object (list, tuple, numpy or LazyData),
+                                      or an (N, k) numpy array (k = 3 for vectors and normals, k = 9 for tensors), which is written as-is.
                     Note: all data arrays inside "all_cell_data" must have the same number of elements (number of cells).
                     Note: the length of "all_cell_data" is the number of variables (defined on cells).
             all_point_data: A List of Lists.  It has this format:
@@ -656,20 +1095,18 @@ def polyLinesToVTK(path, x, y, z, pointsPerLine, all_cell_data = None, all_point
                     pointData is a List (of length 3) that defines a variable associated with the grid vertices:
                         pointData[0] = the *name* of the variable stored;
                         pointData[1] = the *type* of the variable, i.e. "scalars", "vectors", "normals", "tensors", or "tcoords".
-                        pointData[2] = the data array itself, i.e. a 1D list-type object (list, tuple or numpy).
+                        pointData[2] = the data array itself, i.e. a 1D list-type object (list, tuple, numpy or LazyData),
+                                       or an (N, k) numpy array (k = 3 for vectors and normals, k = 9 for tensors), which is written as-is.
                     Note: all data arrays inside "all_point_data" must have the same number of elements (number of vertices).
                     Note: the length of "all_point_data" is the number of variables (defined on vertices).
             comments: list of comment strings, which will be added to the header section of the file.
+            policy: (optional) VtkIOPolicy with the I/O options of the file (buffer size, preallocation, sync, O_DIRECT, threads).
             
         RETURNS:
             Full path to saved file.
 
     """
-    assert (x.size == y.size == z.size)
-    
-    x = __convertListToArray(x)
-    y = __convertListToArray(y)
-    z = __convertListToArray(z)
+    points, npoints = _convertPoints(x, y, z)
     
     if all_cell_data is not None:
         len_all_cell_data = len(all_cell_data)
@@ -685,7 +1122,6 @@ def polyLinesToVTK(path, x, y, z, pointsPerLine, all_cell_data = None, all_point
     for ii in range(len_all_point_data):
         all_point_data[ii][2] = __convertListToArray(all_point_data[ii][2])
 
-    npoints = len(x)
     ncells = pointsPerLine.size
     
     # create some temporary arrays to write grid topology
@@ -700,13 +1136,13 @@ def polyLinesToVTK(path, x, y, z, pointsPerLine, all_cell_data = None, all_point
     cell_types = np.empty(npoints, dtype = 'uint8') 
     cell_types[:] = VtkPolyLine.tid
 
-    w = VtkFile(path, VtkUnstructuredGrid)
+    w = VtkFile(path, VtkUnstructuredGrid, policy = policy)
     if comments: w.addComments(comments)
     w.openGrid()
     w.openPiece(ncells = ncells, npoints = npoints)
     
     w.openElement("Points")
-    w.addData("points", (x,y,z))
+    w.addData("points", points)
     w.closeElement("Points")
     w.openElement("Cells")
     w.addData("connectivity", connectivity)
@@ -718,7 +1154,7 @@ def polyLinesToVTK(path, x, y, z, pointsPerLine, all_cell_data = None, all_point
 
     w.closePiece()
     w.closeGrid()
-    w.appendData( (x,y,z) )
+    w.appendData(points)
     w.appendData(connectivity).appendData(offsets).appendData(cell_types)
 
     _appendDataToFile(w, all_cell_data = all_cell_data, all_point_data = all_point_data)
@@ -726,8 +1162,191 @@ def polyLinesToVTK(path, x, y, z, pointsPerLine, all_cell_data = None, all_point
     w.save()
     return w.getFileName()
 
+# =================================
+#       PolyData (.vtp) writers
+# =================================
+def _rangeData(n, step = 1, start = 0):
+    ''' The values start, start + step, ..., start + (n - 1)*step (e.g. the connectivity or the offsets of
+        implicit cells) as LazyData, i.e. they are computed when they are written, one chunk at a time '''
+    dtype = 'int32' if start + n*step < 2**31 else 'int64'
+    return LazyData(lambda i0, i1: np.arange(start + i0*step, start + i1*step, step, dtype = dtype)[:i1 - i0], n, dtype = dtype)
+
+def _polyDataToVTK(path, points, npoints, cells, all_cell_data, all_point_data, comments, policy):
+    ''' Writes a PolyData file; cells is a list of (section, connectivity, offsets, ncells), where section is
+        "Verts", "Lines", "Strips" or "Polys" (the cell data refers to the cells in this order) '''
+    for data in (all_cell_data, all_point_data):
+        for ii in range(len(data) if data is not None else 0):
+            data[ii][2] = __convertListToArray(data[ii][2])
+    ncells = dict((section, n) for section, _, _, n in cells)
+
+    w = VtkFile(path, VtkPolyData, policy = policy)
+    if comments: w.addComments(comments)
+    w.openGrid()
+    w.openPiece(npoints = npoints, nverts = ncells.get("Verts"), nlines = ncells.get("Lines"),
+                nstrips = ncells.get("Strips"), npolys = ncells.get("Polys"))
+
+    w.openElement("Points")
+    w.addData("points", points)
+    w.closeElement("Points")
+    for section, connectivity, offsets, _ in cells:
+        w.openElement(section)
+        w.addData("connectivity", connectivity)
+        w.addData("offsets", offsets)
+        w.closeElement(section)
+
+    _addDataToFile(w, all_cell_data = all_cell_data, all_point_data = all_point_data)
+
+    w.closePiece()
+    w.closeGrid()
+    w.appendData(points)
+    for section, connectivity, offsets, _ in cells:
+        w.appendData(connectivity).appendData(offsets)
+
+    _appendDataToFile(w, all_cell_data = all_cell_data, all_point_data = all_point_data)
+
+    w.save()
+    return w.getFileName()
+
+def pointsToVTP(path, x, y = None, z = None, all_point_data = None, comments = None, policy = None, weld = False, weld_tol = 0.0):
+    """
+        Export points and associated data as PolyData (.vtp), with one vertex (Verts cell) per point.
+        Unlike pointsToVTK, there is no array of cell types, and the (implicit) connectivity and offsets
+        are generated while they are written.
+
+        PARAMETERS:
+            path: name of the file without extension where data should be saved.
+            x, y, z: 1D list-type object (list, tuple or numpy) with coordinates of the points.
+                     Alternatively, x may be an (N, 3) array of points (then y and z must be None); it is written as-is.
+            all_point_data: A List of Lists.  It has this format:
+                    all_point_data[ii] = pointData, where
+                    pointData is a List (of length 3) that defines a variable associated with the grid vertices:
+                        pointData[0] = the *name* of the variable stored;
+                        pointData[1] = the *type* of the variable, i.e. "scalars", "vectors", "normals", "tensors", or "tcoords".
+                        pointData[2] = the data array itself, i.e. a 1D list-type object (list, tuple, numpy or LazyData),
+                                       or an (N, k) numpy array (k = 3 for vectors and normals, k = 9 for tensors), which is written as-is.
+                    Note: all data arrays inside "all_point_data" must have the same number of elements (number of vertices).
+                    Note: the length of "all_point_data" is the number of variables (defined on vertices).
+            comments: list of comment strings, which will be added to the header section of the file.
+            policy: (optional) VtkIOPolicy with the I/O options of the file (buffer size, preallocation, sync, O_DIRECT, threads).
+            weld: (optional) if True, the duplicate points (same coordinates and same point data) are written only once.
+            weld_tol: (optional) with weld, the coordinates are compared after rounding them to a grid of size weld_tol
+                      (default 0.0, i.e. only identical coordinates are merged).
+
+        RETURNS:
+            Full path to saved file.
+    """
+    points, npoints = _convertPoints(x, y, z)
+    if weld:
+        for ii in range(len(all_point_data) if all_point_data is not None else 0):
+            all_point_data[ii][2] = __convertListToArray(all_point_data[ii][2])
+        points, _, all_point_data = _weldPoints(points, npoints, all_point_data, weld_tol)
+        npoints = points.shape[0]
+
+    verts = ("Verts", _rangeData(npoints), _rangeData(npoints, start = 1), npoints)
+    return _polyDataToVTK(path, points, npoints, [verts], None, all_point_data, comments, policy)
+
+def linesToVTP(path, x, y = None, z = None, all_cell_data = None, all_point_data = None, comments = None, policy = None,
+               weld = False, weld_tol = 0.0):
+    """
+        Export line segments that join 2 points and associated data as PolyData (.vtp), i.e. as Lines cells.
+        Unlike linesToVTK, there is no array of cell types, and the (implicit) connectivity and offsets
+        are generated while they are written.
+
+        PARAMETERS:
+            path: name of the file without extension where data should be saved.
+            x, y, z: 1D list-type object (list, tuple or numpy) with coordinates of the vertex of the lines, where
+                     each consecutive pair of points is a line (the length of the arrays is 2 * number of lines).
+                     Alternatively, x may be an (N, 3) array of points (then y and z must be None); it is written as-is.
+            all_cell_data: A List of Lists.  It has this format:
+                    all_cell_data[ii] = cellData, where
+                    cellData is a List (of length 3) that defines a variable associated with the grid cells:
+                        cellData[0] = the *name* of the variable stored;
+                        cellData[1] = the *type* of the variable, i.e. "scalars", "vectors", "normals", "tensors", or "tcoords".
+                        cellData[2] = the data array itself, i.e. a 1D list-type object (list, tuple, numpy or LazyData),
+                                      or an (N, k) numpy array (k = 3 for vectors and normals, k = 9 for tensors), which is written as-is.
+                    Note: all data arrays inside "all_cell_data" must have the same number of elements (number of cells).
+                    Note: the length of "all_cell_data" is the number of variables (defined on cells).
+            all_point_data: A List of Lists.  It has this format:
+                    all_point_data[ii] = pointData, where
+                    pointData is a List (of length 3) that defines a variable associated with the grid vertices:
+                        pointData[0] = the *name* of the variable stored;
+                        pointData[1] = the *type* of the variable, i.e. "scalars", "vectors", "normals", "tensors", or "tcoords".
+                        pointData[2] = the data array itself, i.e. a 1D list-type object (list, tuple, numpy or LazyData),
+                                       or an (N, k) numpy array (k = 3 for vectors and normals, k = 9 for tensors), which is written as-is.
+                    Note: all data arrays inside "all_point_data" must have the same number of elements (number of vertices).
+                    Note: the length of "all_point_data" is the number of variables (defined on vertices).
+            comments: list of comment strings, which will be added to the header section of the file.
+            policy: (optional) VtkIOPolicy with the I/O options of the file (buffer size, preallocation, sync, O_DIRECT, threads).
+            weld: (optional) if True, the duplicate points (same coordinates and same point data), e.g. the points shared
+                  by connected lines, are written only once, and the lines refer to them.
+            weld_tol: (optional) with weld, the coordinates are compared after rounding them to a grid of size weld_tol
+                      (default 0.0, i.e. only identical coordinates are merged).
+
+        RETURNS:
+            Full path to saved file.
+    """
+    points, npoints = _convertPoints(x, y, z)
+    assert (npoints % 2 == 0)
+    ncells = npoints // 2
+
+    if weld: # the lines refer to the unique points
+        for ii in range(len(all_point_data) if all_point_data is not None else 0):
+            all_point_data[ii][2] = __convertListToArray(all_point_data[ii][2])
+        points, connectivity, all_point_data = _weldPoints(points, npoints, all_point_data, weld_tol)
+        npoints = points.shape[0]
+        connectivity = connectivity.astype('int32' if npoints < 2**31 else 'int64')
+    else:
+        connectivity = _rangeData(2 * ncells)
+
+    lines = ("Lines", connectivity, _rangeData(ncells, step = 2, start = 2), ncells)
+    return _polyDataToVTK(path, points, npoints, [lines], all_cell_data, all_point_data, comments, policy)
+
+def polyLinesToVTP(path, x, y, z, pointsPerLine, all_cell_data = None, all_point_data = None, comments = None, policy = None):
+    """
+        Export line segments that join n points and associated data as PolyData (.vtp), i.e. as Lines cells (polylines).
+        Unlike polyLinesToVTK, there is no array of cell types, and the (implicit) connectivity is generated while it is written.
+
+        PARAMETERS:
+            path: name of the file without extension where data should be saved.
+            x, y, z: 1D list-type object (list, tuple or numpy) with coordinates of the vertices of the lines,
+                     the points of each line listed consecutively.
+                     Alternatively, x may be an (N, 3) array of points (then y and z must be None); it is written as-is.
+            pointsPerLine: 1D list-type object (list, tuple or numpy) with the number of points of each line.
+            all_cell_data: A List of Lists.  It has this format:
+                    all_cell_data[ii] = cellData, where
+                    cellData is a List (of length 3) that defines a variable associated with the grid cells:
+                        cellData[0] = the *name* of the variable stored;
+                        cellData[1] = the *type* of the variable, i.e. "scalars", "vectors", "normals", "tensors", or "tcoords".
+                        cellData[2] = the data array itself, i.e. a 1D list-type object (list, tuple, numpy or LazyData),
+                                      or an (N, k) numpy array (k = 3 for vectors and normals, k = 9 for tensors), which is written as-is.
+                    Note: all data arrays inside "all_cell_data" must have the same number of elements (number of cells).
+                    Note: the length of "all_cell_data" is the number of variables (defined on cells).
+            all_point_data: A List of Lists.  It has this format:
+                    all_point_data[ii] = pointData, where
+                    pointData is a List (of length 3) that defines a variable associated with the grid vertices:
+                        pointData[0] = the *name* of the variable stored;
+                        pointData[1] = the *type* of the variable, i.e. "scalars", "vectors", "normals", "tensors", or "tcoords".
+                        pointData[2] = the data array itself, i.e. a 1D list-type object (list, tuple, numpy or LazyData),
+                                       or an (N, k) numpy array (k = 3 for vectors and normals, k = 9 for tensors), which is written as-is.
+                    Note: all data arrays inside "all_point_data" must have the same number of elements (number of vertices).
+                    Note: the length of "all_point_data" is the number of variables (defined on vertices).
+            comments: list of comment strings, which will be added to the header section of the file.
+            policy: (optional) VtkIOPolicy with the I/O options of the file (buffer size, preallocation, sync, O_DIRECT, threads).
+
+        RETURNS:
+            Full path to saved file.
+    """
+    points, npoints = _convertPoints(x, y, z)
+    pointsPerLine = __convertListToArray(pointsPerLine)
+    offsets = np.cumsum(pointsPerLine, dtype = 'int64')
+    assert (offsets.size == 0 or offsets[-1] == npoints), "pointsPerLine does not add up to the number of points"
+    if npoints < 2**31: offsets = offsets.astype('int32')
+
+    lines = ("Lines", _rangeData(npoints), offsets, offsets.size)
+    return _polyDataToVTK(path, points, npoints, [lines], all_cell_data, all_point_data, comments, policy)
+
 def unstructuredGridToVTK(path, x, y, z, connectivity, offsets, cell_types, all_cell_data = None, all_point_data = None, \
-                      comments = None):
+                      comments = None, policy = None, reorder = None, store_permutation = False, cell_mask = None):
     """
         Export unstructured grid and associated data.
 
@@ -735,6 +1354,7 @@ def unstructuredGridToVTK(path, x, y, z, connectivity, offsets, cell_types, all_
             path: name of the file without extension where data should be saved.
             x, y, z: 1D list-type object (list, tuple or numpy) with coordinates of the vertices of cells. It is assumed that each element
                      has diffent number of vertices.
+                     Alternatively, x may be an (N, 3) array of points (then y and z must be None); it is written as-is.
             connectivity: 1D list-type object (list, tuple or numpy) that defines the vertices associated to each element. 
                           Together with offset define the connectivity or topology of the grid. 
                           It is assumed that vertices in an element are listed consecutively.
@@ -748,7 +1368,8 @@ def unstructuredGridToVTK(path, x, y, z, connectivity, offsets, cell_types, all_
                     cellData is a List (of length 3) that defines a variable associated with the grid cells:
                         cellData[0] = the *name* of the variable stored;
                         cellData[1] = the *type* of the variable, i.e. "scalars", "vectors", "normals", "tensors", or "tcoords".
-                        cellData[2] = the data array itself, i.e. a 1D list-type object (list, tuple or numpy).
+                        cellData[2] = the data array itself, i.e. a 1D list-type object (list, tuple, numpy or LazyData),
+                                      or an (N, k) numpy array (k = 3 for vectors and normals, k = 9 for tensors), which is written as-is.
                     Note: all data arrays inside "all_cell_data" must have the same number of elements (number of cells).
                     Note: the length of "all_cell_data" is the number of variables (defined on cells).
             all_point_data: A List of Lists.  It has this format:
@@ -756,19 +1377,28 @@ def unstructuredGridToVTK(path, x, y, z, connectivity, offsets, cell_types, all_
                     pointData is a List (of length 3) that defines a variable associated with the grid vertices:
                         pointData[0] = the *name* of the variable stored;
                         pointData[1] = the *type* of the variable, i.e. "scalars", "vectors", "normals", "tensors", or "tcoords".
-                        pointData[2] = the data array itself, i.e. a 1D list-type object (list, tuple or numpy).
+                        pointData[2] = the data array itself, i.e. a 1D list-type object (list, tuple, numpy or LazyData),
+                                       or an (N, k) numpy array (k = 3 for vectors and normals, k = 9 for tensors), which is written as-is.
                     Note: all data arrays inside "all_point_data" must have the same number of elements (number of vertices).
                     Note: the length of "all_point_data" is the number of variables (defined on vertices).
             comments: list of comment strings, which will be added to the header section of the file.
+            policy: (optional) VtkIOPolicy with the I/O options of the file (buffer size, preallocation, sync, O_DIRECT, threads).
+            reorder: (optional) the points and cells are written in an order that improves their locality (see reorder.py):
+                     "morton" or "hilbert": along a space filling curve (the cells by their centroid);
+                     "rcm": reverse Cuthill-McKee ordering of the cells (cells that share a point are neighbors),
+                            and the points in the order they are used by the cells (requires scipy).
+                     The point and cell data are reordered accordingly.
+            store_permutation: (optional) with reorder or cell_mask, the original index of each point and cell is written as the
+                               point data "vtkOriginalPointIds" and the cell data "vtkOriginalCellIds".
+            cell_mask: (optional) 1D boolean array (one value per cell): only the cells where it is True are written,
+                       with the points they use (renumbered) and the values of the point and cell data of these
+                       points and cells.
             
         RETURNS:
             Full path to saved file.
 
     """
-    assert (x.size == y.size == z.size)
-    x = __convertListToArray(x)
-    y = __convertListToArray(y)
-    z = __convertListToArray(z)
+    points, npoints = _convertPoints(x, y, z)
     connectivity = __convertListToArray(connectivity)
     offsets = __convertListToArray(offsets)
     cell_types = __convertListToArray(cell_types)
@@ -787,17 +1417,38 @@ def unstructuredGridToVTK(path, x, y, z, connectivity, offsets, cell_types, all_
     for ii in range(len_all_point_data):
         all_point_data[ii][2] = __convertListToArray(all_point_data[ii][2])
 
-    npoints = x.size
+    if cell_mask is not None:
+        cell_mask = np.asarray(cell_mask, dtype = bool)
+        assert (cell_mask.shape == (cell_types.size,)), "cell_mask must have one value per cell"
+        cell_ids = np.flatnonzero(cell_mask)
+        assert (cell_ids.size > 0), "cell_mask does not select any cell"
+        connectivity, offsets, point_ids = extractCells(connectivity, offsets, cell_ids, npoints)
+        points = points[point_ids] if not isinstance(points, tuple) else tuple(c[point_ids] for c in points)
+        cell_types = cell_types[cell_ids]
+        all_point_data = _permuteAllData(all_point_data, point_ids, "vtkOriginalPointIds" if store_permutation else None, npoints)
+        all_cell_data = _permuteAllData(all_cell_data, cell_ids, "vtkOriginalCellIds" if store_permutation else None, cell_mask.size)
+        npoints = point_ids.size
+
+    if reorder is not None:
+        coords = points if not isinstance(points, tuple) else np.column_stack(points)
+        point_perm, cell_perm = meshOrder(coords, connectivity, offsets, reorder)
+        points = coords[point_perm]
+        connectivity, offsets = permuteCells(connectivity, offsets, cell_perm, point_perm)
+        cell_types = cell_types[cell_perm]
+        store_ids = store_permutation and cell_mask is None # otherwise the ids of the subset are already in the data
+        all_point_data = _permuteAllData(all_point_data, point_perm, "vtkOriginalPointIds" if store_ids else None)
+        all_cell_data = _permuteAllData(all_cell_data, cell_perm, "vtkOriginalCellIds" if store_ids else None)
+
     ncells = cell_types.size
     assert (offsets.size == ncells)
     
-    w = VtkFile(path, VtkUnstructuredGrid)
+    w = VtkFile(path, VtkUnstructuredGrid, policy = policy)
     if comments: w.addComments(comments)
     w.openGrid()
     w.openPiece(ncells = ncells, npoints = npoints)
     
     w.openElement("Points")
-    w.addData("points", (x,y,z))
+    w.addData("points", points)
     w.closeElement("Points")
     w.openElement("Cells")
     w.addData("connectivity", connectivity)
@@ -810,7 +1461,7 @@ def unstructuredGridToVTK(path, x, y, z, connectivity, offsets, cell_types, all_
     w.closePiece()
     w.closeGrid()
 
-    w.appendData( (x,y,z) )
+    w.appendData(points)
     w.appendData(connectivity).appendData(offsets).appendData(cell_types)
 
     _appendDataToFile(w, all_cell_data = all_cell_data, all_point_data = all_point_data)
@@ -818,6 +1469,52 @@ def unstructuredGridToVTK(path, x, y, z, connectivity, offsets, cell_types, all_
     w.save()
     return w.getFileName()
 
+# ==============================================================================
+def unstructuredGridSurfaceToVTK(path, x, y, z, connectivity, offsets, cell_types, all_cell_data = None, all_point_data = None, \
+                                 comments = None, policy = None, polydata = True, store_ids = False):
+    """
+        Export only the boundary surface of a volume mesh (the faces that are not shared by two cells) and associated data,
+        e.g. a light-weight view of a large mesh.  The cells must be tetrahedra, hexahedra, voxels, wedges or pyramids
+        (see surface.py); the surface is made of triangles and quads, and only the points of the surface are written.
+
+        PARAMETERS:
+            path: name of the file without extension where data should be saved.
+            x, y, z, connectivity, offsets, cell_types: the volume mesh, as in unstructuredGridToVTK.
+            all_cell_data: A List of Lists with the data of the cells of the volume mesh, as in unstructuredGridToVTK.
+                           Each face of the surface gets the values of its cell.
+            all_point_data: A List of Lists with the data of the points of the volume mesh, as in unstructuredGridToVTK.
+                            Only the values of the points of the surface are written.
+            comments: list of comment strings, which will be added to the header section of the file.
+            policy: (optional) VtkIOPolicy with the I/O options of the file (buffer size, preallocation, sync, O_DIRECT, threads).
+            polydata: (optional) if True (default), the surface is written as PolyData (.vtp, Polys cells),
+                      otherwise as an unstructured grid (.vtu).
+            store_ids: (optional) if True, the index (in the volume mesh) of the cell of each face and of each point is
+                       written as the cell data "vtkOriginalCellIds" and the point data "vtkOriginalPointIds".
+
+        RETURNS:
+            Full path to saved file.
+    """
+    points, npoints = _convertPoints(x, y, z)
+    connectivity = __convertListToArray(connectivity)
+    offsets = __convertListToArray(offsets)
+    cell_types = __convertListToArray(cell_types)
+    assert (offsets.size == cell_types.size)
+    for data in (all_cell_data, all_point_data):
+        for ii in range(len(data) if data is not None else 0):
+            data[ii][2] = __convertListToArray(data[ii][2])
+
+    face_conn, face_offsets, face_types, face_cells, point_ids = extractSurface(connectivity, offsets, cell_types)
+    coords = points if not isinstance(points, tuple) else np.column_stack(points)
+    points = coords[point_ids]
+    all_cell_data = _permuteAllData(all_cell_data, face_cells, "vtkOriginalCellIds" if store_ids else None, cell_types.size)
+    all_point_data = _permuteAllData(all_point_data, point_ids, "vtkOriginalPointIds" if store_ids else None, npoints)
+
+    if polydata:
+        polys = ("Polys", face_conn, face_offsets, face_offsets.size)
+        return _polyDataToVTK(path, points, point_ids.size, [polys], all_cell_data, all_point_data, comments, policy)
+    return unstructuredGridToVTK(path, points, None, None, face_conn, face_offsets, face_types, all_cell_data = all_cell_data,
+                                 all_point_data = all_point_data, comments = comments, policy = policy)
+
 # ==============================================================================
 def cylinderToVTK(path, x0, y0, z0, z1, radius, nlayers, npilars = 16, cellData=None, pointData=None, comments = None ):
     """
@@ -902,138 +1599,124 @@ def cylinderToVTK(path, x0, y0, z0, z1, radius, nlayers, npilars = 16, cellData=
     
     return unstructuredGridToVTK(path, xx, yy, zz, connectivity = conn, offsets = offsets, cell_types = ctype, cellData = cellData, pointData = pointData, comments = comments)
 
-# =================================
-#  time-series on unstructuredGrid       
-# =================================
-#unstructuredGridToVTK
-class timeseries_unstructuredGrid:
-    
-    def __ts_convertListToArray(self, list1d):
-        ''' If data is a list and no a Numpy array, then it convert it
-            to an array, otherwise return the same array '''
-        if (list1d is not None) and (not type(list1d).__name__ == "ndarray"):
-            assert isinstance(list1d, (list, tuple))
-            return np.array(list1d)
+# ==============================================================================
+def _collectBlockJobs(blocks, folder, jobs):
+    ''' Walk the tree of blocks (depth first) and collect the (path, writer, kwargs)
+        of every dataset, in the same order used when writing the .vtm index '''
+    for blk in blocks:
+        if len(blk) == 2: # nested block
+            _collectBlockJobs(blk[1], os.path.join(folder, blk[0]), jobs)
         else:
-            return list1d
-
-    def __ts_convertDictListToArrays(self, data):
-        ''' If data in dictironary are lists and no a Numpy array,
-            then it creates a new dictionary and convert the list to arrays,
-            otherwise return the same dictionary '''
-        if data is not None:
-            dict = {}
-            for k, list1d in data.items():
-                dict[k] = self.__ts_convertListToArray(list1d)
-            return dict
+            assert (len(blk) == 3), "Each block must be [name, writer, kwargs] or [name, sub_blocks]"
+            jobs.append( (os.path.join(folder, blk[0]), blk[1], blk[2]) )
+
+def _addBlocksToMultiBlock(mb, blocks, file_names):
+    ''' Walk the tree of blocks (depth first) and add them to the VtkMultiBlock mb '''
+    for blk in blocks:
+        if len(blk) == 2: # nested block
+            mb.openBlock(name = blk[0])
+            _addBlocksToMultiBlock(mb, blk[1], file_names)
+            mb.closeBlock()
         else:
-            return data # None
-    
-    
-    def __init__(self, filepath, time_values):
-        """
-            PARAMETERS:
-                filepath: filename without extension (will be a .vtu file).
-                time_values: numpy array of time values.
-        """
-        self.ftype = VtkUnstructuredGrid
-        self.filename = filepath
-        self.VtkFile_obj = []
-        self.time_values = time_values
-        self.data_order = []
+            mb.addFile(next(file_names), name = blk[0])
 
-    def init_unstructuredGridToVTK(self, x, y, z, connectivity, offsets, cell_types, all_cell_data = None, all_point_data = None, comments = None):
-        """
-            INITIAL Export of unstructured grid and associated data (header info only).
+def multiblockToVTK(path, blocks, nworkers = None, group = None, sim_time = 0.0):
+    """
+        Export several datasets (e.g. the fluid, solid and interface regions of a coupled model)
+        as one vtkMultiBlockDataSet (.vtm) file.  Each dataset is written to its own file,
+        inside a folder named after path, by one of the high level functions of this module;
+        the datasets are written concurrently by a pool of worker threads.
 
-            PARAMETERS:
-                x, y, z: 1D list-type object (list, tuple or numpy) with coordinates of the vertices of cells. It is assumed that each element
-                         has diffent number of vertices.
-                connectivity: 1D list-type object (list, tuple or numpy) that defines the vertices associated to each element. 
-                              Together with offset define the connectivity or topology of the grid. 
-                              It is assumed that vertices in an element are listed consecutively.
-                offsets: 1D list-type object (list, tuple or numpy) with the index of the last vertex of each element in the connectivity array.
-                         It should have length nelem, where nelem is the number of cells or elements in the grid.
-                cell_types: 1D list-type object (list, tuple or numpy) with an integer that defines the cell type of each element in the grid.
-                            It should have size nelem. This should be assigned from pyvtk.vtkbin.VtkXXXX.tid, where XXXX represents
-                            the type of cell. Please check the VTK file format specification for allowed cell types.                       
-                all_cell_data: A List of Lists.  It has this format:
-                        all_cell_data[ii] = cellData, where
-                        cellData is a List (of length 3) that defines a variable associated with the grid cells:
-                            cellData[0] = the *name* of the variable stored;
-                            cellData[1] = the *type* of the variable, i.e. "scalars", "vectors", "normals", "tensors", or "tcoords".
-                            cellData[2] = the data array itself, i.e. a 1D list-type object (list, tuple or numpy).
-                        Note: all data arrays inside "all_cell_data" must have the same number of elements (number of cells).
-                        Note: the length of "all_cell_data" is the number of variables (defined on cells).
-                all_point_data: A List of Lists.  It has this format:
-                        all_point_data[ii] = pointData, where
-                        pointData is a List (of length 3) that defines a variable associated with the grid vertices:
-                            pointData[0] = the *name* of the variable stored;
-                            pointData[1] = the *type* of the variable, i.e. "scalars", "vectors", "normals", "tensors", or "tcoords".
-                            pointData[2] = the data array itself, i.e. a 1D list-type object (list, tuple or numpy).
-                        Note: all data arrays inside "all_point_data" must have the same number of elements (number of vertices).
-                        Note: the length of "all_point_data" is the number of variables (defined on vertices).
-                comments: list of comment strings, which will be added to the header section of the file.
-                
-            RETURNS:
-                XXX
+        PARAMETERS:
+            path: name of the file without extension where the .vtm index should be saved.
+            blocks: A List of Lists (a tree).  Each entry has one of these formats:
+                    blocks[ii] = [name, writer, kwargs], where
+                        name = the *name* of the dataset (also used as its filename);
+                        writer = the high level function used to write it, e.g. unstructuredGridToVTK;
+                        kwargs = a dict with all the arguments of writer, except path.
+                    blocks[ii] = [name, sub_blocks], where
+                        name = the *name* of the (nested) block;
+                        sub_blocks = a List of Lists with the same format as blocks.
+            nworkers: maximum number of worker threads (default: chosen by concurrent.futures).
+                      Use nworkers = 1 to write the datasets one after the other.
+            group: (optional) VtkGroup object; if given, the .vtm file is added to it at time sim_time.
+                   This is how a time series of multiblock datasets is created.
+            sim_time: simulated time of this multiblock dataset (only used with group).
 
-        """
-        assert (x.size == y.size == z.size)
-        x = self.__ts_convertListToArray(x)
-        y = self.__ts_convertListToArray(y)
-        z = self.__ts_convertListToArray(z)
-        connectivity = self.__ts_convertListToArray(connectivity)
-        offsets = self.__ts_convertListToArray(offsets)
-        cell_types = self.__ts_convertListToArray(cell_types)
+        RETURNS:
+            Full path to saved .vtm file.
+    """
+    jobs = []
+    _collectBlockJobs(blocks, path, jobs)
+    for job in jobs:
+        folder = os.path.dirname(job[0])
+        if folder: os.makedirs(folder, exist_ok = True)
+
+    if nworkers == 1:
+        file_names = [writer(job_path, **kwargs) for job_path, writer, kwargs in jobs]
+    else:
+        with concurrent.futures.ThreadPoolExecutor(max_workers = nworkers) as pool:
+            futures = [pool.submit(writer, job_path, **kwargs) for job_path, writer, kwargs in jobs]
+            file_names = [f.result() for f in futures]
 
-        if all_cell_data is not None:
-            len_all_cell_data = len(all_cell_data)
-        else:
-            len_all_cell_data = 0
-        for ii in range(len_all_cell_data):
-            all_cell_data[ii][2] = self.__ts_convertListToArray(all_cell_data[ii][2])
+    mb = VtkMultiBlock(path)
+    _addBlocksToMultiBlock(mb, blocks, iter(file_names))
+    mb.save()
 
-        if all_point_data is not None:
-            len_all_point_data = len(all_point_data)
-        else:
-            len_all_point_data = 0
-        for ii in range(len_all_point_data):
-            all_point_data[ii][2] = self.__ts_convertListToArray(all_point_data[ii][2])
+    if group is not None:
+        group.addFile(filepath = mb.getFileName(), sim_time = sim_time)
+    return mb.getFileName()
 
-        npoints = x.size
-        ncells = cell_types.size
-        assert (offsets.size == ncells)
+# =================================
+#  time-series (common part)
+# =================================
+class timeseries_grid:
+    """ Common part of the time-series classes: one file that stores a static grid (written once)
+        and a sequence of time-dependent data arrays (tagged with TimeStep). """
 
-        self.VtkFile_obj = VtkFile(self.filename, VtkUnstructuredGrid)
+    def __init__(self, filepath, time_values, ftype, policy = None, dedup = False, dedup_tol = 0.0):
+        """
+            PARAMETERS:
+                filepath: filename without extension.
+                time_values: numpy array of time values.
+                ftype: file type, e.g. VtkStructuredGrid, etc.
+                policy: (optional) VtkIOPolicy with the I/O options of the file.
+                dedup: (optional) if True, a time step of a variable that is equal to an earlier time step of the same
+                       variable is not written again: its header refers to the block of the earlier step (see VtkFile.shareData).
+                dedup_tol: (optional) with dedup, floating point values are compared after rounding them to a grid of
+                           size dedup_tol (default 0.0, i.e. only identical steps are shared).
+        """
+        self.ftype = ftype
+        self.policy = policy
+        self.dedup = dedup
+        self.dedup_tol = dedup_tol
+        self.nshared = 0 # number of time steps that were shared
+        self.moving_points = False # time-dependent points (see timeseries_unstructuredGrid)
+        self.points_appended = False
+        self.step_major = False # data appended one time step at a time (see append_step)
+        self.step_keys = None   # step_major and dedup: keys of the distinct steps of each variable (see _appendStep)
+        self.filename = filepath
+        self.VtkFile_obj = []
+        self.time_values = time_values
+        self.data_order = []
+
+    def _openGrid(self, comments, **kwargs):
+        """ Creates the file and opens the grid section (with the TimeValues attribute). """
+        shared_blocks = self.dedup or self.moving_points or self.step_major
+        self.VtkFile_obj = VtkFile(self.filename, self.ftype, policy = self.policy, shared_blocks = shared_blocks)
         if comments: self.VtkFile_obj.addComments(comments)
-        
+
         num_time_indices = len(self.time_values)
         time_indices = np.arange(num_time_indices)
         time_values_str = ' '.join(map(str, time_indices))
-        self.VtkFile_obj.openGrid(time_values = time_values_str)
-        
-        self.VtkFile_obj.openPiece(ncells = ncells, npoints = npoints)
-        self.VtkFile_obj.openElement("Points")
-        self.VtkFile_obj.addData("points", (x,y,z))
-        self.VtkFile_obj.closeElement("Points")
-        self.VtkFile_obj.openElement("Cells")
-        self.VtkFile_obj.addData("connectivity", connectivity)
-        self.VtkFile_obj.addData("offsets", offsets)
-        self.VtkFile_obj.addData("types", cell_types)
-        self.VtkFile_obj.closeElement("Cells")
-        
-        #self.data_order
+        self.VtkFile_obj.openGrid(time_values = time_values_str, **kwargs)
+
+    def _addData(self, all_cell_data, all_point_data):
+        """ Adds the headers of all the time-dependent data arrays. """
         # create time-step indices
         time_steps = np.arange(len(self.time_values))
         _addDataToFile(self.VtkFile_obj, all_cell_data = all_cell_data, all_point_data = all_point_data, time_steps = time_steps)
 
-        self.VtkFile_obj.closePiece()
-        self.VtkFile_obj.closeGrid()
-
-        self.VtkFile_obj.appendData( (x,y,z) )
-        self.VtkFile_obj.appendData(connectivity).appendData(offsets).appendData(cell_types)
-
     def append_data(self, varData):
         """
         Append data array (for a variable) at a specific time value.
@@ -1044,22 +1727,58 @@ class timeseries_unstructuredGrid:
         """
 
         assert ( varData is not None )
+        assert not self.step_major, "The data must be appended one time step at a time (see append_step)"
+        assert not (self.moving_points and not self.points_appended), "The points must be appended first (see append_points)"
         
         # append data to binary section
 
         # loop through the time sequence
+        steps = {} # key of each (distinct) step -> index of its data array
         for ii in range(len(varData)):
-            data = varData[ii]
-            self.VtkFile_obj.appendData(data)
+            self._appendStep(varData[ii], steps)
 
-    def close_unstructuredGridToVTK(self):
+    def append_step(self, stepData):
         """
-        Close the file.
+        Append the data of all the variables at the next time value (only with step_major, see init_unstructuredGridToVTK).
 
-        RETURNS:
-            Full path to saved file.
+        PARAMETERS:
+            stepData is a List where
+                    stepData[ii] = the data array of variable ii at this time step, i.e. a 1D list-type object
+                                   (list, tuple or numpy), in the order of the variables in all_cell_data and then
+                                   all_point_data.  With moving_points, the points of this time step come first
+                                   (see append_points).
         """
-
+        assert self.step_major, "The data must be appended one variable at a time (see append_data)"
+        assert (len(stepData) == len(self.step_keys)), "One data array per variable is required"
+        for data, steps in zip(stepData, self.step_keys):
+            self._appendStep(data, steps)
+
+    def _appendStep(self, data, steps):
+        ''' Appends the data of a variable at one time step.  With dedup, its block is shared if it is equal to the block
+            of an earlier step in steps (key of each distinct step of the variable -> index of its data array). '''
+        if self.dedup:
+            key = self._stepKey(data)
+            if key is not None and key in steps:
+                self.VtkFile_obj.shareData(steps[key])
+                self.nshared += 1
+                return
+            if key is not None: steps[key] = self.VtkFile_obj.nextHeader()
+        self.VtkFile_obj.appendData(data)
+
+    def _stepKey(self, data):
+        """ Hash of the values of a time step (None for lazy data, which is never shared). """
+        if _is_lazy(data): return None
+        h = hashlib.blake2b(digest_size = 20)
+        for a in (data if isinstance(data, tuple) else (data,)):
+            a = np.asarray(a)
+            if self.dedup_tol > 0 and a.dtype.kind == 'f':
+                a = np.round(a / self.dedup_tol)
+            h.update(repr((a.dtype.str, a.shape)).encode("ascii"))
+            h.update(a.ravel(order = 'F')) # a fixed order of the values, whatever the memory layout of a
+        return h.digest()
+
+    def _close(self):
+        """ Close the file and return the full path to it. """
         self.VtkFile_obj.save()
         return self.VtkFile_obj.getFileName()
 
@@ -1129,3 +1848,489 @@ class timeseries_unstructuredGrid:
         time_file.close()
         
         return full_file
+
+# =================================
+#  time-series on unstructuredGrid       
+# =================================
+#unstructuredGridToVTK
+class timeseries_unstructuredGrid(timeseries_grid):
+    
+    def __ts_convertListToArray(self, list1d):
+        ''' If data is a list and no a Numpy array, then it convert it
+            to an array, otherwise return the same array '''
+        if (list1d is not None) and (not isinstance(list1d, np.ndarray)) and (not _is_lazy(list1d)):
+            assert isinstance(list1d, (list, tuple))
+            with memprofile.stage("convert"):
+                return np.array(list1d)
+        else:
+            return list1d
+
+    def __ts_convertDictListToArrays(self, data):
+        ''' If data in dictironary are lists and no a Numpy array,
+            then it creates a new dictionary and convert the list to arrays,
+            otherwise return the same dictionary '''
+        if data is not None:
+            dict = {}
+            for k, list1d in data.items():
+                dict[k] = self.__ts_convertListToArray(list1d)
+            return dict
+        else:
+            return data # None
+    
+    
+    def __init__(self, filepath, time_values, policy = None, dedup = False, dedup_tol = 0.0):
+        """
+            PARAMETERS:
+                filepath: filename without extension (will be a .vtu file).
+                time_values: numpy array of time values.
+                policy: (optional) VtkIOPolicy with the I/O options of the file.
+                dedup: (optional) if True, a time step of a variable that is equal to an earlier time step of the same
+                       variable (e.g. a mask or material ids that do not change) is written only once: the headers of
+                       both steps point to the same appended block.
+                dedup_tol: (optional) with dedup, floating point values are compared after rounding them to a grid of
+                           size dedup_tol (default 0.0, i.e. only identical steps are shared).
+        """
+        timeseries_grid.__init__(self, filepath, time_values, VtkUnstructuredGrid, policy, dedup, dedup_tol)
+
+    def init_unstructuredGridToVTK(self, x, y, z, connectivity, offsets, cell_types, all_cell_data = None, all_point_data = None, comments = None,
+                                   moving_points = False, step_major = False):
+        """
+            INITIAL Export of unstructured grid and associated data (header info only).
+
+            PARAMETERS:
+                x, y, z: 1D list-type object (list, tuple or numpy) with coordinates of the vertices of cells. It is assumed that each element
+                         has diffent number of vertices.
+                         Alternatively, x may be an (N, 3) array of points (then y and z must be None); it is written as-is.
+                connectivity: 1D list-type object (list, tuple or numpy) that defines the vertices associated to each element. 
+                              Together with offset define the connectivity or topology of the grid. 
+                              It is assumed that vertices in an element are listed consecutively.
+                offsets: 1D list-type object (list, tuple or numpy) with the index of the last vertex of each element in the connectivity array.
+                         It should have length nelem, where nelem is the number of cells or elements in the grid.
+                cell_types: 1D list-type object (list, tuple or numpy) with an integer that defines the cell type of each element in the grid.
+                            It should have size nelem. This should be assigned from pyvtk.vtkbin.VtkXXXX.tid, where XXXX represents
+                            the type of cell. Please check the VTK file format specification for allowed cell types.                       
+                all_cell_data: A List of Lists.  It has this format:
+                        all_cell_data[ii] = cellData, where
+                        cellData is a List (of length 3) that defines a variable associated with the grid cells:
+                            cellData[0] = the *name* of the variable stored;
+                            cellData[1] = the *type* of the variable, i.e. "scalars", "vectors", "normals", "tensors", or "tcoords".
+                            cellData[2] = the data array itself, i.e. a 1D list-type object (list, tuple, numpy or LazyData),
+                                          or an (N, k) numpy array (k = 3 for vectors and normals, k = 9 for tensors), which is written as-is.
+                        Note: all data arrays inside "all_cell_data" must have the same number of elements (number of cells).
+                        Note: the length of "all_cell_data" is the number of variables (defined on cells).
+                all_point_data: A List of Lists.  It has this format:
+                        all_point_data[ii] = pointData, where
+                        pointData is a List (of length 3) that defines a variable associated with the grid vertices:
+                            pointData[0] = the *name* of the variable stored;
+                            pointData[1] = the *type* of the variable, i.e. "scalars", "vectors", "normals", "tensors", or "tcoords".
+                            pointData[2] = the data array itself, i.e. a 1D list-type object (list, tuple, numpy or LazyData),
+                                           or an (N, k) numpy array (k = 3 for vectors and normals, k = 9 for tensors), which is written as-is.
+                        Note: all data arrays inside "all_point_data" must have the same number of elements (number of vertices).
+                        Note: the length of "all_point_data" is the number of variables (defined on vertices).
+                comments: list of comment strings, which will be added to the header section of the file.
+                moving_points: (optional) if True, the points move, i.e. they are stored at each time step (TimeStep-tagged
+                               Points arrays), while the cells are written only once.  Then x, y, z are only used as a
+                               template (number of points and data type), and the points of all the time steps must be
+                               given by append_points, right after this function (before append_data).
+                step_major: (optional) if True, the data is appended one time step at a time (all the variables of
+                            a time step, see append_step) instead of one variable at a time (see append_data).
+                
+            RETURNS:
+                XXX
+
+        """
+        points, npoints = _convertPoints(x, y, z)
+        connectivity = self.__ts_convertListToArray(connectivity)
+        offsets = self.__ts_convertListToArray(offsets)
+        cell_types = self.__ts_convertListToArray(cell_types)
+
+        if all_cell_data is not None:
+            len_all_cell_data = len(all_cell_data)
+        else:
+            len_all_cell_data = 0
+        for ii in range(len_all_cell_data):
+            all_cell_data[ii][2] = self.__ts_convertListToArray(all_cell_data[ii][2])
+
+        if all_point_data is not None:
+            len_all_point_data = len(all_point_data)
+        else:
+            len_all_point_data = 0
+        for ii in range(len_all_point_data):
+            all_point_data[ii][2] = self.__ts_convertListToArray(all_point_data[ii][2])
+
+        ncells = cell_types.size
+        assert (offsets.size == ncells)
+
+        self.moving_points = moving_points
+        self.points_appended = False
+        self.step_major = step_major
+        self.npoints = npoints
+        self.points_dtype = (points[0] if isinstance(points, tuple) else points).dtype
+        nsteps = len(self.time_values)
+
+        self._openGrid(comments)
+        self.VtkFile_obj.openPiece(ncells = ncells, npoints = npoints)
+        self.VtkFile_obj.openElement("Points")
+        if moving_points:
+            for ti in range(nsteps):
+                self.VtkFile_obj.addHeader("points", self.points_dtype.name, npoints, 3, str(ti))
+        else:
+            self.VtkFile_obj.addData("points", points)
+        self.VtkFile_obj.closeElement("Points")
+        self.VtkFile_obj.openElement("Cells")
+        self.VtkFile_obj.addData("connectivity", connectivity)
+        self.VtkFile_obj.addData("offsets", offsets)
+        self.VtkFile_obj.addData("types", cell_types)
+        self.VtkFile_obj.closeElement("Cells")
+        
+        self._addData(all_cell_data, all_point_data)
+
+        self.VtkFile_obj.closePiece()
+        self.VtkFile_obj.closeGrid()
+
+        nheaders = len(self.VtkFile_obj.names)
+        if step_major:
+            # the grid is written first, then the points (with moving_points) and the variables of each time step
+            first = nsteps + 3 if moving_points else 4 # first header of the data
+            nvars = (nheaders - first) // nsteps
+            order = [nsteps, nsteps + 1, nsteps + 2] if moving_points else [0, 1, 2, 3]
+            for ti in range(nsteps):
+                if moving_points: order.append(ti)
+                order += [first + v * nsteps + ti for v in range(nvars)]
+            self.VtkFile_obj.setAppendOrder(order)
+            self.step_keys = [{} for v in range(nvars + moving_points)]
+        elif moving_points:
+            # the cells are written first, then the points of each time step (see append_points) and the data
+            self.VtkFile_obj.setAppendOrder([nsteps, nsteps + 1, nsteps + 2] + list(range(nsteps)) + list(range(nsteps + 3, nheaders)))
+        if not moving_points:
+            self.VtkFile_obj.appendData(points)
+        self.VtkFile_obj.appendData(connectivity).appendData(offsets).appendData(cell_types)
+
+    def append_points(self, pointsData):
+        """
+        Append the points at all the time values (only with moving_points, see init_unstructuredGridToVTK).
+        It must be called right after init_unstructuredGridToVTK, before append_data.
+
+        PARAMETERS:
+            pointsData is a List where
+                    pointsData[ii] = the points at time step ii, i.e. an (N, 3) numpy array, or a tuple (x, y, z) of
+                                     1D list-type objects (list, tuple or numpy) with the coordinates.
+        """
+        assert self.moving_points, "The points are not time-dependent (see moving_points)"
+        assert not self.step_major, "The points must be appended with the data of each time step (see append_step)"
+        assert (self.VtkFile_obj.nappended == 3), "append_points must be called right after init_unstructuredGridToVTK"
+        assert (len(pointsData) == len(self.time_values))
+        steps = [self._convertStepPoints(p) for p in pointsData]
+        self.points_appended = True
+        self.append_data(steps)
+
+    def append_step(self, stepData):
+        """
+        Append the data of all the variables at the next time value (only with step_major, see init_unstructuredGridToVTK).
+
+        PARAMETERS:
+            stepData: same as timeseries_grid.append_step.  With moving_points, stepData[0] = the points at this
+                      time step (same format as pointsData[ii] in append_points).
+        """
+        if self.moving_points:
+            stepData = [self._convertStepPoints(stepData[0])] + list(stepData[1:])
+        timeseries_grid.append_step(self, stepData)
+
+    def _convertStepPoints(self, p):
+        ''' Converts the points of one time step ((N, 3) array or tuple (x, y, z)), which must match the template. '''
+        points, npoints = _convertPoints(*p) if isinstance(p, tuple) else _convertPoints(p, None, None)
+        dtype = (points[0] if isinstance(points, tuple) else points).dtype
+        assert (npoints == self.npoints and dtype == self.points_dtype), "The points must have the size and type of the template"
+        return points
+
+    def close_unstructuredGridToVTK(self):
+        """
+        Close the file.
+
+        RETURNS:
+            Full path to saved file.
+        """
+
+        return self._close()
+
+# =================================
+#  time-series on structured, rectilinear and image grids
+# =================================
+class timeseries_structuredGrid(timeseries_grid):
+
+    def __init__(self, filepath, time_values, policy = None):
+        """
+            PARAMETERS:
+                filepath: filename without extension (will be a .vts file).
+                time_values: numpy array of time values.
+                policy: (optional) VtkIOPolicy with the I/O options of the file.
+        """
+        timeseries_grid.__init__(self, filepath, time_values, VtkStructuredGrid, policy)
+
+    def init_structuredGridToVTK(self, x, y, z, all_cell_data = None, all_point_data = None, comments = None):
+        """
+            INITIAL Export of structured grid and associated data (header info only).
+            The points are written once; the data arrays are then written with append_data.
+
+            PARAMETERS:
+                x, y, z: coordinates of the nodes of the grid as 3D arrays (see structuredToVTK).
+                all_cell_data, all_point_data: same format as in structuredToVTK, i.e. a List of Lists
+                        [name, type, data], where type is "scalars" or "vectors".  The data arrays are only used
+                        as templates (size and data type); every time step must have the same size and data type.
+                comments: list of comment strings, which will be added to the header section of the file.
+        """
+        assert (x.ndim == 3 and y.ndim == 3 and z.ndim == 3), "Wrong arrays dimensions"
+        for all_data in (all_cell_data, all_point_data):
+            for data in (all_data or []):
+                assert ( (data[1] == "scalars") or (data[1] == "vectors") )
+
+        s = x.shape
+        start = (0,0,0)
+        end = (s[0] - 1, s[1] - 1, s[2] - 1)
+
+        self._openGrid(comments, start = start, end = end)
+        self.VtkFile_obj.openPiece(start = start, end = end)
+        self.VtkFile_obj.openElement("Points")
+        self.VtkFile_obj.addData("points", (x,y,z))
+        self.VtkFile_obj.closeElement("Points")
+        self._addData(all_cell_data, all_point_data)
+        self.VtkFile_obj.closePiece()
+        self.VtkFile_obj.closeGrid()
+
+        self.VtkFile_obj.appendData( (x,y,z) )
+
+    def close_structuredGridToVTK(self):
+        """
+        Close the file.
+
+        RETURNS:
+            Full path to saved file.
+        """
+        return self._close()
+
+class timeseries_rectilinearGrid(timeseries_grid):
+
+    def __init__(self, filepath, time_values, policy = None):
+        """
+            PARAMETERS:
+                filepath: filename without extension (will be a .vtr file).
+                time_values: numpy array of time values.
+                policy: (optional) VtkIOPolicy with the I/O options of the file.
+        """
+        timeseries_grid.__init__(self, filepath, time_values, VtkRectilinearGrid, policy)
+
+    def init_rectilinearGridToVTK(self, x, y, z, all_cell_data = None, all_point_data = None, comments = None):
+        """
+            INITIAL Export of rectilinear grid and associated data (header info only).
+            The coordinates are written once; the data arrays are then written with append_data.
+
+            PARAMETERS:
+                x, y, z: coordinates of the nodes of the grid as 1D arrays (see rectilinearToVTK).
+                all_cell_data, all_point_data: same format as in rectilinearToVTK, i.e. a List of Lists
+                        [name, "scalars", data].  The data arrays are only used as templates (size and data type);
+                        every time step must have the same size and data type.
+                comments: list of comment strings, which will be added to the header section of the file.
+        """
+        assert (x.ndim == 1 and y.ndim == 1 and z.ndim == 1), "Wrong array dimension"
+        for all_data in (all_cell_data, all_point_data):
+            for data in (all_data or []):
+                assert (data[1] == "scalars")
+
+        start = (0,0,0)
+        end = (x.size - 1, y.size - 1, z.size - 1)
+
+        self._openGrid(comments, start = start, end = end)
+        self.VtkFile_obj.openPiece(start = start, end = end)
+        self.VtkFile_obj.openElement("Coordinates")
+        self.VtkFile_obj.addData("x_coordinates", x)
+        self.VtkFile_obj.addData("y_coordinates", y)
+        self.VtkFile_obj.addData("z_coordinates", z)
+        self.VtkFile_obj.closeElement("Coordinates")
+        self._addData(all_cell_data, all_point_data)
+        self.VtkFile_obj.closePiece()
+        self.VtkFile_obj.closeGrid()
+
+        self.VtkFile_obj.appendData(x).appendData(y).appendData(z)
+
+    def close_rectilinearGridToVTK(self):
+        """
+        Close the file.
+
+        RETURNS:
+            Full path to saved file.
+        """
+        return self._close()
+
+class timeseries_imageData(timeseries_grid):
+
+    def __init__(self, filepath, time_values, policy = None):
+        """
+            PARAMETERS:
+                filepath: filename without extension (will be a .vti file).
+                time_values: numpy array of time values.
+                policy: (optional) VtkIOPolicy with the I/O options of the file.
+        """
+        timeseries_grid.__init__(self, filepath, time_values, VtkImageData, policy)
+
+    def init_imageToVTK(self, origin = (0.0,0.0,0.0), spacing = (1.0,1.0,1.0), all_cell_data = None, all_point_data = None, comments = None):
+        """
+            INITIAL Export of image data (header info only).
+            The data arrays are then written with append_data.
+
+            PARAMETERS:
+                origin: grid origin (default = (0,0,0))
+                spacing: grid spacing (default = (1,1,1))
+                all_cell_data, all_point_data: same format as in imageToVTK, i.e. a List of Lists
+                        [name, "scalars", data], with 3D data arrays.  The data arrays are only used as templates
+                        (dimensions and data type); every time step must have the same dimensions and data type.
+                comments: list of comment strings, which will be added to the header section of the file.
+
+            NOTE: At least, all_cell_data or all_point_data must be present to infer the dimensions of the image.
+        """
+        start = (0,0,0)
+        end = _getImageEnd(all_cell_data, all_point_data)
+
+        self._openGrid(comments, start = start, end = end, origin = origin, spacing = spacing)
+        self.VtkFile_obj.openPiece(start = start, end = end)
+        self._addData(all_cell_data, all_point_data)
+        self.VtkFile_obj.closePiece()
+        self.VtkFile_obj.closeGrid()
+
+    def close_imageToVTK(self):
+        """
+        Close the file.
+
+        RETURNS:
+            Full path to saved file.
+        """
+        return self._close()
+
+# =================================
+#  sharded time-series on unstructuredGrid
+# =================================
+class timeseries_shardedUnstructuredGrid:
+    """ Time-series on an unstructured grid that is split (sharded) over several .vtu files, each holding the
+        grid and a contiguous range of time steps.  The data is appended one time step at a time (see append_step):
+        only the current shard is open, and when it is full it is closed and the next one is opened.
+        The shards are listed in a .pvd file (VtkGroup), which is rewritten each time a shard is closed. """
+
+    def __init__(self, filepath, time_values, max_bytes = None, max_steps = None, policy = None, dedup = False, dedup_tol = 0.0):
+        """
+            PARAMETERS:
+                filepath: filename without extension.  The shards are stored in filepath_0000.vtu, filepath_0001.vtu, etc.,
+                          and the group file in filepath.pvd.
+                time_values: numpy array of time values.
+                max_bytes: target size (in bytes) of each shard (grid + data).  A shard always holds at least one time step.
+                max_steps: maximum number of time steps in each shard.
+                policy: (optional) VtkIOPolicy with the I/O options of the shards and of the .pvd file.
+                dedup, dedup_tol: (optional) the unchanged time steps in each shard are written only once
+                                  (see timeseries_unstructuredGrid).
+
+            NOTE: At least, max_bytes or max_steps must be given.  If both are given, the smallest shard is used.
+        """
+        assert (max_bytes is not None or max_steps is not None)
+        assert (max_steps is None or max_steps > 0)
+        self.filename = filepath
+        self.time_values = time_values
+        self.max_bytes = max_bytes
+        self.max_steps = max_steps
+        self.policy = policy
+        self.dedup = dedup
+        self.dedup_tol = dedup_tol
+        self.shard = None  # current shard (timeseries_unstructuredGrid), if it is open
+        self.nsteps = 0    # number of time steps appended
+        self.ranges = []   # (first, last) time-step indices of each shard (opened so far)
+        self.files = []    # full path to each shard that was closed
+
+    def _getStepsPerShard(self, first):
+        """ Number of time steps of the shard that begins with the time step first. """
+        nsteps = len(self.time_values) - first
+        if self.max_bytes is not None and self.step_bytes > 0:
+            nsteps = min(nsteps, (self.max_bytes - self.grid_bytes) // self.step_bytes)
+        if self.max_steps is not None:
+            nsteps = min(nsteps, self.max_steps)
+        return max(1, nsteps)
+
+    def init_unstructuredGridToVTK(self, x, y, z, connectivity, offsets, cell_types, all_cell_data = None, all_point_data = None, comments = None,
+                                   moving_points = False):
+        """
+            INITIAL definition of the unstructured grid and associated data.  The shards are opened by append_step,
+            and the grid is written again in each one, so that every shard can be opened on its own.
+
+            PARAMETERS:
+                Same as timeseries_unstructuredGrid.init_unstructuredGridToVTK.
+                The data arrays are only used as templates (size and data type), also to compute the size of one time step.
+                With moving_points, the points are part of each time step (see append_step).
+        """
+        self.grid = (x, y, z, connectivity, offsets, cell_types)
+        self.all_cell_data = all_cell_data
+        self.all_point_data = all_point_data
+        self.comments = comments
+        self.moving_points = moving_points
+
+        points, npoints = _convertPoints(x, y, z)
+        grid_arrays = [np.asarray(a) for a in (connectivity, offsets, cell_types)]
+        point_arrays = list(points) if isinstance(points, tuple) else [points]
+        if not moving_points: grid_arrays += point_arrays
+        self.grid_bytes = sum(a.nbytes + 8 for a in grid_arrays)
+
+        self.step_bytes = sum(a.nbytes for a in point_arrays) + 8 if moving_points else 0
+        for all_data in (all_cell_data, all_point_data):
+            for data in (all_data or []):
+                self.step_bytes += _dataBytes(data[2]) + 8
+
+    def _openShard(self):
+        """ Opens the next shard, for the time steps that fit in it from the next one. """
+        first = self.nsteps
+        last = first + self._getStepsPerShard(first) - 1
+        shard = timeseries_unstructuredGrid(self.filename + "_%04d" % len(self.ranges), self.time_values[first:last + 1],
+                                            self.policy, self.dedup, self.dedup_tol)
+        x, y, z, connectivity, offsets, cell_types = self.grid
+        shard.init_unstructuredGridToVTK(x, y, z, connectivity, offsets, cell_types,
+                                         all_cell_data = self.all_cell_data, all_point_data = self.all_point_data,
+                                         comments = self.comments, moving_points = self.moving_points, step_major = True)
+        self.shard = shard
+        self.ranges.append((first, last))
+
+    def _closeShard(self):
+        """ Closes the current shard and rewrites the .pvd file with all the shards closed so far.
+            Each time step is listed with its time value and the shard that stores it, so that readers only need
+            to open the shards of the time range of interest.  Inside each shard, as in timeseries_unstructuredGrid,
+            the time steps are numbered from 0 (TimeValues and the TimeStep attributes hold these indices). """
+        self.files.append(self.shard.close_unstructuredGridToVTK())
+        self.shard = None
+        group = VtkGroup(os.path.abspath(self.filename), policy = self.policy)
+        for shard_file, (first, last) in zip(self.files, self.ranges):
+            for ii in range(first, last + 1):
+                group.addFile(filepath = shard_file, sim_time = self.time_values[ii])
+        group.save()
+
+    def append_step(self, stepData):
+        """
+        Append the data of all the variables at the next time value.  The next shard is opened when it is needed,
+        and the current shard is closed (and added to the .pvd file) as soon as it holds all its time steps.
+
+        PARAMETERS:
+            stepData is a List where
+                    stepData[ii] = the data array of variable ii at this time step, i.e. a 1D list-type object
+                                   (list, tuple or numpy), in the order of the variables in all_cell_data and then
+                                   all_point_data.  With moving_points, stepData[0] = the points at this time step,
+                                   i.e. an (N, 3) numpy array, or a tuple (x, y, z) of 1D list-type objects.
+        """
+        assert (self.nsteps < len(self.time_values)), "All the time steps were already appended"
+        if self.shard is None: self._openShard()
+        self.shard.append_step(stepData)
+        self.nsteps += 1
+        if self.nsteps > self.ranges[-1][1]: self._closeShard()
+
+    def close_unstructuredGridToVTK(self):
+        """
+        Check that all the time steps were appended (the last shard is closed by append_step).
+
+        RETURNS:
+            Full path to saved .pvd file.
+        """
+        assert (self.nsteps == len(self.time_values)), "Some time steps were not appended"
+        assert (self.shard is None)
+
+        return os.path.abspath(self.filename + ".pvd")
@@ -0,0 +1,287 @@
+"""
+VTKwrite.memprofile.py
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+Peak-memory profiling of the write pipeline: the memory high-water marks (traced by
+tracemalloc and sampled from the resident set size) of each stage of the writers
+(conversion of the input data, assembly of the xml header, each appended array and
+its serialization, and the end of the file), reported for each file written.
+
+Use:
+    with MemoryProfiler() as prof:
+        unstructuredGridToVTK(...)
+    print(prof.report())
+    prof.save("memory.json") # e.g. to compare with compareReports(old, new)
+
+Copyright (c) 02-23-2025,  Shawn W. Walker
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import contextlib
+
+_PROFILER = None # active MemoryProfiler (profiling is off when None)
+
+class _NoStage:
+    def __enter__(self): return self
+    def __exit__(self, *args): return False
+
+_NO_STAGE = _NoStage()
+
+def _rss():
+    """ Current resident set size (in bytes) of the process, or 0 if it is not available. """
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource # peak (not current) RSS: in KB on Linux, in bytes on macOS
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss if sys.platform == "darwin" else rss * 1024
+    except (ImportError, OSError):
+        return 0
+
+# ================================
+#   hooks used by the writers
+# ================================
+def stage(name):
+    """ Context manager around a stage of the writers (it does nothing when profiling is off). """
+    if _PROFILER is None: return _NO_STAGE
+    return _PROFILER.stage(name)
+
+def beginStage(name):
+    if _PROFILER is not None: _PROFILER.beginStage(name)
+
+def endStage(name):
+    if _PROFILER is not None: _PROFILER.endStage(name)
+
+def openFile(filename):
+    if _PROFILER is not None: _PROFILER.openFile(filename)
+
+def closeFile(filename):
+    if _PROFILER is not None: _PROFILER.closeFile(filename)
+
+# ================================
+#     MemoryProfiler class
+# ================================
+class _Stage:
+    def __init__(self, name, traced, rss):
+        self.name = name
+        self.start = traced    # traced memory when the stage began
+        self.peak = traced     # traced peak of the stages nested in this one
+        self.rss = rss         # highest RSS sampled during the stage
+        self.time = time.perf_counter()
+
+class MemoryProfiler:
+    """ Records the memory high-water marks of the stages of the writers, for each file written.
+
+        Stages:
+            convert:         conversion of the input data (lists to numpy arrays) in interface.py;
+            header:          assembly of the xml header (from the creation of the file to the first appended array);
+            appendData NAME: each appended array (NAME is the name given in its header);
+            serialize:       the write of the raw data of the array (reordering, interleaving, packing), inside appendData;
+            save:            end of the file (pending writes, ranges, sync).
+        Stages that happen before a file is created (e.g. the conversion of the input) are attributed to the next file
+        created by the same thread.
+
+        For each file and stage, the report gives the number of calls, the time, the peak traced memory
+        (absolute, and above the memory at the start of the stage) and the peak RSS (sampled every interval
+        seconds, and at the start and end of each stage).
+        NOTE: tracemalloc slows down the writes; the traced peaks are exact only when one thread writes at a time.
+    """
+
+    def __init__(self, interval = 0.005):
+        """
+            PARAMETERS:
+                interval: time (in seconds) between two samples of the RSS (None = only at the start and end of the stages).
+        """
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.stacks = []    # stacks of open stages of all threads (for the RSS sampler)
+        self.records = {}   # (file, stage) -> dict with the statistics, in the order of the first call
+        self.files = []     # files in the order they were created
+        self.sampler = None
+        self.started_tracemalloc = False
+
+    def start(self):
+        """ Turns on the profiling of the writers (see also the with statement). """
+        global _PROFILER
+        assert (_PROFILER is None), "Another MemoryProfiler is active"
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracemalloc = True
+        _PROFILER = self
+        if self.interval:
+            self.stopped = threading.Event()
+            self.sampler = threading.Thread(target = self._sample, daemon = True)
+            self.sampler.start()
+        return self
+
+    def stop(self):
+        """ Turns off the profiling. """
+        global _PROFILER
+        _PROFILER = None
+        if self.sampler is not None:
+            self.stopped.set()
+            self.sampler.join()
+            self.sampler = None
+        if self.started_tracemalloc:
+            tracemalloc.stop()
+            self.started_tracemalloc = False
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def _sample(self):
+        while not self.stopped.wait(self.interval):
+            rss = _rss()
+            with self.lock:
+                for stack in self.stacks:
+                    for st in stack:
+                        if rss > st.rss: st.rss = rss
+
+    def _thread(self):
+        """ Stack of stages, current file and stages waiting for a file of this thread. """
+        local = self.local
+        if not hasattr(local, "stack"):
+            local.stack, local.file, local.pending = [], None, []
+            with self.lock:
+                self.stacks.append(local.stack)
+        return local
+
+    def beginStage(self, name):
+        local = self._thread()
+        traced, peak = tracemalloc.get_traced_memory()
+        if local.stack: # the peak so far belongs to the enclosing stage
+            parent = local.stack[-1]
+            if peak > parent.peak: parent.peak = peak
+        if hasattr(tracemalloc, "reset_peak"): tracemalloc.reset_peak()
+        st = _Stage(name, traced, _rss())
+        with self.lock:
+            local.stack.append(st)
+
+    def endStage(self, name):
+        local = self._thread()
+        if not local.stack or local.stack[-1].name != name:
+            return # e.g. the stage began before the profiler was started
+        peak = tracemalloc.get_traced_memory()[1]
+        rss = _rss()
+        with self.lock:
+            st = local.stack.pop()
+        peak = max(peak, st.peak)
+        rss = max(rss, st.rss)
+        if local.stack: # propagate the high-water marks to the enclosing stage
+            parent = local.stack[-1]
+            parent.peak = max(parent.peak, peak)
+            parent.rss = max(parent.rss, rss)
+        record = { "stage" : name, "calls" : 1, "seconds" : time.perf_counter() - st.time,
+                   "peak_traced" : peak, "delta_traced" : peak - st.start, "peak_rss" : rss }
+        if local.file is None:
+            local.pending.append(record)
+        else:
+            self._addRecord(local.file, record)
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        self.beginStage(name)
+        try:
+            yield
+        finally:
+            self.endStage(name)
+
+    def _addRecord(self, filename, record):
+        key = (filename, record["stage"])
+        with self.lock:
+            old = self.records.get(key)
+            if old is None:
+                self.records[key] = dict(record, file = filename)
+            else:
+                old["calls"] += record["calls"]
+                old["seconds"] += record["seconds"]
+                for k in ("peak_traced", "delta_traced", "peak_rss"):
+                    old[k] = max(old[k], record[k])
+
+    def openFile(self, filename):
+        """ The stages that follow (and those waiting for a file) belong to filename. """
+        local = self._thread()
+        local.file = filename
+        with self.lock:
+            if filename not in self.files: self.files.append(filename)
+        for record in local.pending:
+            self._addRecord(filename, record)
+        local.pending = []
+
+    def closeFile(self, filename):
+        local = self._thread()
+        if local.file == filename: local.file = None
+
+    def getRecords(self):
+        """ Returns a list of dictionaries (file, stage, calls, seconds, peak_traced, delta_traced, peak_rss),
+            with the memory in bytes. """
+        with self.lock:
+            return [dict(r) for r in self.records.values()]
+
+    def report(self):
+        """ Returns the report (a string) with a table of the stages of each file. """
+        return _formatRecords(self.getRecords())
+
+    def save(self, filepath):
+        """ Saves the records (and the versions of Python and numpy) to filepath as JSON. """
+        import numpy as np
+        data = { "python" : sys.version.split()[0], "numpy" : np.__version__, "records" : self.getRecords() }
+        with open(filepath, "w") as f:
+            json.dump(data, f, indent = 1)
+        return filepath
+
+# ================================
+#       report functions
+# ================================
+def _formatRecords(records):
+    MB = 1.0 / (1 << 20)
+    lines = []
+    for filename in dict.fromkeys(r["file"] for r in records):
+        lines.append("file: %s" % filename)
+        lines.append("  %-28s %6s %10s %12s %12s %12s" % ("stage", "calls", "time (s)", "peak (MB)", "delta (MB)", "RSS (MB)"))
+        for r in records:
+            if r["file"] != filename: continue
+            lines.append("  %-28s %6d %10.4f %12.2f %12.2f %12.2f" % (r["stage"][:28], r["calls"], r["seconds"],
+                         r["peak_traced"] * MB, r["delta_traced"] * MB, r["peak_rss"] * MB))
+    return "\n".join(lines)
+
+def loadReport(filepath):
+    """ Loads the records saved by MemoryProfiler.save. """
+    with open(filepath) as f:
+        return json.load(f)["records"]
+
+def compareReports(old, new):
+    """ Compares the peak memory of the stages of two reports (e.g. of two releases), matching the files by name.
+
+        PARAMETERS:
+            old, new: list of records (see MemoryProfiler.getRecords), or paths to reports saved by MemoryProfiler.save.
+
+        RETURNS:
+            a string with a table of the peaks (traced memory above the start of the stage, and RSS) in MB.
+    """
+    if isinstance(old, str): old = loadReport(old)
+    if isinstance(new, str): new = loadReport(new)
+    MB = 1.0 / (1 << 20)
+    index = { (os.path.basename(r["file"]), r["stage"]) : r for r in old }
+    lines = ["  %-40s %11s %11s %11s %11s" % ("file: stage", "old delta", "new delta", "old RSS", "new RSS")]
+    for r in new:
+        key = (os.path.basename(r["file"]), r["stage"])
+        o = index.get(key)
+        old_delta = "%11.2f" % (o["delta_traced"] * MB) if o else "%11s" % "-"
+        old_rss = "%11.2f" % (o["peak_rss"] * MB) if o else "%11s" % "-"
+        lines.append("  %-40s %s %11.2f %s %11.2f" % (("%s: %s" % key)[:40], old_delta, r["delta_traced"] * MB,
+                                                      old_rss, r["peak_rss"] * MB))
+    return "\n".join(lines)
+
+#
@@ -8,6 +8,9 @@ Copyright (c) 05-07-2021,  Shawn W. Walker
 
 import struct
 import sys
+import os
+import concurrent.futures
+import threading
 try:
     import numpy as np
 except:
@@ -32,6 +35,440 @@ def _get_byte_order_char():
     else:
         return '>'
 
+# size (in bytes) of the scratch buffer used to reorder (or interleave) non-contiguous data
+_BUFFER_SIZE = 1 << 22
+# width of the tiles used by the cache-blocked transposes (number of elements along the last axis)
+_TILE_SIZE = 256
+# buffers up to this size (in bytes) are copied by GatherWriter, so that they can be kept until the next flush
+_GATHER_COPY_SIZE = 1 << 16
+# maximum number of buffers in one call to os.writev
+try:
+    _IOV_MAX = os.sysconf("SC_IOV_MAX")
+except (AttributeError, ValueError, OSError):
+    _IOV_MAX = 1024
+if _IOV_MAX <= 0: _IOV_MAX = 1024
+# size (in bytes) of the pieces of a large array that are written in parallel (see submitArrayWrites)
+_PWRITE_PIECE = 1 << 24
+# alignment (in bytes) of the buffers, positions and sizes of O_DIRECT writes (see DirectWriter)
+_DIRECT_ALIGN = 4096
+# maximum size (in bytes) of the idle scratch buffers kept by the default BufferPool
+_POOL_MAX_BYTES = 1 << 26
+
+# ================================
+#        GatherWriter class
+# ================================
+class GatherWriter:
+    """ Collects the buffers written to a binary file and writes them with a few (scatter/gather) os.writev calls.
+
+        Buffers larger than _GATHER_COPY_SIZE are kept by reference (no copy): they are only valid until
+        release() is called, which writes them.  Smaller buffers (e.g. block sizes or small arrays) are copied,
+        so they are kept until a batch is full (_IOV_MAX buffers or _BUFFER_SIZE bytes) or flush() is called.
+        If the stream has no file descriptor (e.g. io.BytesIO) or os.writev is not available, it simply writes to the stream.
+    """
+
+    def __init__(self, stream):
+        """
+            PARAMETERS:
+                stream: binary file object.  Its buffered data is written (flushed) first.
+        """
+        self.stream = stream
+        self.pending = []      # buffers to write (memoryviews)
+        self.borrowed = False  # True if some pending buffers are not owned by this writer
+        self.copied = 0        # bytes of the owned pending buffers
+        try:
+            self.fd = stream.fileno() if hasattr(os, "writev") else None
+        except (AttributeError, OSError, ValueError):
+            self.fd = None
+        if self.fd is not None:
+            stream.flush()
+
+    def write(self, buf):
+        """ Queue the bytes of buf (a bytes object or a contiguous array). """
+        if self.fd is None:
+            self.stream.write(buf)
+            return
+        mv = memoryview(buf).cast("B")
+        if mv.nbytes == 0: return
+        if mv.nbytes <= _GATHER_COPY_SIZE:
+            mv = memoryview(mv.tobytes())
+            self.copied += mv.nbytes
+        else:
+            self.borrowed = True
+        self.pending.append(mv)
+        if len(self.pending) >= _IOV_MAX or self.copied >= _BUFFER_SIZE:
+            self.flush()
+
+    def release(self):
+        """ Write the pending buffers if some of them are not owned by this writer
+            (this must be called before the caller modifies or frees a buffer that was written). """
+        if self.borrowed:
+            self.flush()
+
+    def flush(self):
+        """ Write all the pending buffers. """
+        bufs = self.pending
+        while bufs:
+            batch = bufs[:_IOV_MAX]
+            n = os.writev(self.fd, batch)
+            # skip what was written (os.writev may write less than requested)
+            i = 0
+            while i < len(batch) and n >= batch[i].nbytes:
+                n -= batch[i].nbytes
+                i += 1
+            bufs = bufs[i:]
+            if n > 0:
+                bufs[0] = bufs[0][n:]
+        self.pending = []
+        self.borrowed = False
+        self.copied = 0
+
+# ================================
+#      PositionalWriter class
+# ================================
+class PositionalWriter:
+    """ File-like object that writes (with os.pwrite) from a given position of a file, without moving its offset,
+        so that several threads can write different regions of the same file at the same time. """
+
+    def __init__(self, fd, pos):
+        """
+            PARAMETERS:
+                fd: file descriptor.
+                pos: position (in bytes) of the first byte to write.
+        """
+        self.fd = fd
+        self.pos = pos
+
+    def write(self, buf):
+        mv = memoryview(buf).cast("B")
+        while mv.nbytes > 0:
+            n = os.pwrite(self.fd, mv, self.pos)
+            mv = mv[n:]
+            self.pos += n
+
+def submitArrayWrites(pool, fd, pos, data, ranges = None, ncomp = 1):
+    """ Submits to the thread pool the writing of data (in FORTRAN order) at position pos of the file fd.
+        Large FORTRAN-ordered (or contiguous 1D) arrays are split into pieces of _PWRITE_PIECE bytes that are
+        written in parallel; any other array is written by one thread (see writeArrayToFile).
+
+        PARAMETERS:
+            ranges: (optional) list where the RangeWriter of each piece is appended, to compute the range of data.
+            ncomp: number of components of data (the pieces hold whole tuples).
+
+        RETURNS:
+            List of futures.
+    """
+    assert (data.dtype.name in np_to_struct), "Unsupported data type: " + data.dtype.name
+    def writer(p):
+        stream = PositionalWriter(fd, p)
+        if ranges is not None:
+            stream = RangeWriter(stream, data.dtype, ncomp)
+            ranges.append(stream)
+        return stream
+    if not (isinstance(data, np.ndarray) and data.flags['F_CONTIGUOUS'] and data.dtype.isnative):
+        return [pool.submit(writeArrayToFile, writer(pos), data)]
+    flat = data.reshape(-1, order = 'F') # no copy
+    n = max(1, _PWRITE_PIECE // data.dtype.itemsize // ncomp) * ncomp
+    futures = []
+    for i in range(0, flat.size, n):
+        futures.append(pool.submit(writer(pos + i * data.dtype.itemsize).write, flat[i:i + n]))
+    return futures
+
+# ================================
+#        RangeWriter class
+# ================================
+class RangeWriter:
+    """ Forwards the data written to another stream and computes its range on the fly, chunk by chunk
+        (the range of the values if ncomp = 1, otherwise the range of the magnitudes of the tuples, as VTK does).
+        NaN values are ignored. """
+
+    def __init__(self, stream, dtype, ncomp = 1):
+        """
+            PARAMETERS:
+                stream: stream that receives the data.
+                dtype: numpy data type of the data.
+                ncomp: number of components of the data (the data is a sequence of tuples of ncomp values).
+        """
+        self.stream = stream
+        self.dtype = np.dtype(dtype).newbyteorder('=')
+        self.ncomp = ncomp
+        self.vmin = None
+        self.vmax = None
+        self.rest = np.empty(0, dtype = self.dtype) # values of an incomplete tuple
+
+    def _update(self, lo, hi):
+        if np.isnan(lo): return # only NaN values
+        self.vmin = lo if self.vmin is None else min(self.vmin, lo)
+        self.vmax = hi if self.vmax is None else max(self.vmax, hi)
+
+    def _updateTuples(self, a):
+        """ a holds whole tuples. """
+        if a.size == 0: return
+        a = a.reshape(-1, self.ncomp).astype(np.float64, copy = False)
+        norm2 = np.einsum("ij,ij->i", a, a) # squared magnitudes
+        self._update(np.fmin.reduce(norm2), np.fmax.reduce(norm2))
+
+    def write(self, buf):
+        a = np.frombuffer(buf, dtype = self.dtype)
+        if a.size > 0:
+            if self.ncomp == 1:
+                self._update(np.fmin.reduce(a), np.fmax.reduce(a))
+            else:
+                if self.rest.size > 0: # complete the tuple of the previous chunk
+                    m = min(self.ncomp - self.rest.size, a.size)
+                    self.rest = np.concatenate((self.rest, a[:m]))
+                    a = a[m:]
+                    if self.rest.size == self.ncomp:
+                        self._updateTuples(self.rest)
+                        self.rest = self.rest[:0]
+                m = a.size - a.size % self.ncomp
+                self._updateTuples(a[:m])
+                if m < a.size:
+                    self.rest = a[m:].copy()
+        self.stream.write(buf)
+
+    def release(self):
+        _release(self.stream)
+
+    def merge(self, other):
+        """ Adds the range of another RangeWriter (e.g. of another piece of the same array). """
+        if other.vmin is not None:
+            self._update(other.vmin, other.vmax)
+
+    def getRange(self):
+        """ RETURNS: (min, max) as Python numbers, or None if there was no (valid) data. """
+        if self.vmin is None: return None
+        if self.ncomp == 1:
+            return self.vmin.item(), self.vmax.item()
+        return float(np.sqrt(self.vmin)), float(np.sqrt(self.vmax))
+
+# ================================
+#        BufferPool class
+# ================================
+def _alignedBuffer(nbytes, align = _DIRECT_ALIGN):
+    """ Returns a uint8 array of nbytes bytes whose address is a multiple of align. """
+    raw = np.empty(nbytes + align, dtype = np.uint8)
+    shift = (-raw.ctypes.data) % align
+    return raw[shift:shift + nbytes]
+
+class BufferPool:
+    """ Pool of reusable scratch buffers for the write functions of this module (reordering, interleaving,
+        byte swapping and O_DIRECT staging), so that repeated writes of large files do not allocate
+        (and page fault) fresh temporaries for every array.
+
+        Buffers are aligned to _DIRECT_ALIGN bytes and grouped in size classes (powers of two, starting at
+        _DIRECT_ALIGN bytes).  A released buffer is kept (idle) for the next request of its size class while
+        the idle buffers fit in max_bytes; beyond that, the least recently released buffers are evicted.
+        Buffers larger than max_bytes are never kept.  It is safe to use from several threads.
+    """
+
+    def __init__(self, max_bytes = _POOL_MAX_BYTES):
+        """
+            PARAMETERS:
+                max_bytes: maximum size (in bytes) of the idle buffers kept by the pool (0 = keep nothing).
+        """
+        assert (max_bytes >= 0)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.free = {}      # size class -> list of (stamp, buffer) of idle buffers, most recently released last
+        self.used = {}      # id of an acquired array -> (size class, buffer)
+        self.stamp = 0
+        self.idle_bytes = 0
+        self.used_bytes = 0
+        self.resetStats()
+
+    def resetStats(self):
+        self.requests = 0
+        self.hits = 0
+        self.evictions = 0
+        self.requested_bytes = 0 # bytes that would be allocated without the pool
+        self.allocated_bytes = 0 # bytes actually allocated by the pool
+        self.peak_bytes = self.idle_bytes + self.used_bytes
+
+    @staticmethod
+    def sizeClass(nbytes):
+        """ Size (in bytes) of the buffers that serve a request of nbytes bytes. """
+        size = _DIRECT_ALIGN
+        while size < nbytes: size *= 2
+        return size
+
+    def acquire(self, nelem, dtype = np.uint8):
+        """ Returns an (aligned) 1D scratch array of nelem elements of type dtype.
+            It must be given back with release when it is not needed anymore.
+        """
+        dtype = np.dtype(dtype)
+        nbytes = max(1, nelem) * dtype.itemsize
+        cls = self.sizeClass(nbytes)
+        with self.lock:
+            self.requests += 1
+            self.requested_bytes += nbytes
+            idle = self.free.get(cls)
+            if idle:
+                buf = idle.pop()[1]
+                self.idle_bytes -= cls
+                self.hits += 1
+            else:
+                buf = None
+        if buf is None:
+            buf = _alignedBuffer(cls)
+            with self.lock:
+                self.allocated_bytes += cls
+        array = buf[:nelem * dtype.itemsize].view(dtype)
+        with self.lock:
+            self.used[id(array)] = (cls, buf, array)
+            self.used_bytes += cls
+            self.peak_bytes = max(self.peak_bytes, self.idle_bytes + self.used_bytes)
+        return array
+
+    def release(self, array):
+        """ Gives back an array returned by acquire; it must not be used anymore. """
+        with self.lock:
+            cls, buf, _ = self.used.pop(id(array))
+            self.used_bytes -= cls
+            if cls > self.max_bytes: return
+            self.stamp += 1
+            self.free.setdefault(cls, []).append((self.stamp, buf))
+            self.idle_bytes += cls
+            while self.idle_bytes > self.max_bytes: # evict the least recently released buffer
+                oldest = min((idle[0][0], c) for c, idle in self.free.items() if idle)[1]
+                self.free[oldest].pop(0)
+                self.idle_bytes -= oldest
+                self.evictions += 1
+
+    def clear(self):
+        """ Frees all the idle buffers. """
+        with self.lock:
+            self.free = {}
+            self.idle_bytes = 0
+
+    def getStats(self):
+        """ Returns a dictionary with the statistics of the pool since it was created (or since resetStats):
+                requests, hits, hit_rate: number of buffers requested, served by idle buffers, and their ratio;
+                evictions: number of idle buffers freed to keep them within max_bytes;
+                requested_bytes, allocated_bytes: bytes requested, and bytes allocated by the pool;
+                saved_bytes: allocations avoided by the reuse of buffers (requested - allocated);
+                idle_bytes, used_bytes, peak_bytes: memory held by the pool now, and at most.
+        """
+        with self.lock:
+            return { "requests" : self.requests, "hits" : self.hits,
+                     "hit_rate" : self.hits / self.requests if self.requests else 0.0,
+                     "evictions" : self.evictions,
+                     "requested_bytes" : self.requested_bytes, "allocated_bytes" : self.allocated_bytes,
+                     "saved_bytes" : max(0, self.requested_bytes - self.allocated_bytes),
+                     "idle_bytes" : self.idle_bytes, "used_bytes" : self.used_bytes, "peak_bytes" : self.peak_bytes }
+
+_SCRATCH_POOL = BufferPool()
+
+def getScratchPool():
+    """ Returns the BufferPool used by the write functions of this module. """
+    return _SCRATCH_POOL
+
+def setScratchPool(pool):
+    """ Replaces the BufferPool used by the write functions of this module, e.g. by BufferPool(max_bytes = 0)
+        to disable the reuse of scratch buffers.  Returns the previous pool. """
+    global _SCRATCH_POOL
+    assert isinstance(pool, BufferPool)
+    previous, _SCRATCH_POOL = _SCRATCH_POOL, pool
+    return previous
+
+# ================================
+#        DirectWriter class
+# ================================
+
+class DirectWriter:
+    """ Writes the end of a file (from a given position) with O_DIRECT, i.e. bypassing the page cache,
+        which is useful for huge files that are written once.  O_DIRECT requires aligned buffers, positions
+        and sizes, so the data is copied into an aligned buffer that is written when it is full.
+        The first block also holds the end of the bytes already in the file (e.g. the xml header), which are read back,
+        and the last (partial) block is written through the (buffered) stream of the file.
+
+        Raises OSError if the file system (or the platform) does not support O_DIRECT.
+    """
+
+    def __init__(self, stream, filename, buffer_size = _BUFFER_SIZE):
+        """
+            PARAMETERS:
+                stream: (buffered) binary file object of the file, positioned where the data begins.
+                        Its buffered data is written (flushed) first.
+                filename: path to the file.
+                buffer_size: size (in bytes) of the aligned buffer; it is rounded up to a multiple of _DIRECT_ALIGN.
+        """
+        self.stream = stream
+        self.filename = filename
+        self.fd = os.open(filename, os.O_WRONLY | os.O_DIRECT)
+        nbytes = max(_DIRECT_ALIGN, -(-buffer_size // _DIRECT_ALIGN) * _DIRECT_ALIGN)
+        self.pool = _SCRATCH_POOL
+        self.buf = self.pool.acquire(nbytes)
+        try:
+            stream.flush()
+            self._start(stream.tell())
+        except:
+            os.close(self.fd)
+            self.pool.release(self.buf)
+            raise
+
+    def _start(self, pos):
+        """ Begins a new aligned block with the bytes of the file before pos. """
+        self.pos = pos - pos % _DIRECT_ALIGN # position of buf[0] in the file
+        self.n = pos - self.pos              # bytes in buf
+        if self.n > 0:
+            fd = os.open(self.filename, os.O_RDONLY)
+            try:
+                self.buf[:self.n] = np.frombuffer(os.pread(fd, self.n, self.pos), dtype = np.uint8)
+            finally:
+                os.close(fd)
+
+    def _writeBuffer(self, n):
+        """ Writes the first n bytes (a multiple of _DIRECT_ALIGN) of buf. """
+        mv = memoryview(self.buf[:n])
+        while mv.nbytes > 0:
+            m = os.pwrite(self.fd, mv, self.pos)
+            mv = mv[m:]
+            self.pos += m
+        rest = self.n - n
+        if rest > 0:
+            self.buf[:rest] = self.buf[n:self.n]
+        self.n = rest
+
+    def write(self, buf):
+        mv = memoryview(buf).cast("B")
+        while mv.nbytes > 0:
+            m = min(mv.nbytes, self.buf.size - self.n)
+            self.buf[self.n:self.n + m] = np.frombuffer(mv[:m], dtype = np.uint8)
+            self.n += m
+            mv = mv[m:]
+            if self.n == self.buf.size:
+                self._writeBuffer(self.n)
+
+    def release(self):
+        """ Nothing to do: the data is always copied into the aligned buffer. """
+        pass
+
+    def flush(self):
+        """ Writes all the data: the aligned blocks with O_DIRECT and the rest through the stream,
+            which is left at the end of the data. """
+        aligned = self.n - self.n % _DIRECT_ALIGN
+        if aligned > 0:
+            self._writeBuffer(aligned)
+        self.stream.seek(self.pos)
+        self.stream.write(self.buf[:self.n])
+        self.stream.flush()
+        self._start(self.pos + self.n)
+
+    def close(self, flush = True):
+        """ Writes the data (if flush) and gives back the file descriptor and the aligned buffer.
+            Use flush = False to discard the data, e.g. after a failed write. """
+        try:
+            if flush: self.flush()
+        finally:
+            os.close(self.fd)
+            self.pool.release(self.buf)
+            self.buf = None
+
+def _release(stream):
+    """ Called after writing a chunk of a scratch buffer that is going to be reused (see GatherWriter). """
+    if hasattr(stream, "release"):
+        stream.release()
+
 # ================================
 #        write functions
 # ================================  
@@ -39,51 +476,234 @@ def writeBlockSize(stream, block_size):
     fmt = _get_byte_order_char() + 'Q' # Write size as unsigned long long == 64 bits unsigned integer
     stream.write(struct.pack(fmt, block_size))
 
+def _toNative(chunk):
+    """ VTK files are written with the native byte order (see vtkbin._get_byte_order). """
+    if not chunk.dtype.isnative:
+        chunk = chunk.astype(chunk.dtype.newbyteorder('='))
+    return chunk
+
+def _newBuffer(data, min_elem = 1):
+    """ Returns a (small) scratch buffer that is reused for every chunk of data.
+        It is taken from the scratch BufferPool, and must be given back with _freeBuffer. """
+    nelem = max(min_elem, min(data.size, _BUFFER_SIZE // data.dtype.itemsize))
+    return _SCRATCH_POOL.acquire(nelem, data.dtype.newbyteorder('='))
+
+def _freeBuffer(buf):
+    _SCRATCH_POOL.release(buf)
+
+def _iterCopiedChunks(data):
+    """ Yields a 1D array (e.g. strided, or not in the native byte order) as a sequence of
+        contiguous native chunks, copied into a reusable buffer. """
+    buf = _newBuffer(data)
+    try:
+        for i in range(0, data.size, buf.size):
+            src = data[i:i + buf.size]
+            np.copyto(buf[:src.size], src)
+            yield buf[:src.size]
+    finally:
+        _freeBuffer(buf)
+
+def _tiledCopy(dst, src):
+    """ Copy src into dst one tile (along the last axis) at a time, which keeps the
+        strided reads of a transpose inside the cache. """
+    n = src.shape[-1]
+    for i0 in range(0, n, _TILE_SIZE):
+        np.copyto(dst[..., i0:i0 + _TILE_SIZE], src[..., i0:i0 + _TILE_SIZE])
+
+def _iterTransposedChunks(data):
+    """ Yields the FORTRAN order of a multidimensional array with any other layout (C order or
+        strided views) as a sequence of 1D chunks, using cache-blocked tile transposes into a reusable buffer.
+        NOTE: every chunk is a view of the same buffer, i.e. it must be consumed before the next one is requested.
+    """
+    T = data.T # the FORTRAN order of data is the C order of its transpose
+    nk, nj = T.shape[0], T.shape[1]
+    row = int(np.prod(T.shape[2:])) # elements per (k, j) row
+    buf = _newBuffer(data, row)
+    try:
+        if nj * row <= buf.size: # several whole (k) planes per chunk
+            kb = buf.size // (nj * row)
+            for k0 in range(0, nk, kb):
+                src = T[k0:k0 + kb]
+                dst = buf[:src.size].reshape(src.shape)
+                _tiledCopy(dst, src)
+                yield buf[:src.size]
+        else: # rows of one (k) plane per chunk
+            jb = buf.size // row
+            for k in range(nk):
+                for j0 in range(0, nj, jb):
+                    src = T[k, j0:j0 + jb]
+                    dst = buf[:src.size].reshape(src.shape)
+                    _tiledCopy(dst, src)
+                    yield buf[:src.size]
+    finally:
+        _freeBuffer(buf)
+
+def _iterFortranChunks(data):
+    """ Yields the elements of data (in FORTRAN order) as a sequence of contiguous 1D chunks.
+        The memory layout of data decides how:
+            - FORTRAN-ordered (and contiguous 1D) arrays are yielded as one zero-copy view;
+            - other multidimensional arrays (C order, strided views) are transposed by blocks (see _iterTransposedChunks);
+            - strided 1D arrays are copied by pieces of the size of the scratch buffer.
+        In all cases, the extra memory does not depend on the size of data (scratch buffers come from the BufferPool).
+    """
+    if data.flags['F_CONTIGUOUS']:
+        flat = data.reshape(-1, order = 'F') # no copy
+        if flat.dtype.isnative:
+            yield flat
+        else:
+            yield from _iterCopiedChunks(flat)
+    elif data.ndim == 1:
+        yield from _iterCopiedChunks(data)
+    else:
+        yield from _iterTransposedChunks(data)
+
+class _ChunkReader:
+    """ Reads the stream of chunks of _iterFortranChunks into arrays of any size. """
+
+    def __init__(self, data):
+        self.chunks = _iterFortranChunks(data)
+        self.rest = None
+
+    def readinto(self, out):
+        """ Fill the 1D (possibly strided) array out; returns the number of elements read. """
+        n = 0
+        while n < out.size:
+            if self.rest is None or self.rest.size == 0:
+                self.rest = next(self.chunks, None)
+                if self.rest is None: break
+            m = min(out.size - n, self.rest.size)
+            out[n:n + m] = self.rest[:m]
+            self.rest = self.rest[m:]
+            n += m
+        return n
+
+    def close(self):
+        """ Gives back the scratch buffer of the chunks (if any). """
+        self.chunks.close()
+        self.rest = None
+
 def writeArrayToFile(stream, data):
     #stream.flush() # this should not be necessary          
-    assert (data.ndim == 1 or data.ndim == 3)
-    fmt = _get_byte_order_char() + str(data.size) + np_to_struct[data.dtype.name]  # > for big endian
+    assert (data.ndim >= 1 and data.ndim <= 4)
+    assert (data.dtype.name in np_to_struct), "Unsupported data type: " + data.dtype.name
 
-    # Check if array is contiguous
-    assert (data.flags['C_CONTIGUOUS'] or data.flags['F_CONTIGUOUS'])
-    
     # NOTE: VTK expects data in FORTRAN order
     # This is only needed when a multidimensional array has C-layout
-    dd = np.ravel(data, order='F')
-
-    bin = struct.pack(fmt, *dd)
-    stream.write(bin)
+    chunks = _iterFortranChunks(data)
+    try:
+        for chunk in chunks:
+            stream.write(chunk)
+            if not np.may_share_memory(chunk, data): # scratch buffer
+                _release(stream)
+    finally:
+        chunks.close() # gives back the scratch buffer, also if a write failed
     
+def _readSlab(data, k0, k1):
+    """ Reads the z-slab data[:, :, k0:k1] into memory (np.memmap slices are only views of the file). """
+    slab = np.asarray(data[:, :, k0:k1])
+    if not slab.flags['OWNDATA']:
+        slab = np.array(slab, order = 'K')
+    return slab
+
+def writeSlabsToFile(stream, data, slab_size):
+    """ Writes a 3D array-like object (numpy array, np.memmap, h5py dataset, ...) in FORTRAN order,
+        one z-slab of slab_size planes at a time.  The next slab is read by a background thread
+        while the current one is written, so at most two slabs are held in memory.
+    """
+    assert (len(data.shape) == 3)
+    assert (slab_size >= 1)
+    nz = data.shape[2]
+    with concurrent.futures.ThreadPoolExecutor(max_workers = 1) as reader:
+        next_slab = reader.submit(_readSlab, data, 0, slab_size)
+        for k0 in range(0, nz, slab_size):
+            slab = next_slab.result()
+            if k0 + slab_size < nz:
+                next_slab = reader.submit(_readSlab, data, k0 + slab_size, k0 + 2*slab_size)
+            writeArrayToFile(stream, slab)
+            _release(stream)
+            del slab
+
+# ================================
+#        LazyData class
+# ================================
+class LazyData:
+    """ Data array that is only computed when it is written (e.g. a quantity derived from other fields),
+        one chunk at a time, so that it is never held in memory as a whole.
+        It can be used in place of a numpy array in all_cell_data and all_point_data, and in VtkFile.addData/appendData.
+        Any object with the attributes shape, ncomp and dtype that can be called as obj(start, stop) is also accepted.
+    """
+
+    def __init__(self, func, shape, ncomp = 1, dtype = "float64", chunk_size = None):
+        """
+            PARAMETERS:
+                func: function func(start, stop) that returns the values of the elements start, ..., stop - 1
+                      (in the order of the grid, i.e. FORTRAN order for structured grids) as an array of
+                      shape (stop - start,) if ncomp = 1, or (stop - start, ncomp).
+                shape: number of elements, or shape of the grid of elements (e.g. (nx, ny, nz) for image data).
+                ncomp: number of components of each element (e.g. 3 for vectors).
+                dtype: data type of the values.
+                chunk_size: (optional) number of elements computed by each call to func
+                            (default: as many as fit in _BUFFER_SIZE bytes).
+        """
+        self.func = func
+        self.shape = (shape,) if np.ndim(shape) == 0 else tuple(shape)
+        self.ncomp = ncomp
+        self.dtype = np.dtype(dtype)
+        self.chunk_size = chunk_size
+
+    def __call__(self, start, stop):
+        return self.func(start, stop)
+
+def writeLazyToFile(stream, source):
+    """ Writes the values of a lazy data source (see LazyData), computing them one chunk at a time. """
+    dtype = np.dtype(source.dtype)
+    assert (dtype.name in np_to_struct), "Unsupported data type: " + dtype.name
+    ncomp = source.ncomp
+    nelem = int(np.prod(source.shape))
+    step = getattr(source, "chunk_size", None) or max(1, _BUFFER_SIZE // (dtype.itemsize * ncomp))
+    for start in range(0, nelem, step):
+        stop = min(nelem, start + step)
+        chunk = np.asarray(source(start, stop))
+        assert (chunk.size == (stop - start) * ncomp), \
+            "Lazy data returned %d values for elements %d to %d" % (chunk.size, start, stop - 1)
+        # the (n, ncomp) rows are the interleaved tuples
+        if chunk.dtype == dtype and chunk.dtype.isnative and chunk.flags['C_CONTIGUOUS']:
+            stream.write(chunk)
+            _release(stream)
+        else:
+            buf = _SCRATCH_POOL.acquire(chunk.size, dtype.newbyteorder('='))
+            try:
+                np.copyto(buf.reshape(chunk.shape), chunk, casting = 'unsafe')
+                stream.write(buf)
+                _release(stream)
+            finally:
+                _freeBuffer(buf)
+        del chunk
+
 # ==============================================================================
 def writeArraysToFile(stream, x, y, z):
     # Check if arrays have same shape and data type
     assert ( x.size == y.size == z.size ), "Different array sizes."
     assert ( x.dtype.itemsize == y.dtype.itemsize == z.dtype.itemsize ), "Different item sizes."
-  
-    nitems = x.size
-    itemsize = x.dtype.itemsize
+    assert (x.dtype.name in np_to_struct), "Unsupported data type: " + x.dtype.name
 
-    fmt = _get_byte_order_char() + str(1) + np_to_struct[x.dtype.name]  # > for big endian
-    
-    # Check if arrays are contiguous
-    assert (x.flags['C_CONTIGUOUS'] or x.flags['F_CONTIGUOUS'])
-    assert (y.flags['C_CONTIGUOUS'] or y.flags['F_CONTIGUOUS'])
-    assert (z.flags['C_CONTIGUOUS'] or z.flags['F_CONTIGUOUS'])
-    
-    
     # NOTE: VTK expects data in FORTRAN order
     # This is only needed when a multidimensional array has C-layout
-    xx = np.ravel(x, order='F')
-    yy = np.ravel(y, order='F')
-    zz = np.ravel(z, order='F')    
-        
-    # eliminate this loop by creating a composed array.
-    for i in range(nitems):
-        bx = struct.pack(fmt, xx[i])
-        by = struct.pack(fmt, yy[i])
-        bz = struct.pack(fmt, zz[i])
-        stream.write(bx)
-        stream.write(by)
-        stream.write(bz)
+    # interleave the components one chunk at a time
+    readers = [_ChunkReader(x), _ChunkReader(y), _ChunkReader(z)]
+    nrows = max(1, min(x.size, _BUFFER_SIZE // (3 * x.dtype.itemsize)))
+    buf = _SCRATCH_POOL.acquire(3 * nrows, x.dtype.newbyteorder('='))
+    try:
+        xyz = buf.reshape(nrows, 3)
+        for i in range(0, x.size, nrows):
+            n = min(nrows, x.size - i)
+            for c in range(3):
+                readers[c].readinto(xyz[:n, c])
+            stream.write(xyz[:n])
+            _release(stream)
+    finally:
+        # the buffers go back to the pool also if a write failed
+        _freeBuffer(buf)
+        for reader in readers: reader.close()
 
 #
\ No newline at end of file
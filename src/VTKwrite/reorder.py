@@ -0,0 +1,185 @@
+"""
+VTKwrite.reorder.py
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+Reordering of the points and cells of a mesh to improve their locality, i.e. points (and cells)
+that are close in space are also close in the file.  This makes the connectivity smaller when it
+is compressed, and the data is read faster (e.g. by Paraview).
+
+    - "morton" and "hilbert": points (and cells, by their centroid) are sorted along a space filling curve;
+    - "rcm": the cells are sorted by the reverse Cuthill-McKee ordering of the cell graph (cells that share
+             a point are neighbors), and the points in the order they are first used by the cells.
+             REQUIRES: Scipy.
+
+It also extracts a subset of the cells of a mesh (extractCells), with the same gather of the connectivity.
+
+Copyright (c) 02-23-2025,  Shawn W. Walker
+"""
+
+try:
+    import numpy as np
+except:
+    print("Numpy is not installed. Please install it before running VTKwrite again.")
+
+# number of bits of each coordinate in the keys of the space filling curves (3 * 21 = 63 bits)
+_CURVE_BITS = 21
+
+ORDERINGS = ("morton", "hilbert", "rcm")
+
+def _quantize(coords, nbits = _CURVE_BITS):
+    """ Maps the (N, 3) coordinates to integers in [0, 2**nbits) (uint64), in the bounding box of the points. """
+    coords = np.asarray(coords, dtype = np.float64)
+    lo = coords.min(axis = 0)
+    extent = coords.max(axis = 0) - lo
+    extent[extent == 0.0] = 1.0
+    scale = ((1 << nbits) - 1) / extent
+    return ((coords - lo) * scale).astype(np.uint64)
+
+def _spreadBits(v):
+    """ Inserts two zero bits after each of the 21 low bits of v (uint64). """
+    v = v & np.uint64(0x1fffff)
+    v = (v | (v << np.uint64(32))) & np.uint64(0x1f00000000ffff)
+    v = (v | (v << np.uint64(16))) & np.uint64(0x1f0000ff0000ff)
+    v = (v | (v << np.uint64(8))) & np.uint64(0x100f00f00f00f00f)
+    v = (v | (v << np.uint64(4))) & np.uint64(0x10c30c30c30c30c3)
+    v = (v | (v << np.uint64(2))) & np.uint64(0x1249249249249249)
+    return v
+
+def mortonKeys(coords):
+    """ Returns the position (uint64) of each point of the (N, 3) array coords along the Morton (Z-order) curve. """
+    q = _quantize(coords)
+    return _spreadBits(q[:, 0]) << np.uint64(2) | _spreadBits(q[:, 1]) << np.uint64(1) | _spreadBits(q[:, 2])
+
+def hilbertKeys(coords, nbits = _CURVE_BITS):
+    """ Returns the position (uint64) of each point of the (N, 3) array coords along the Hilbert curve
+        (J. Skilling, "Programming the Hilbert curve", AIP Conf. Proc. 707, 2004). """
+    q = _quantize(coords, nbits)
+    X = [q[:, 0].copy(), q[:, 1].copy(), q[:, 2].copy()]
+    # inverse undo
+    Q = 1 << (nbits - 1)
+    while Q > 1:
+        P = np.uint64(Q - 1)
+        Qu = np.uint64(Q)
+        for i in range(3):
+            flip = (X[i] & Qu) != 0
+            if i == 0:
+                X[0] = np.where(flip, X[0] ^ P, X[0])
+            else: # invert the low bits of X[0], or exchange them with those of X[i]
+                t = (X[0] ^ X[i]) & P
+                X[0], X[i] = np.where(flip, X[0] ^ P, X[0] ^ t), np.where(flip, X[i], X[i] ^ t)
+        Q >>= 1
+    # Gray encode
+    X[1] ^= X[0]
+    X[2] ^= X[1]
+    t = np.zeros_like(X[0])
+    Q = 1 << (nbits - 1)
+    while Q > 1:
+        t = np.where((X[2] & np.uint64(Q)) != 0, t ^ np.uint64(Q - 1), t)
+        Q >>= 1
+    for i in range(3): X[i] ^= t
+    return _spreadBits(X[0]) << np.uint64(2) | _spreadBits(X[1]) << np.uint64(1) | _spreadBits(X[2])
+
+def pointOrder(coords, ordering):
+    """ Returns the permutation (new index -> old index) that sorts the points along the curve
+        ordering ("morton" or "hilbert"). """
+    assert (ordering in ("morton", "hilbert")), "Unknown ordering of points: %s" % ordering
+    if len(coords) == 0: return np.zeros(0, dtype = np.int64)
+    keys = mortonKeys(coords) if ordering == "morton" else hilbertKeys(coords)
+    return np.argsort(keys, kind = "stable")
+
+def _cellCentroids(coords, connectivity, offsets):
+    connectivity, offsets = connectivity.astype(np.int64), offsets.astype(np.int64)
+    counts = np.diff(offsets, prepend = 0)
+    nonempty = counts > 0
+    starts = (offsets - counts)[nonempty]
+    centroids = np.zeros((offsets.size, 3))
+    centroids[nonempty] = np.add.reduceat(coords[connectivity], starts, axis = 0) / counts[nonempty, None]
+    return centroids
+
+def _rcmCellOrder(connectivity, offsets, npoints):
+    try:
+        from scipy.sparse import csr_matrix
+        from scipy.sparse.csgraph import reverse_cuthill_mckee
+    except ImportError:
+        assert False, "The rcm ordering requires scipy"
+    ncells = offsets.size
+    ptr = np.concatenate(([0], offsets)).astype(np.int64)
+    incidence = csr_matrix((np.ones(connectivity.size, dtype = np.int8), connectivity.astype(np.int64), ptr),
+                           shape = (ncells, npoints))
+    graph = (incidence @ incidence.T).tocsr()
+    return np.asarray(reverse_cuthill_mckee(graph, symmetric_mode = True), dtype = np.int64)
+
+def meshOrder(coords, connectivity, offsets, ordering):
+    """ Computes the new order of the points and cells of an unstructured mesh.
+
+        PARAMETERS:
+            coords: (N, 3) array with the coordinates of the points.
+            connectivity, offsets: connectivity of the cells, as in unstructuredGridToVTK.
+            ordering: "morton", "hilbert" or "rcm".
+
+        RETURNS:
+            the permutations of the points and of the cells (new index -> old index).
+    """
+    assert (ordering in ORDERINGS), "Unknown ordering: %s" % ordering
+    npoints = coords.shape[0]
+    if ordering == "rcm":
+        cell_perm = _rcmCellOrder(connectivity, offsets, npoints)
+        # points in the order they are first used by the (reordered) cells, then the unused points
+        conn = permuteCells(connectivity, offsets, cell_perm)[0].astype(np.int64) # it may be given as floats
+        used, first = np.unique(conn, return_index = True)
+        unused = np.setdiff1d(np.arange(npoints), used, assume_unique = True)
+        point_perm = np.concatenate((used[np.argsort(first, kind = "stable")], unused))
+    else:
+        point_perm = pointOrder(coords, ordering)
+        cell_perm = pointOrder(_cellCentroids(coords, connectivity, offsets), ordering)
+    return point_perm, cell_perm
+
+def permuteCells(connectivity, offsets, cell_perm, point_perm = None):
+    """ Returns the connectivity and offsets of the cells in the order cell_perm (new index -> old index),
+        with the points renumbered by point_perm (if given). """
+    ends = offsets.astype(np.int64) # offsets (and connectivity) may be given as floats
+    counts = np.diff(ends, prepend = 0)
+    new_counts = counts[cell_perm]
+    new_ends = np.cumsum(new_counts)
+    # position in the old connectivity of each entry of the new one
+    shift = (ends - counts)[cell_perm] - (new_ends - new_counts)
+    index = np.repeat(shift, new_counts) + np.arange(new_ends[-1] if new_ends.size else 0)
+    new_connectivity = connectivity[index]
+    if point_perm is not None:
+        rank = np.empty_like(point_perm)
+        rank[point_perm] = np.arange(point_perm.size)
+        new_connectivity = rank[new_connectivity.astype(np.int64)].astype(connectivity.dtype)
+    return new_connectivity, new_ends.astype(offsets.dtype)
+
+def extractCells(connectivity, offsets, cells, npoints):
+    """ Extracts a subset of the cells of a mesh, and only keeps the points used by them.
+
+        PARAMETERS:
+            connectivity, offsets: connectivity of the cells, as in unstructuredGridToVTK.
+            cells: indices of the cells to extract (in the order they are written).
+            npoints: number of points of the mesh.
+
+        RETURNS:
+            connectivity and offsets of the subset, with the points renumbered;
+            index (in the mesh) of each point of the subset.
+    """
+    new_connectivity, new_offsets = permuteCells(connectivity, offsets, cells)
+    used = np.zeros(npoints, dtype = bool)
+    used[new_connectivity.astype(np.int64)] = True
+    point_ids = np.flatnonzero(used)
+    rank = np.cumsum(used) - 1 # new index of each used point
+    new_connectivity = rank[new_connectivity.astype(np.int64)].astype(connectivity.dtype)
+    return new_connectivity, new_offsets, point_ids
+
+def permuteData(data, perm, nelem = None):
+    """ Returns the data array (1D, 1D with interleaved components, (N, k) or a tuple of 3 arrays) of the elements
+        in the order perm (new index -> old index).  perm may also select a subset of the nelem elements
+        (default: nelem = perm.size). """
+    if isinstance(data, tuple):
+        return tuple(d[perm] for d in data)
+    data = np.asarray(data)
+    n = perm.size if nelem is None else nelem
+    if data.ndim == 1 and data.size != n: # components of each element are consecutive
+        return data.reshape(n, -1)[perm].ravel()
+    return data[perm]
+
+#
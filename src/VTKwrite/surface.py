@@ -0,0 +1,101 @@
+"""
+VTKwrite.surface.py
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+Extraction of the boundary surface (skin) of a volume mesh, i.e. the faces of the cells that are not
+shared with another cell.  Supported cells: tetrahedra, hexahedra, voxels, wedges and pyramids.
+
+The faces of all the cells are listed (vectorized, one cell type at a time), their vertices are sorted
+(so the two copies of an interior face are identical), and the sorted faces are sorted lexicographically:
+a boundary face is one that is not equal to its neighbors.  The faces keep the orientation of their cell
+(outward normals for the VTK ordering of the vertices).
+
+Copyright (c) 02-23-2025,  Shawn W. Walker
+"""
+
+try:
+    import numpy as np
+except:
+    print("Numpy is not installed. Please install it before running VTKwrite again.")
+
+from .vtkbin import VtkTetra, VtkHexahedron, VtkVoxel, VtkWedge, VtkPyramid, VtkTriangle, VtkQuad
+
+# number of points and faces (local indices of the vertices, as in VTK) of each type of cell
+_CELL_FACES = {
+    VtkTetra.tid      : (4, [(0, 1, 3), (1, 2, 3), (2, 0, 3), (0, 2, 1)]),
+    VtkHexahedron.tid : (8, [(0, 4, 7, 3), (1, 2, 6, 5), (0, 1, 5, 4), (3, 7, 6, 2), (0, 3, 2, 1), (4, 5, 6, 7)]),
+    VtkVoxel.tid      : (8, [(0, 4, 6, 2), (1, 3, 7, 5), (0, 1, 5, 4), (2, 6, 7, 3), (0, 2, 3, 1), (4, 5, 7, 6)]),
+    VtkWedge.tid      : (6, [(0, 1, 2), (3, 5, 4), (0, 3, 4, 1), (1, 4, 5, 2), (2, 5, 3, 0)]),
+    VtkPyramid.tid    : (5, [(0, 3, 2, 1), (0, 1, 4), (1, 2, 4), (2, 3, 4), (3, 0, 4)]),
+}
+
+def boundaryFaces(connectivity, offsets, cell_types):
+    """ Finds the faces of the cells that are not shared with another cell.
+
+        PARAMETERS:
+            connectivity, offsets, cell_types: the cells, as in unstructuredGridToVTK.
+
+        RETURNS:
+            faces: (M, 4) array with the vertices of each boundary face (-1 in the last column of triangles);
+            cells: index of the cell of each face.
+            The faces are in the order of their cells.
+    """
+    ends = np.asarray(offsets).astype(np.int64) # offsets (and connectivity) may be given as floats
+    starts = ends - np.diff(ends, prepend = 0)
+    cell_types = np.asarray(cell_types)
+    dtype = np.int32 if connectivity.size == 0 or connectivity.max() < 2**31 else np.int64
+    connectivity = np.asarray(connectivity).astype(dtype, copy = False)
+
+    supported = np.isin(cell_types, list(_CELL_FACES.keys()))
+    assert supported.all(), "Unsupported cell type for the surface: %s" % cell_types[~supported][0]
+
+    faces, cells, local = [], [], []
+    for tid, (nvert, cell_faces) in _CELL_FACES.items():
+        ids = np.flatnonzero(cell_types == tid)
+        if ids.size == 0: continue
+        assert np.all(ends[ids] - starts[ids] == nvert), "Cells of type %d must have %d points" % (tid, nvert)
+        nodes = connectivity[starts[ids, None] + np.arange(nvert)]
+        for k, f in enumerate(cell_faces):
+            face = np.full((ids.size, 4), -1, dtype = dtype)
+            face[:, :len(f)] = nodes[:, f]
+            faces.append(face)
+            cells.append(ids)
+            local.append(np.full(ids.size, k, dtype = np.int8))
+    if not faces:
+        return np.zeros((0, 4), dtype = dtype), np.zeros(0, dtype = np.int64)
+    faces, cells, local = np.concatenate(faces), np.concatenate(cells), np.concatenate(local)
+
+    # the two copies of an interior face are equal once their vertices are sorted
+    keys = np.sort(faces, axis = 1)
+    order = np.lexsort(keys.T[::-1])
+    keys = keys[order]
+    same = np.all(keys[1:] == keys[:-1], axis = 1)
+    single = np.ones(order.size, dtype = bool)
+    single[1:] &= ~same
+    single[:-1] &= ~same
+    boundary = order[single]
+
+    # in the order of the cells (and of the faces of each cell)
+    boundary = boundary[np.lexsort((local[boundary], cells[boundary]))]
+    return faces[boundary], cells[boundary]
+
+def extractSurface(connectivity, offsets, cell_types):
+    """ Extracts the boundary surface of a volume mesh, with the points renumbered so that only the points
+        of the surface are used.
+
+        PARAMETERS:
+            connectivity, offsets, cell_types: the cells, as in unstructuredGridToVTK.
+
+        RETURNS:
+            connectivity, offsets, cell_types (VtkTriangle or VtkQuad) of the faces;
+            index of the cell of each face;
+            index (in the volume mesh) of each point of the surface.
+    """
+    faces, cells = boundaryFaces(connectivity, offsets, cell_types)
+    is_tri = faces[:, 3] < 0
+    point_ids, conn = np.unique(faces[faces >= 0], return_inverse = True) # faces in row order, without padding
+    dtype = 'int32' if point_ids.size < 2**31 and faces.size < 2**31 else 'int64'
+    face_offsets = np.cumsum(np.where(is_tri, 3, 4), dtype = dtype)
+    face_types = np.where(is_tri, VtkTriangle.tid, VtkQuad.tid).astype(np.uint8)
+    return conn.ravel().astype(dtype), face_offsets, face_types, cells, point_ids
+
+#
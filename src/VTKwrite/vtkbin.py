@@ -6,10 +6,15 @@ Low level Python library to export data to binary VTK file.
 Copyright (c) 05-07-2021,  Shawn W. Walker
 """
 
-from .pyvtk import writeBlockSize, writeArrayToFile, writeArraysToFile
+from .pyvtk import writeBlockSize, writeArrayToFile, writeArraysToFile, writeSlabsToFile, GatherWriter
+from .pyvtk import PositionalWriter, submitArrayWrites, DirectWriter, RangeWriter
+from .pyvtk import LazyData, writeLazyToFile
 from .xmlwrite import XmlWriter
+from . import memprofile
 import sys
 import os
+import io
+import concurrent.futures
 
 # ================================
 #            VTK Types
@@ -30,6 +35,7 @@ VtkPolyData        = VtkFileType("PolyData", ".vtp")
 VtkRectilinearGrid  = VtkFileType("RectilinearGrid", ".vtr")
 VtkStructuredGrid   = VtkFileType("StructuredGrid", ".vts")
 VtkUnstructuredGrid = VtkFileType("UnstructuredGrid", ".vtu")
+VtkMultiBlockDataSet = VtkFileType("vtkMultiBlockDataSet", ".vtm")
 
 #    DATA TYPES
 class VtkDataType:
@@ -106,24 +112,92 @@ def _array_to_string(a):
     s = "".join([repr(num) + " " for num in a])
     return s
 
+def _is_lazy(data):
+    """ True for lazy data sources (see pyvtk.LazyData). """
+    return callable(data) and hasattr(data, "ncomp") and hasattr(data, "shape") and hasattr(data, "dtype")
+
+def _lazy_nelem(data):
+    """ Number of elements of a lazy data source. """
+    nelem = 1
+    for n in data.shape: nelem *= n
+    return nelem
+
+def _is_array(data):
+    """ True for numpy arrays (including subclasses, e.g. np.memmap) and for
+        array-like objects that describe their shape and dtype (e.g. h5py datasets). """
+    return (not isinstance(data, tuple)) and hasattr(data, "shape") and hasattr(data, "dtype") and not _is_lazy(data)
+
 def _get_byte_order():
     if sys.byteorder == "little":
         return "LittleEndian"
     else:
         return "BigEndian"
 
+def _syncFile(fd):
+    """ Flushes the data of the file fd to the storage device. """
+    if hasattr(os, "fdatasync"):
+        os.fdatasync(fd)
+    else:
+        os.fsync(fd)
+
+# ================================
+#        VtkIOPolicy class
+# ================================
+class VtkIOPolicy:
+    """ Options that control how the files are written (see VtkFile and VtkGroup).
+        The default policy writes the files as Python does by default. """
+
+    def __init__(self, buffer_size = -1, preallocate = False, sync = False, direct = False, nthreads = None, ranges = False):
+        """
+            PARAMETERS:
+                buffer_size: size (in bytes) of the buffer of each file (-1 = Python's default, usually 8 KB).
+                             Large buffers (some MB) reduce the number of requests on parallel file systems (e.g. Lustre).
+                preallocate: if True, the space of the binary section is reserved (os.posix_fallocate)
+                             before it is written, which avoids the fragmentation of the file.
+                sync: if True, each file is flushed to the storage device (os.fdatasync) when it is saved,
+                      and a VtkGroup only adds a file after flushing it (so the group never lists data that is not stored).
+                direct: if True, the binary section is written with O_DIRECT (bypassing the page cache) through an
+                        aligned buffer of buffer_size bytes (4 MB by default), see pyvtk.DirectWriter.
+                        This is meant for huge files that are written once.  If the file system does not support O_DIRECT,
+                        the file is written normally.
+                nthreads: number of threads for parallel positional writes of the binary section (see VtkFile).
+                          It cannot be used together with direct.
+                ranges: if True, the range of each data array is stored in its RangeMin and RangeMax attributes
+                        (the range of the magnitudes for arrays with several components, as VTK does), so viewers
+                        do not need to scan the data.  The ranges are computed while the data is written; the space of
+                        the attributes is reserved in the header and filled when the file is saved.  If an array has
+                        no range (e.g. all its values are NaN), its attributes are blanked out (replaced by spaces).
+                        Only the range of the magnitudes is stored: the ranges of the individual components of a
+                        vector are not (viewers compute them when they are needed).
+        """
+        assert not (direct and nthreads is not None), "O_DIRECT and parallel writes cannot be combined"
+        self.buffer_size = buffer_size
+        self.preallocate = preallocate
+        self.sync = sync
+        self.direct = direct
+        self.nthreads = nthreads
+        self.ranges = ranges
+
+_DEFAULT_POLICY = VtkIOPolicy()
+# number of characters reserved for RangeMin and RangeMax (enough for any float64 or int64 value)
+_RANGE_WIDTH = 24
+# number of characters reserved for the offsets of files with shared blocks (enough for any UInt64 value)
+_OFFSET_WIDTH = 20
+
 # ================================
 #        VtkGroup class
 # ================================
 class VtkGroup:
     
-    def __init__(self, filepath):
+    def __init__(self, filepath, policy = None):
         """ Creates a VtkGroup file that is stored in filepath.
             
             PARAMETERS:
                 filepath: filename without extension.
+                policy: (optional) VtkIOPolicy (only buffer_size and sync are used).
         """
-        self.xml = XmlWriter(filepath + ".pvd")
+        self.policy = policy or _DEFAULT_POLICY
+        self.xml = XmlWriter(filepath + ".pvd", buffering = self.policy.buffer_size)
         self.xml.openElement("VTKFile")
         self.xml.addAttributes(type = "Collection", version = "0.1",  byte_order = _get_byte_order())
         self.xml.openElement("Collection")
@@ -133,6 +207,9 @@ class VtkGroup:
         """ Closes this VtkGroup. """
         self.xml.closeElement("Collection")
         self.xml.closeElement("VTKFile")
+        if self.policy.sync:
+            self.xml.stream.flush()
+            _syncFile(self.xml.stream.fileno())
         self.xml.close()
     
     def addFile(self, filepath, sim_time, group = "", part = "0"):
@@ -147,6 +224,12 @@ class VtkGroup:
             See: http://www.paraview.org/Wiki/ParaView/Data_formats#PVD_File_Format for details.
         """
         # TODO: Check what the other attributes are for.
+        if self.policy.sync:
+            fd = os.open(filepath, os.O_RDONLY)
+            try:
+                _syncFile(fd)
+            finally:
+                os.close(fd)
         filename = os.path.relpath(filepath, start = self.root)
         self.xml.openElement("DataSet")
         self.xml.addAttributes(timestep = sim_time, group = group, part = part, file = filename)
@@ -154,23 +237,118 @@ class VtkGroup:
         
 
 
+# ================================
+#      VtkMultiBlock class
+# ================================
+class VtkMultiBlock:
+
+    def __init__(self, filepath):
+        """ Creates a vtkMultiBlockDataSet file that is stored in filepath.
+
+            PARAMETERS:
+                filepath: filename without extension.
+        """
+        self.filename = filepath + VtkMultiBlockDataSet.ext
+        self.xml = XmlWriter(self.filename)
+        self.xml.openElement("VTKFile")
+        self.xml.addAttributes(type = VtkMultiBlockDataSet.name, version = "1.0", byte_order = _get_byte_order())
+        self.xml.openElement(VtkMultiBlockDataSet.name)
+        self.root = os.path.dirname(os.path.abspath(filepath))
+        self.index = [0] # next child index at each nesting level
+
+    def getFileName(self):
+        """ Returns absolute path to this file. """
+        return os.path.abspath(self.filename)
+
+    def openBlock(self, name = ""):
+        """ Opens a (nested) block; all files and blocks added until closeBlock is called are its children.
+
+            PARAMETERS:
+                name: name of the block, as displayed by Paraview.
+        """
+        self.xml.openElement("Block")
+        self.xml.addAttributes(index = self.index[-1], name = name)
+        self.index[-1] += 1
+        self.index.append(0)
+        return self
+
+    def closeBlock(self):
+        """ Closes the current block. """
+        self.index.pop()
+        self.xml.closeElement("Block")
+        return self
+
+    def addFile(self, filepath, name = ""):
+        """ Adds a dataset file to the current block.
+
+            PARAMETERS:
+                filepath: full path to VTK file (e.g. a .vtu, .vts, etc.).
+                name: name of the dataset, as displayed by Paraview.
+        """
+        filename = os.path.relpath(filepath, start = self.root)
+        self.xml.openElement("DataSet")
+        self.xml.addAttributes(index = self.index[-1], name = name, file = filename)
+        self.xml.closeElement()
+        self.index[-1] += 1
+        return self
+
+    def save(self):
+        """ Closes this VtkMultiBlock. """
+        assert (len(self.index) == 1), "Some blocks are still open."
+        self.xml.closeElement(VtkMultiBlockDataSet.name)
+        self.xml.closeElement("VTKFile")
+        self.xml.close()
+
 # ================================
 #        VtkFile class         
 # ================================
 class VtkFile:
     
-    def __init__(self, filepath, ftype, largeFile = False):
+    def __init__(self, filepath, ftype, largeFile = False, stream = None, nthreads = None, policy = None, shared_blocks = False):
         """
             PARAMETERS:
                 filepath: filename without extension.
                 ftype: file type, e.g. VtkImageData, etc.
                 largeFile: If size of the stored data cannot be represented by a UInt32.
+                stream: (optional) binary stream (e.g. io.BytesIO) to write to, instead of the file.
+                nthreads: (optional) if given, the appended arrays are written in parallel by nthreads threads,
+                          each one at its own position of the file (with os.pwrite).  See appendData.
+                policy: (optional) VtkIOPolicy with the I/O options (buffer size, preallocation, sync, O_DIRECT).
+                        Its nthreads is used if nthreads is not given.
+                shared_blocks: (optional) if True, a data array may refer to the appended block of an earlier array
+                               instead of its own (see shareData), and the arrays may be appended in another order
+                               than their headers (see setAppendOrder).  The space of the offsets is then reserved
+                               in the header, and the offsets are written when the file is saved.
         """
         self.ftype = ftype
         self.filename = filepath + ftype.ext
-        self.xml = XmlWriter(self.filename)
+        self.policy = policy or _DEFAULT_POLICY
+        if nthreads is None: nthreads = self.policy.nthreads
+        assert not (self.policy.direct and nthreads is not None), "O_DIRECT and parallel writes cannot be combined"
+        memprofile.openFile(self.filename)
+        memprofile.beginStage("header")
+        self.xml = XmlWriter(self.filename, stream = stream, buffering = self.policy.buffer_size)
         self.offset = 0  # offset in bytes after beginning of binary section
         self.appendedDataIsOpen = False
+        self.appended = None # GatherWriter of the binary section
+        self.blocks = []     # for each data array (in order of the headers): None or the position of its reserved range
+        self.names = []      # name of each data array (in order of the headers)
+        self.nappended = 0   # number of arrays appended
+        self.patches = []    # (position of the reserved range, RangeWriters) of the arrays appended
+        self.ranged = set()  # position of the reserved ranges that were written
+        self.shared_blocks = shared_blocks
+        self.offsets = []    # shared blocks: position of the reserved offset of each data array (in order of the headers)
+        self.block_offsets = {} # shared blocks: offset of the block of each data array appended or shared (by header index)
+        self.block_ranges = {}  # shared blocks: RangeWriters of each data array appended or shared (or None)
+        self.nbytes = 0      # shared blocks: size of the blocks appended so far
+        self.append_order = None # shared blocks: header index of each array, in the order they are appended
+        self.pool = None     # parallel mode: thread pool, futures and position of the next block in the file
+        if nthreads is not None:
+            assert (nthreads >= 1)
+            assert hasattr(os, "pwrite"), "Parallel writes require os.pwrite"
+            self.pool = concurrent.futures.ThreadPoolExecutor(max_workers = nthreads)
+            self.futures = []
+            self.position = None
 #        self.largeFile = largeFile
 
 #       if largeFile == False:
@@ -296,7 +474,7 @@ class VtkFile:
                 end: array or list of end indexes. Required for Structured, Rectilinear and ImageData grids.
                 origin: 3D array or list with grid origin. Only required for ImageData grids.
                 spacing: 3D array or list with grid spacing. Only required for ImageData grids.
-                time_values: single string giving the time values (with spaces in-between). Only required for Unstructured grids.
+                time_values: single string giving the time values (with spaces in-between). Only required for time-series.
 
             RETURNS:
                 this VtkFile to allow chained calls.
@@ -314,7 +492,8 @@ class VtkFile:
             if (not start or not end): assert (False)
             ext = _mix_extents(start, end)
             self.xml.addAttributes(WholeExtent = ext)
-        elif (gType == VtkUnstructuredGrid.name and time_values != None):
+
+        if time_values != None:
             self.xml.addAttributes(TimeValues = time_values)
                 
         return self
@@ -348,19 +527,27 @@ class VtkFile:
         dtype = np_to_vtk[dtype]
 
         self.xml.openElement("DataArray")
+        self.xml.addAttributes( Name = name,
+                                NumberOfComponents = ncomp,
+                                type = dtype.name,
+                                format = "appended")
+        if not self.shared_blocks:
+            self.xml.addAttributes(offset = self.offset)
         if time_value is not None:
-            self.xml.addAttributes( Name = name,
-                                    NumberOfComponents = ncomp,
-                                    type = dtype.name,
-                                    format = "appended",
-                                    offset = self.offset,
-                                    TimeStep = time_value)
+            self.xml.addAttributes(TimeStep = time_value)
+        if self.shared_blocks:
+            # reserve the space of the offset, which is written by save
+            self.xml.addAttributes(offset = " " * _OFFSET_WIDTH)
+            self.offsets.append(self.xml.stream.tell() - _OFFSET_WIDTH - 1)
+        self.names.append(name)
+        if self.policy.ranges:
+            # reserve the space of the range, which is written by save
+            self.xml.addAttributes(RangeMin = " " * _RANGE_WIDTH)
+            pos = self.xml.stream.tell() - _RANGE_WIDTH - 1
+            self.xml.addAttributes(RangeMax = " " * _RANGE_WIDTH)
+            self.blocks.append((ncomp, pos, self.xml.stream.tell() - _RANGE_WIDTH - 1))
         else:
-            self.xml.addAttributes( Name = name,
-                                    NumberOfComponents = ncomp,
-                                    type = dtype.name,
-                                    format = "appended",
-                                    offset = self.offset)
+            self.blocks.append(None)
         self.xml.closeElement()
 
         #TODO: Check if 4/8 is platform independent
@@ -379,13 +566,18 @@ class VtkFile:
                 data: one numpy array or a tuple with 3 numpy arrays. If a tuple, the individual
                       arrays must represent the components of a vector field.
                       All arrays must be one dimensional or three-dimensional.
+                      A single two-dimensional (N, k) array holds N elements with k components each.
         """
         if type(data).__name__ == "tuple": # vector data
             assert (len(data) == 3)
             x = data[0]
             self.addHeader(name, x.dtype.name, x.size, 3)
-        elif type(data).__name__ == "ndarray":
-            if data.ndim == 1 or data.ndim == 3:
+        elif _is_lazy(data):
+            self.addHeader(name, data.dtype.name, _lazy_nelem(data), data.ncomp)
+        elif _is_array(data):
+            if data.ndim == 2:
+                self.addHeader(name, data.dtype.name, data.shape[0], data.shape[1])
+            elif data.ndim == 1 or data.ndim == 3:
                 self.addHeader(name, data.dtype.name, data.size, 1)
             else:
                 assert False, "Bad array shape: " + str(data.shape)
@@ -397,13 +589,21 @@ class VtkFile:
             
              PARAMETERS:
                 name: data array name.
-                data: one numpy array (a 1D array).
+                data: one numpy array (a 1D array, a 3D array or, if ncomp > 1, a 4D array whose first axis is the component
+                      or an (N, ncomp) array), or a lazy data source (see pyvtk.LazyData) with ncomp components.
                 ncomp: number of components to the data.
                 time_value: string representing time value.
         """
-        if type(data).__name__ == "ndarray":
-            if data.ndim == 1 or data.ndim == 3:
-                nelem = int(data.size / ncomp)
+        if _is_lazy(data):
+            assert (data.ncomp == ncomp), "Lazy data has %d components, expected %d" % (data.ncomp, ncomp)
+            self.addHeader(name, data.dtype.name, _lazy_nelem(data), ncomp, time_value)
+        elif _is_array(data):
+            ndim = len(data.shape)
+            if ndim == 1 or ndim == 3 or (ndim == 4 and data.shape[0] == ncomp) or \
+               (ndim == 2 and data.shape[1] == ncomp):
+                size = 1
+                for n in data.shape: size *= n
+                nelem = int(size / ncomp)
                 self.addHeader(name, data.dtype.name, nelem, ncomp, time_value)
             else:
                 assert False, "Bad array shape: " + str(data.shape)
@@ -418,8 +618,13 @@ class VtkFile:
                 dtype: string with data type representation (same as numpy). For example, 'float64'
                 nelem: number of elements.
                 ncomp: number of components, 1 (=scalar) or 3 (=vector).
+
+            NOTE: it cannot be used in parallel mode (see nthreads in __init__), where each block is written
+                  at its own position of the file: use appendData.
         """
+        assert (self.pool is None), "appendHeader cannot be used with parallel writes (use appendData)"
         self.openAppendedData()
+        self.appended.flush() # the data is written directly to self.xml.stream
         dsize = np_to_vtk[dtype].size
         block_size = dsize * ncomp * nelem
         if self.largeFile == False:
@@ -428,68 +633,277 @@ class VtkFile:
             writeBlockSize64Bit(self.xml.stream, block_size)
 
             
-    def appendData(self, data):
+    def appendData(self, data, slab_size = None):
         """ Append data to binary section.
             This function writes the header section and the data to the binary file.
 
             PARAMETERS:
+                slab_size: (optional) if given, data must be a 3D array-like object (e.g. np.memmap or h5py dataset),
+                           which is read and written in z-slabs of slab_size planes (see pyvtk.writeSlabsToFile).
                 data: one numpy array or a tuple with 3 numpy arrays. If a tuple, the individual
                       arrays must represent the components of a vector field.
                       All arrays must be one dimensional or three-dimensional.
+                      A single array may also be four-dimensional, in which case its first axis is the component,
+                      or an (N, k) array of N elements with k components each, which is written as-is (row by row).
                       The order of the arrays must coincide with the numbering scheme of the grid.
+                      Arrays do not need to be contiguous (e.g. strided views of a larger array).
+                      data may also be a lazy data source (see pyvtk.LazyData), which is computed one chunk at a time.
             
             RETURNS:
                 This VtkFile to allow chained calls
 
+            NOTE: the block size and the data are collected by a GatherWriter and written with a few
+                  os.writev calls (contiguous arrays are not copied).  Small blocks may be written later
+                  (at the latest when the file is saved), but a copy of them is kept, so data can be modified
+                  as soon as this function returns.
+
+            NOTE: in parallel mode (see nthreads in __init__), the data is only queued: each block is written
+                  by the thread pool at its own position of the file, and large contiguous arrays are split
+                  into pieces that are written in parallel.  The arrays must not be modified until the file is saved.
+
             TODO: Extend this function to accept contiguous C order arrays.
         """
         self.openAppendedData()
+        index = self.nextHeader()
+        if index < len(self.names):
+            name = "appendData " + self.names[index]
+        else:
+            name = "appendData"
+        with memprofile.stage(name):
+            return self._appendData(data, slab_size)
 
-        if type(data).__name__ == 'tuple': # 3 numpy arrays
+    def _appendData(self, data, slab_size):
+        array = None # single array written in FORTRAN order (it can be split for parallel writes)
+
+        if _is_lazy(data): # computed one chunk at a time (slab_size does not apply)
+            block_size = _lazy_nelem(data) * data.ncomp * data.dtype.itemsize
+            write = lambda stream: writeLazyToFile(stream, data)
+
+        elif slab_size is not None: # out-of-core 3D array
+            assert (_is_array(data) and len(data.shape) == 3)
+            block_size = data.dtype.itemsize
+            for n in data.shape: block_size *= n
+            write = lambda stream: writeSlabsToFile(stream, data, slab_size)
+
+        elif type(data).__name__ == 'tuple': # 3 numpy arrays
             ncomp = len(data)
             assert (ncomp == 3)
             dsize = data[0].dtype.itemsize
             nelem = data[0].size
             block_size = ncomp * nelem * dsize
-            #if self.largeFile == False:
-            writeBlockSize(self.xml.stream, block_size)
-            #else:
-            #    writeBlockSize64Bit(self.xml.stream, block_size)
             x, y, z = data[0], data[1], data[2]
-            writeArraysToFile(self.xml.stream, x, y, z)
+            write = lambda stream: writeArraysToFile(stream, x, y, z)
             
-        elif type(data).__name__ == 'ndarray' and (data.ndim == 1 or data.ndim == 3): # single numpy array
+        elif _is_array(data) and (data.ndim == 1 or data.ndim == 3 or data.ndim == 4): # single numpy array
             ncomp = 1 
             dsize = data.dtype.itemsize
             nelem = data.size
             block_size = ncomp * nelem * dsize
-            #if self.largeFile == False:
-            writeBlockSize(self.xml.stream, block_size)
-            #else:
-            #    writeBlockSize64Bit(self.xml.stream, block_size)
-            writeArrayToFile(self.xml.stream, data)
+            array = data
+
+        elif _is_array(data) and data.ndim == 2: # (N, k) numpy array
+            block_size = data.size * data.dtype.itemsize
+            # the FORTRAN order of the transpose is the row by row order of data (no copy if data has C-layout)
+            array = data.T
          
         else:
             assert False
 
+        # range of the data (see VtkIOPolicy), computed while it is written
+        index = self.nextHeader()
+        block = self.blocks[index] if index < len(self.blocks) else None
+        self.nappended += 1
+        ranges = None
+        if block is not None:
+            ranges = []
+            self.patches.append((block[1], block[2], ranges))
+            dtype = data[0].dtype if type(data).__name__ == 'tuple' else data.dtype
+        if self.shared_blocks:
+            self.block_offsets[index] = self.nbytes
+            self.block_ranges[index] = ranges
+            self.nbytes += block_size + 8
+
+        if self.pool is not None: # parallel positional writes
+            writeBlockSize(PositionalWriter(self.appended.fd, self.position), block_size)
+            pos = self.position + 8
+            if array is not None:
+                self.futures += submitArrayWrites(self.pool, self.appended.fd, pos, array, ranges, block[0] if block else 1)
+            else:
+                stream = PositionalWriter(self.appended.fd, pos)
+                if ranges is not None:
+                    stream = RangeWriter(stream, dtype, block[0])
+                    ranges.append(stream)
+                self.futures.append(self.pool.submit(write, stream))
+            self.position = pos + block_size
+            return self
+
+        #if self.largeFile == False:
+        writeBlockSize(self.appended, block_size)
+        #else:
+        #    writeBlockSize64Bit(self.xml.stream, block_size)
+        stream = self.appended
+        if ranges is not None:
+            stream = RangeWriter(stream, dtype, block[0])
+            ranges.append(stream)
+        with memprofile.stage("serialize"):
+            if array is not None:
+                writeArrayToFile(stream, array)
+            else:
+                write(stream)
+
+        self.appended.release()
+        return self
+
+    def shareData(self, index):
+        """ The next data array (see nextHeader) refers to the appended block of the data array index,
+            an array that was already appended or shared, i.e. nothing is written for this array.
+            The file must be created with shared_blocks = True.
+
+            PARAMETERS:
+                index: index of the earlier data array (in order of the headers, starting at 0).
+
+            RETURNS:
+                This VtkFile to allow chained calls
+        """
+        assert self.shared_blocks, "The file must be created with shared_blocks = True"
+        assert (index in self.block_offsets), "Only the block of an array that was already appended can be shared"
+        self.openAppendedData()
+        header = self.nextHeader()
+        block = self.blocks[header] if header < len(self.blocks) else None
+        ranges = self.block_ranges[index]
+        if block is not None and ranges is not None:
+            self.patches.append((block[1], block[2], ranges))
+        self.block_offsets[header] = self.block_offsets[index]
+        self.block_ranges[header] = ranges
+        self.nappended += 1
         return self
 
+    def setAppendOrder(self, order):
+        """ The data arrays will be appended (or shared) in the order given, instead of the order of their headers,
+            e.g. to write the arrays of a header section that comes first (like time-dependent points) after
+            the others.  The file must be created with shared_blocks = True.
+
+            PARAMETERS:
+                order: list with the index (in order of the headers, starting at 0) of each data array, in the
+                       order they will be appended.  It must be a permutation of range(number of headers).
+
+            RETURNS:
+                This VtkFile to allow chained calls
+        """
+        assert self.shared_blocks, "The file must be created with shared_blocks = True"
+        assert (self.nappended == 0), "The order must be set before the first array is appended"
+        self.append_order = list(order)
+        return self
+
+    def nextHeader(self):
+        """ Index (in order of the headers) of the next data array to be appended. """
+        if self.append_order is not None and self.nappended < len(self.append_order):
+            return self.append_order[self.nappended]
+        return self.nappended
+
     def openAppendedData(self):
         """ Opens binary section.
 
             It is not necessary to explicitly call this function from an external library.
         """
         if not self.appendedDataIsOpen:
+            memprofile.endStage("header")
             self.xml.openElement("AppendedData").addAttributes(encoding = "raw").addText("_")
             self.appendedDataIsOpen = True
+            self.appended = GatherWriter(self.xml.stream)
+            if self.appended.fd is not None and self.policy.preallocate and self.offset > 0:
+                try:
+                    os.posix_fallocate(self.appended.fd, self.xml.stream.tell(), self.offset)
+                except (AttributeError, OSError):
+                    pass # preallocation is only an optimization
+            if self.appended.fd is not None and self.policy.direct:
+                try:
+                    buffer_size = self.policy.buffer_size if self.policy.buffer_size > 0 else (1 << 22)
+                    self.appended = DirectWriter(self.xml.stream, self.filename, buffer_size)
+                except (AttributeError, OSError):
+                    pass # O_DIRECT is not supported: keep the normal writes
+            if self.pool is not None:
+                assert (self.appended.fd is not None), "Parallel writes require a file"
+                self.position = self.xml.stream.tell()
 
     def closeAppendedData(self):
         """ Closes binary section.
 
             It is not necessary to explicitly call this function from an external library.
         """
+        self.appended.flush()
+        self.waitAppendedData()
+        self.writeRanges()
+        self.writeOffsets()
         self.xml.closeElement("AppendedData")
 
+    def writeRanges(self):
+        """ Writes the ranges of the data arrays appended in the space reserved in the header (see VtkIOPolicy).
+
+            It is not necessary to explicitly call this function from an external library.
+        """
+        if not self.patches: return
+        stream = self.xml.stream
+        stream.flush()
+        end = stream.tell()
+        for pos_min, pos_max, ranges in self.patches:
+            for r in ranges[1:]: ranges[0].merge(r)
+            vrange = ranges[0].getRange() if ranges else None
+            if vrange is None: continue
+            for pos, v in zip((pos_min, pos_max), vrange):
+                stream.seek(pos)
+                stream.write(repr(v).ljust(_RANGE_WIDTH)[:_RANGE_WIDTH].encode("ascii"))
+            self.ranged.add(pos_min)
+        self.patches = []
+        stream.seek(end)
+
+    def clearRanges(self):
+        """ Blanks out the RangeMin and RangeMax attributes that were reserved in the header but have no range
+            (arrays with no valid values, or not appended), since empty numeric attributes are not valid.
+
+            It is not necessary to explicitly call this function from an external library.
+        """
+        empty = [block for block in self.blocks if block is not None and block[1] not in self.ranged]
+        if not empty: return
+        stream = self.xml.stream
+        stream.flush()
+        end = stream.tell()
+        for ncomp, pos_min, pos_max in empty:
+            for name, pos in (("RangeMin", pos_min), ("RangeMax", pos_max)):
+                attr = ' %s="' % name
+                stream.seek(pos - len(attr))
+                stream.write(b" " * (len(attr) + _RANGE_WIDTH + 1)) # the attribute and its closing quote
+        self.blocks = [None] * len(self.blocks)
+        stream.seek(end)
+
+    def writeOffsets(self):
+        """ Shared blocks: writes the offset of the block of each data array in the space reserved in the header.
+
+            It is not necessary to explicitly call this function from an external library.
+        """
+        if not self.offsets: return
+        stream = self.xml.stream
+        stream.flush()
+        end = stream.tell()
+        for index, pos in enumerate(self.offsets):
+            if index not in self.block_offsets: continue # not appended
+            offset = self.block_offsets[index]
+            stream.seek(pos)
+            stream.write(str(offset).ljust(_OFFSET_WIDTH).encode("ascii"))
+        self.offsets = []
+        stream.seek(end)
+
+    def waitAppendedData(self):
+        """ Parallel mode: waits until all the queued blocks are written and moves to the end of the binary section.
+
+            It is not necessary to explicitly call this function from an external library.
+        """
+        if self.pool is None or self.position is None: return
+        futures, self.futures = self.futures, []
+        for f in futures:
+            f.result() # raises the errors of the threads
+        self.xml.stream.seek(self.position)
+
     def openElement(self, tagName):
         """ Useful to add elements such as: Coordinates, Points, Verts, etc. """
         self.xml.openElement(tagName)
@@ -499,9 +913,144 @@ class VtkFile:
 
     def save(self):
         """ Closes file """
-        if self.appendedDataIsOpen:
-            self.xml.closeElement("AppendedData")
-        self.xml.closeElement("VTKFile")
-        self.xml.close()
+        memprofile.endStage("header")
+        with memprofile.stage("save"):
+            try:
+                if self.appendedDataIsOpen:
+                    self.appended.flush()
+                    self.waitAppendedData()
+                    if isinstance(self.appended, DirectWriter): self.appended.close()
+                    self.writeRanges()
+                    self.writeOffsets()
+                    self.xml.closeElement("AppendedData")
+                self.xml.closeElement("VTKFile")
+                self.clearRanges()
+                if self.shared_blocks and self.policy.preallocate:
+                    self.xml.stream.truncate() # the space reserved for the shared blocks is not used
+                if self.policy.sync:
+                    self.xml.stream.flush()
+                    _syncFile(self.xml.stream.fileno())
+            finally:
+                # also if a write failed (e.g. raised by a thread of the pool): the file and the pool are closed
+                if self.pool is not None:
+                    self.pool.shutdown()
+                if isinstance(self.appended, DirectWriter) and self.appended.buf is not None:
+                    self.appended.close(flush = False) # O_DIRECT descriptor and aligned buffer
+                self.xml.close()
+        memprofile.closeFile(self.filename)
+
+# ================================
+#        VtkPlan class
+# ================================
+class VtkPlan:
+    """ Pre-encoded layout of a VTK file that is written many times with the same structure
+        (array names, data types and sizes), e.g. for in-situ monitoring.
+        The xml header and the constant arrays are encoded once; each write then only copies
+        these bytes and the raw data of the variable arrays. """
+
+    def __init__(self, ftype):
+        """
+            PARAMETERS:
+                ftype: file type, e.g. VtkUnstructuredGrid, etc.
+
+            NOTE: the header is written with the methods of self.file (a VtkFile that writes to memory),
+                  then the appended arrays are added, in order, with appendConstant and appendVariable,
+                  and finally compile is called.
+        """
+        self.ftype = ftype
+        self.buffer = io.BytesIO()
+        self.file = VtkFile("plan", ftype, stream = self.buffer)
+        self.parts = []  # bytes written before each variable array, and the trailer
+        self.specs = []  # (name, dtype, shape) of each variable array
+        self.compiled = False
+
+    def _cut(self):
+        """ Stores the bytes written so far as a new part. """
+        self.parts.append(self.buffer.getvalue())
+        self.buffer.seek(0)
+        self.buffer.truncate()
+
+    def appendConstant(self, data):
+        """ Appends an array that is the same in every write (e.g. the topology of the grid). """
+        assert not self.compiled
+        self.file.appendData(data)
+        return self
+
+    def appendVariable(self, name, data):
+        """ Reserves the place of an array that is given in every write.
+
+            PARAMETERS:
+                name: name of the array (only used in error messages).
+                data: template array (or tuple of 3 arrays); only its data type and shape are used.
+        """
+        assert not self.compiled
+        self.file.openAppendedData()
+        if type(data).__name__ == "tuple":
+            assert (len(data) == 3)
+            spec = tuple((d.dtype.name, d.shape) for d in data)
+            block_size = 3 * data[0].size * data[0].dtype.itemsize
+        else:
+            assert _is_array(data)
+            spec = (data.dtype.name, data.shape)
+            block_size = data.size * data.dtype.itemsize
+        writeBlockSize(self.file.appended, block_size)
+        self._cut()
+        self.specs.append((name, spec))
+        return self
+
+    def compile(self):
+        """ Closes the layout; after this call, the plan can only be used to write files. """
+        assert not self.compiled
+        self.file.openAppendedData()
+        self.file.closeAppendedData()
+        self.file.xml.closeElement("VTKFile")
+        memprofile.closeFile(self.file.filename)
+        self._cut()
+        self.file = None
+        self.buffer = None
+        self.compiled = True
+        return self
+
+    def _checkArray(self, name, spec, data):
+        """ Checks that data has the data type and shape of the template. """
+        if type(data).__name__ == "tuple":
+            assert (len(data) == len(spec) == 3), "Array '%s' does not match the plan" % name
+            for d, s in zip(data, spec): self._checkArray(name, s, d)
+        else:
+            assert _is_array(data) and (data.dtype.name, data.shape) == spec, \
+                "Array '%s' does not match the plan: expected %s %s" % (name, spec[1], spec[0])
+
+    def write(self, filepath, *arrays):
+        """ Writes a file with this layout.
+
+            PARAMETERS:
+                filepath: filename without extension.
+                arrays: the variable arrays, in the same order as given to appendVariable.
+                        They must have the same data type and shape as the templates.
+
+            RETURNS:
+                Full path to saved file.
+        """
+        assert self.compiled
+        assert (len(arrays) == len(self.specs)), "Expected %d arrays, got %d" % (len(self.specs), len(arrays))
+        for (name, spec), data in zip(self.specs, arrays):
+            self._checkArray(name, spec, data)
+
+        filename = filepath + self.ftype.ext
+        memprofile.openFile(filename)
+        with open(filename, "wb") as f, memprofile.stage("serialize"):
+            stream = GatherWriter(f) # one os.writev for the whole file, if the arrays are contiguous
+            for part, data in zip(self.parts, arrays):
+                stream.write(part)
+                if type(data).__name__ == "tuple":
+                    writeArraysToFile(stream, data[0], data[1], data[2])
+                elif data.ndim == 2:
+                    writeArrayToFile(stream, data.T)
+                else:
+                    writeArrayToFile(stream, data)
+            stream.write(self.parts[-1])
+            stream.flush()
+        memprofile.closeFile(filename)
+        return os.path.abspath(filename)
 
 #
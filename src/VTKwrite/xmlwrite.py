@@ -9,8 +9,13 @@ Copyright (c) 05-07-2021,  Shawn W. Walker
 _DEFAUL_ENCODING = "ASCII"
 
 class XmlWriter:
-    def __init__(self, filepath, addDeclaration = True):
-        self.stream = open(filepath, "wb")
+    def __init__(self, filepath, addDeclaration = True, stream = None, buffering = -1):
+        """ If stream is given (any object with a write method, e.g. io.BytesIO), it is used instead of opening filepath.
+            buffering is the size (in bytes) of the buffer of the file (-1 = default size). """
+        if stream is not None:
+            self.stream = stream
+        else:
+            self.stream = open(filepath, "wb", buffering = buffering)
         self.openTag = False
         self.current = []
         if (addDeclaration): self.addDeclaration()